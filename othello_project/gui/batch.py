@@ -0,0 +1,298 @@
+"""
+Batched Reversi engine.
+
+Plays many independent games at once with vectorized NumPy operations,
+following the same rules as the Reversi class (including the center
+opening for non-Othello games and turn skipping for N players).
+"""
+from typing import Callable, Optional, List
+import numpy as np
+from reversi import Reversi, ReversiBase, DIRECTIONS
+
+Policy = Callable[["BatchReversi", np.ndarray], np.ndarray]
+"""
+Type for batched policies. A policy takes the batch and the (K, side,
+side) boolean mask of legal moves, and returns a (K,) array with the
+chosen square index (r * side + c) for every board. Entries for boards
+whose game is over are ignored.
+"""
+
+
+def _look(arr: np.ndarray, dr: int, dc: int, steps: int) -> np.ndarray:
+    """
+    Returns an array whose entry [k, r, c] is arr[k, r + steps * dr,
+    c + steps * dc], or zero when that square is off the board
+    """
+    side = arr.shape[1]
+    a, b = steps * dr, steps * dc
+    out = np.zeros_like(arr)
+    if abs(a) >= side or abs(b) >= side:
+        return out
+    out[:, max(0, -a):side - max(0, a), max(0, -b):side - max(0, b)] = \
+        arr[:, max(0, a):side - max(0, -a), max(0, b):side - max(0, -b)]
+    return out
+
+
+class BatchReversi:
+    """
+    K independent games of Reversi of the same size and number of
+    players, stored as a (K, side, side) int8 array (0 for an empty
+    square, otherwise the number of the player whose piece is there).
+    """
+
+    boards: np.ndarray
+    turn: np.ndarray
+    done: np.ndarray
+    _side: int
+    _players: int
+    _center: np.ndarray
+
+    def __init__(self, count: int, side: int = 8, players: int = 2,
+                 othello: bool = True):
+        """
+        Constructor
+
+        Args:
+            count: Number of games (K)
+            side: Number of squares on each side of the board
+            players: Number of players
+            othello: Whether to initialize the boards with an Othello
+            configuration.
+
+        Raises:
+            ValueError: If the configuration is invalid (see Reversi)
+        """
+        template = Reversi(side, players, othello)
+        self._side = side
+        self._players = players
+
+        start = np.frombuffer(template.cells(), dtype=np.uint8)
+        self.boards = np.tile(start.astype(np.int8).reshape(side, side),
+                              (count, 1, 1))
+        self.turn = np.full(count, template.turn, dtype=np.int8)
+        self.done = np.zeros(count, dtype=bool)
+
+        self._center = np.zeros((side, side), dtype=bool)
+        for r, c in template.center:
+            self._center[r, c] = True
+
+    @classmethod
+    def from_games(cls, games: List[ReversiBase]) -> "BatchReversi":
+        """
+        Returns a batch holding a copy of each of the given games, which
+        must all have the same size and number of players
+        """
+        side = games[0].size
+        batch = cls(len(games), side, games[0].num_players, False)
+        for k, game in enumerate(games):
+            batch.boards[k] = np.frombuffer(game.cells(), dtype=np.int8) \
+                .reshape(side, side)
+            batch.turn[k] = game.turn
+            batch.done[k] = game.done
+        return batch
+
+    def select(self, rows: np.ndarray) -> None:
+        """
+        Keeps only the given boards, in the given order. A row may be
+        given more than once to make copies of a board.
+        """
+        self.boards = self.boards[rows]
+        self.turn = self.turn[rows]
+        self.done = self.done[rows]
+
+    @property
+    def size(self) -> int:
+        """
+        Returns the size of the boards (the number of squares per side)
+        """
+        return self._side
+
+    @property
+    def num_players(self) -> int:
+        """
+        Returns the number of players
+        """
+        return self._players
+
+    def __len__(self) -> int:
+        return self.boards.shape[0]
+
+    def flip_counts(self, player: np.ndarray) -> np.ndarray:
+        """
+        Returns a (K, side, side) array with the number of pieces that
+        a piece of player[k] would flip on each empty square of board k
+        (zero for occupied squares)
+
+        Args:
+            player: (K,) array with one player number per board
+        """
+        boards = self.boards
+        own = boards == player[:, None, None]
+        opp = (boards != 0) & ~own
+        counts = np.zeros(boards.shape, dtype=np.int16)
+        for dr, dc in DIRECTIONS:
+            alive = np.ones(boards.shape, dtype=bool)
+            for steps in range(1, self._side):
+                capped = alive & _look(own, dr, dc, steps)
+                counts += capped * np.int16(steps - 1)
+                alive &= _look(opp, dr, dc, steps)
+                if not alive.any():
+                    break
+        counts *= boards == 0
+        return counts
+
+    def _legal_for(self, player: np.ndarray) -> np.ndarray:
+        """
+        Returns the (K, side, side) mask of legal moves for player[k] on
+        every board, ignoring whether the game is over
+        """
+        empty = self.boards == 0
+        filled = ~(empty & self._center).reshape(len(self), -1).any(axis=1)
+        flanking = empty & (self.flip_counts(player) > 0)
+        return np.where(filled[:, None, None], flanking,
+                        empty & self._center)
+
+    def legal_moves(self) -> np.ndarray:
+        """
+        Returns the (K, side, side) mask of legal moves for the player
+        whose turn it is on every board (all False once a game is over)
+        """
+        return self._legal_for(self.turn) & ~self.done[:, None, None]
+
+    def apply_moves(self, moves: np.ndarray) -> None:
+        """
+        Places a piece of the current player on the given square of every
+        board whose game is not over, flips the flanked pieces, and moves
+        each turn on to the next player who can move. The moves are
+        assumed to be legal.
+
+        Args:
+            moves: (K,) array with one square index (r * side + c) per
+            board; entries for finished games are ignored
+        """
+        side = self._side
+        ks = np.nonzero(~self.done)[0]
+        if len(ks) == 0:
+            return
+        r, c = np.divmod(np.asarray(moves)[ks], side)
+        t = self.turn[ks]
+
+        # As in Reversi, moves in the center (the opening) never flip
+        flips = ~self._center[r, c]
+        for dr, dc in DIRECTIONS:
+            alive = flips.copy()
+            capped = np.zeros(len(ks), dtype=bool)
+            length = np.zeros(len(ks), dtype=np.int16)
+            for steps in range(1, side):
+                rr = r + steps * dr
+                cc = c + steps * dc
+                inside = (rr >= 0) & (rr < side) & (cc >= 0) & (cc < side)
+                v = self.boards[ks, np.clip(rr, 0, side - 1),
+                                np.clip(cc, 0, side - 1)]
+                v = np.where(inside, v, 0)
+                capped |= alive & (v == t)
+                alive &= (v != 0) & (v != t)
+                length += alive
+                if not alive.any():
+                    break
+            for steps in range(1, int(length.max(initial=0)) + 1):
+                m = capped & (length >= steps)
+                self.boards[ks[m], r[m] + steps * dr, c[m] + steps * dc] = t[m]
+        self.boards[ks, r, c] = t
+
+        # The next player with a move gets the turn; if nobody (not even
+        # the player who just moved) has one, the game is over
+        active = ~self.done
+        found = np.zeros(len(self), dtype=bool)
+        turn = self.turn.copy()
+        for j in range(1, self._players + 1):
+            candidate = ((self.turn.astype(np.int16) + j - 1)
+                         % self._players + 1).astype(np.int8)
+            can_move = self._legal_for(candidate).reshape(len(self), -1) \
+                .any(axis=1)
+            take = active & ~found & can_move
+            turn[take] = candidate[take]
+            found |= take
+        self.turn = turn
+        self.done |= active & ~found
+
+    def step(self, policy: Policy) -> np.ndarray:
+        """
+        Asks the policy for one move per unfinished game and applies them
+
+        Returns: The moves chosen by the policy
+        """
+        moves = policy(self, self.legal_moves())
+        self.apply_moves(moves)
+        return moves
+
+    def play(self, policy: Policy, max_steps: Optional[int] = None) \
+        -> np.ndarray:
+        """
+        Plays every game until it is over (or for at most max_steps
+        steps) using the given policy
+
+        Returns: The outcome of the games (see outcome)
+        """
+        steps = 0
+        while not self.done.all() and (max_steps is None or
+                                       steps < max_steps):
+            self.step(policy)
+            steps += 1
+        return self.outcome()
+
+    def piece_counts(self) -> np.ndarray:
+        """
+        Returns a (K, players) array with the number of pieces of each
+        player (column p - 1 for player p) on every board
+        """
+        players = np.arange(1, self._players + 1, dtype=np.int8)
+        return (self.boards[:, None, :, :] ==
+                players[None, :, None, None]).sum(axis=(2, 3))
+
+    def outcome(self) -> np.ndarray:
+        """
+        Returns a (K, players) boolean array marking the winners of every
+        finished game (more than one winner means a tie). Rows for games
+        that are not over are all False.
+        """
+        counts = self.piece_counts()
+        winners = counts == counts.max(axis=1, keepdims=True)
+        return winners & self.done[:, None]
+
+    def game(self, k: int) -> Reversi:
+        """
+        Returns board k as a Reversi game
+        """
+        game = Reversi(self._side, self._players, False)
+        grid = [[int(cell) or None for cell in row] for row in self.boards[k]]
+        game.load_game(int(self.turn[k]), grid)
+        return game
+
+
+def random_policy(rng: Optional[np.random.Generator] = None) -> Policy:
+    """
+    Returns a policy that plays a uniformly random legal move on every
+    board
+    """
+    if rng is None:
+        rng = np.random.default_rng()
+
+    def policy(batch: BatchReversi, legal: np.ndarray) -> np.ndarray:
+        noise = rng.random(legal.shape)
+        return np.where(legal, noise, -1.0).reshape(len(batch), -1) \
+            .argmax(axis=1)
+
+    return policy
+
+
+def greedy_policy(batch: BatchReversi, legal: np.ndarray) -> np.ndarray:
+    """
+    Policy that plays, on every board, the legal move that flips the most
+    pieces (the first such move in row-major order, like SmartBot)
+    """
+    # Moves in the center never flip (see BatchReversi.apply_moves)
+    counts = batch.flip_counts(batch.turn).astype(np.int32) * \
+        ~batch._center + 1
+    scores = np.where(legal, counts, 0)
+    return scores.reshape(len(batch), -1).argmax(axis=1)
@@ -0,0 +1,235 @@
+"""
+Opening book.
+
+A book maps positions to the moves played from them, with the number of
+games and the total score of each move. Positions are identified by
+their canonical key (see symmetry.canonical_key), so every orientation
+of a position shares its entries, and moves are stored in the canonical
+orientation.
+
+The book file is a header (BOOK_HEADER) followed by fixed-size entries
+(BOOK_ENTRY) sorted by key and move. OpeningBook reads it through mmap
+and finds the entries of a position by binary search, so opening a
+book does not read it.
+"""
+import mmap
+import struct
+from typing import List, Tuple, Optional, Dict, NamedTuple
+import click
+from reversi import ReversiBase, new_reversi
+from records import GameDatabase, GameRecord
+from symmetry import canonical, encoding_key, to_canonical, from_canonical, \
+    transform_cells, transform_square, stabilizer
+
+BOOK_HEADER = struct.Struct("<4sI")
+"""Header of a book file: BOOK_MAGIC and number of entries"""
+
+BOOK_MAGIC = b"RBK2"
+
+BOOK_ENTRY = struct.Struct("<QHIf")
+"""
+Entry of a book file: canonical key of the position, square index of
+the move (in the canonical orientation), number of games and total score
+of the player who made the move
+"""
+
+
+class BookMove(NamedTuple):
+    """
+    A move found in the book for a position
+    """
+    move: Tuple[int, int]
+    games: int
+    score: float
+    """Total score of the move (1 per win, 1/2 per tie among two...)"""
+
+    @property
+    def average(self) -> float:
+        return self.score / self.games if self.games else 0.0
+
+
+def _position(game: ReversiBase) -> Tuple[int, int]:
+    """
+    Returns the canonical key of a game and its transform
+    """
+    data, t = canonical(game)
+    return encoding_key(data), t
+
+
+class BookBuilder:
+    """
+    Collects moves and their results, and writes them as a book file
+    """
+
+    _entries: Dict[Tuple[int, int], List[float]]
+
+    def __init__(self):
+        self._entries = {}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def add_result(self, game: ReversiBase, move: Tuple[int, int],
+                   score: float, games: int = 1) -> None:
+        """
+        Adds the result of playing a move from a position
+
+        Args:
+            game: Position before the move
+            move: Move played
+            score: Score of the player who made the move: its share of
+            the outcome of a game, or a value found by a search
+            games: Number of games (or the weight) the score stands for
+        """
+        data, t = canonical(game)
+        side = game.size
+        r, c = to_canonical(move, t, side)
+        # Moves that the symmetries of the position itself make equivalent
+        # (like the four first moves of Othello) share one entry
+        cells = transform_cells(game.cells(), t, side)
+        r, c = min(transform_square(r, c, u, side)
+                   for u in stabilizer(cells, side))
+        key = encoding_key(data)
+        entry = self._entries.setdefault((key, r * side + c), [0, 0.0])
+        entry[0] += games
+        entry[1] += score
+
+    def add_game(self, record: GameRecord, plies: int = 12) -> None:
+        """
+        Adds the first plies moves of a recorded game, scoring every move
+        by the outcome of the game for the player who made it
+        """
+        game = new_reversi(record.side, record.players, record.othello)
+        share = 1 / len(record.winners) if record.winners else 0.0
+        for move in record.moves[:plies]:
+            score = share if game.turn in record.winners else 0.0
+            self.add_result(game, move, score)
+            game.apply_move(move)
+
+    def add_records(self, records: GameDatabase, plies: int = 12) -> None:
+        """
+        Adds the openings of every game in a game database
+        """
+        for game_id in range(len(records)):
+            self.add_game(records[game_id], plies)
+
+    def write(self, path: str, min_games: int = 1) -> int:
+        """
+        Writes the book, leaving out moves played in fewer than min_games
+        games
+
+        Returns: The number of entries written
+        """
+        entries = sorted((key, square, games, score)
+                         for (key, square), (games, score)
+                         in self._entries.items() if games >= min_games)
+        with open(path, "wb") as f:
+            f.write(BOOK_HEADER.pack(BOOK_MAGIC, len(entries)))
+            for entry in entries:
+                f.write(BOOK_ENTRY.pack(*entry))
+        return len(entries)
+
+
+class OpeningBook:
+    """
+    Read-only opening book backed by a memory-mapped book file
+    """
+
+    _map: Optional[mmap.mmap]
+    _count: int
+
+    def __init__(self, path: str):
+        """
+        Constructor
+
+        Raises:
+            ValueError: If the file is not a book, or is truncated
+        """
+        with open(path, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self._map) < BOOK_HEADER.size:
+            raise ValueError("book file is too short")
+        magic, self._count = BOOK_HEADER.unpack_from(self._map)
+        if magic != BOOK_MAGIC:
+            raise ValueError("not a book file")
+        if len(self._map) != BOOK_HEADER.size + self._count * BOOK_ENTRY.size:
+            raise ValueError("size of the book file is inconsistent with \
+                its number of entries")
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __enter__(self) -> "OpeningBook":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def close(self) -> None:
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+
+    def _key_at(self, i: int) -> int:
+        return struct.unpack_from("<Q", self._map,
+                                  BOOK_HEADER.size + i * BOOK_ENTRY.size)[0]
+
+    def lookup(self, game: ReversiBase) -> List[BookMove]:
+        """
+        Returns the book moves for a position, in the orientation of the
+        given game (an empty list if the position is not in the book)
+        """
+        key, t = _position(game)
+        lo, hi = 0, self._count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._key_at(mid) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+
+        moves = []
+        side = game.size
+        while lo < self._count:
+            entry_key, square, games, score = BOOK_ENTRY.unpack_from(
+                self._map, BOOK_HEADER.size + lo * BOOK_ENTRY.size)
+            if entry_key != key:
+                break
+            move = from_canonical(divmod(square, side), t, side)
+            moves.append(BookMove(move, games, score))
+            lo += 1
+        return moves
+
+    def best_move(self, game: ReversiBase, min_games: int = 1) \
+        -> Optional[Tuple[int, int]]:
+        """
+        Returns the book move with the best average score among those
+        played in at least min_games games, or None if there is none
+        """
+        moves = [m for m in self.lookup(game) if m.games >= min_games]
+        if not moves:
+            return None
+        return max(moves, key=lambda m: (m.average, m.games)).move
+
+
+@click.command(name="Reversi-Book")
+@click.argument('records', type=click.Path(exists=True, file_okay=False))
+@click.argument('output', type=click.Path(dir_okay=False))
+@click.option('-p', '--plies', type=click.INT, default=12,
+              help="Number of opening moves of every game to add")
+@click.option('-m', '--min-games', type=click.INT, default=1,
+              help="Leave out moves played in fewer games")
+def cmd(records, output, plies, min_games):
+    """
+    Builds an opening book from the games recorded in the RECORDS
+    directory (see Reversi-Bot --record) and writes it to OUTPUT.
+    """
+    builder = BookBuilder()
+    with GameDatabase(records) as db:
+        builder.add_records(db, plies)
+        count = builder.write(output, min_games)
+        print(f"{count} book entries from {len(db)} games")
+
+
+if __name__ == "__main__":
+    cmd()
@@ -1,15 +1,28 @@
 from abc import abstractmethod
-from reversi import Reversi, Board, ReversiPiece
-from typing import List, Tuple, Optional, Union
+from reversi import Reversi, ReversiBase, ReversiPiece, new_reversi
+from records import GameDatabase, GameRecord
+from book import OpeningBook
+from tables import PerfectPlayTable
+from stats import SPRT
+from instrument import BotProfile, CountingBoard, merge_profiles
+from transposition import TranspositionTable, EXACT, LOWER, UPPER
+from typing import List, Tuple, Optional, Union, Dict, NamedTuple, \
+    Iterator, Callable
+from functools import lru_cache
+from concurrent.futures import ProcessPoolExecutor
+import json
+import math
 import sys
+import time
 import random
 import click
 
-def initiate_game(s: int, p: int, o:bool) -> Reversi: 
+def initiate_game(s: int, p: int, o:bool) -> ReversiBase: 
     """ 
-    Returns a new reversi board game.
+    Returns a new reversi board game, using the bitboard backend
+    whenever the board size and number of players allow it.
     """
-    reversi = Reversi(side=s, players=p, othello=o)
+    reversi = new_reversi(side=s, players=p, othello=o)
     return reversi
 
 
@@ -31,14 +44,41 @@ class BotBase(ReversiPiece):
         super().__init__(player)
         self.wins = 0
         self.ties = 0
+        self.profile: Optional[BotProfile] = None
     
     @abstractmethod
-    def strategy(self, moves: list, board: Reversi) -> None:
+    def strategy(self, moves: list, board: Reversi) -> Tuple[int, int]:
         """
-        The strategy of a particular bot. 
+        The strategy of a particular bot. Applies the chosen move to the
+        board.
+
+        Returns: The move that was played
         """
         raise NotImplementedError
 
+    def close(self) -> None:
+        """
+        Releases what the bot holds (like worker processes)
+        """
+
+    def play(self, moves: list, board: Reversi) -> Tuple[int, int]:
+        """
+        Plays a move with the strategy of the bot, counting its calls on
+        the board and timing it if the bot has a profile
+
+        Returns: The move that was played
+        """
+        if self.profile is None:
+            return self.strategy(moves, board)
+        counters = self.profile.counters
+        start = time.perf_counter()
+        move = self.strategy(moves, CountingBoard(board, counters))
+        self.profile.latency.record(time.perf_counter() - start)
+        nodes = getattr(self, "nodes", None)
+        if nodes is not None:
+            counters["nodes"] += nodes
+        return move
+
 
 class RandomBot(BotBase): 
     """ 
@@ -49,13 +89,14 @@ class RandomBot(BotBase):
     def __init__(self, player: int):
         super().__init__(player)
 
-    def strategy(self, moves: list, board) -> None:
+    def strategy(self, moves: list, board) -> Tuple[int, int]:
         """ 
         Plays a random move from the current avialable moves on the board.
         """
 
         move = random.choice(moves)
         board.apply_move(move)
+        return move
         
 class SmartBot(BotBase): 
     """ 
@@ -66,22 +107,22 @@ class SmartBot(BotBase):
     def __init__(self, player: int):
         super().__init__(player)
     
-    def strategy(self, moves: list, board: Reversi) -> None:
+    def strategy(self, moves: list, board: Reversi) -> Tuple[int, int]:
         """ 
         Plays the the move that results in it having the most peices on the board. 
         """
-        curr_n = len(board.board.locations(board.turn))
-        pos_moves = moves
-        best_move = pos_moves[0]
-        for move in pos_moves:
-            new_board: Reversi = board.simulate_moves([move])
-            new_n = len(new_board.board.locations(board.turn))
+        best_move = moves[0]
+        best_n = 0
+        for move, flips in board.available_moves_with_flips(board.turn):
+            # The placed piece plus every flipped piece
+            new_n = 1 + len(flips)
 
-            if new_n > curr_n: 
-                curr_n = new_n
+            if new_n > best_n: 
+                best_n = new_n
                 best_move = move 
 
         board.apply_move(best_move)
+        return best_move
 
 class SmarterBot(BotBase): 
     """ 
@@ -92,7 +133,7 @@ class SmarterBot(BotBase):
     def __init__(self, player: int):
         super().__init__(player)
     
-    def strategy(self, moves, board: Reversi) -> None: 
+    def strategy(self, moves, board: Reversi) -> Tuple[int, int]: 
         """ 
         Plays the move that results either it winning the game, causing the next player to have no possible moves, or 
         in the greatest number of its pieces on the board after the next player has played. 
@@ -100,29 +141,29 @@ class SmarterBot(BotBase):
         pos_moves = moves
         m_values = []
         for move in pos_moves:
-            new_board = board.simulate_moves([move])
+            record = board.apply_move(move)
             
-            #Checks if player wins on simulated board, if so applies move. 
-            if new_board.outcome == [self.player]: 
-                board.apply_move(move)
-                return 
+            #Checks if player wins after the move, if so keeps the move. 
+            if board.outcome == [self.player]: 
+                return move
 
             m_value = 0 
-            next_ms = new_board.available_moves
+            next_ms = board.available_moves
 
-            #Checks if opposing player has no moves on new board, if so applies move. 
+            #Checks if opposing player has no moves after the move, if so keeps the move. 
             if next_ms == []: 
-                board.apply_move(move)
-                return
+                return move
 
             #Else: finds highest m-value and applies the corresponding move. 
             for m in next_ms: 
-                n_new_board = new_board.simulate_moves([m])
-                count = len(n_new_board.board.locations(self.player))
+                n_record = board.apply_move(m)
+                count = board.piece_counts(self.player)
+                board.undo_move(n_record)
                 m_value += count 
             if next_ms != []: 
                 m_value = m_value//len(next_ms)
             m_values.append(m_value)
+            board.undo_move(record)
 
         highest_m = 0
         ind = 0
@@ -132,15 +173,791 @@ class SmarterBot(BotBase):
                 ind = i
                  
         board.apply_move(pos_moves[ind])
+        return pos_moves[ind]
+
+
+class BookBot(BotBase): 
+    """ 
+    Class for a Bot that plays book moves while the game is in the opening
+    book, and the moves of another bot once it is out of it. 
+    """
+    player: int
+
+    def __init__(self, player: int, book: OpeningBook, bot: BotBase):
+        super().__init__(player)
+        self.book = book
+        self.bot = bot
+        self.nodes = None
+
+    def strategy(self, moves, board: Reversi) -> Tuple[int, int]: 
+        """ 
+        Plays the book move with the best average score, if there is one. 
+        """
+        move = self.book.best_move(board)
+        if move is None or move not in moves: 
+            move = self.bot.strategy(moves, board)
+            self.nodes = getattr(self.bot, "nodes", None)
+            return move
+        self.nodes = None
+        board.apply_move(move)
+        return move
+
+    def close(self) -> None:
+        self.bot.close()
+
+
+class TableBot(BotBase): 
+    """ 
+    Class for a Bot that plays perfectly from a perfect-play table, and
+    plays the moves of another bot in positions missing from the table. 
+    """
+    player: int
+
+    def __init__(self, player: int, table: PerfectPlayTable, bot: BotBase):
+        super().__init__(player)
+        self.table = table
+        self.bot = bot
+        self.nodes = None
+
+    def strategy(self, moves, board: Reversi) -> Tuple[int, int]: 
+        """ 
+        Plays the perfect-play move, if the position is in the table. 
+        """
+        move = self.table.best_move(board)
+        if move is None: 
+            move = self.bot.strategy(moves, board)
+            self.nodes = getattr(self.bot, "nodes", None)
+            return move
+        self.nodes = None
+        board.apply_move(move)
+        return move
+
+    def close(self) -> None:
+        self.bot.close()
+
+
+WIN_SCORE = 100000
+"""Value of a won game (plus the difference in pieces)"""
+
+
+@lru_cache(maxsize=None)
+def square_weights(side: int) -> Dict[Tuple[int, int], int]:
+    """ 
+    Returns the positional weight of the squares that matter most: the
+    corners (which can never be flipped), and the squares next to them
+    (which give the opponent access to the corners). 
+    """
+    last = side - 1
+    weights = {}
+    for r, dr in ((0, 1), (last, -1)):
+        for c, dc in ((0, 1), (last, -1)):
+            weights[(r, c)] = 25
+            weights[(r + dr, c + dc)] = -10
+            weights[(r + dr, c)] = -4
+            weights[(r, c + dc)] = -4
+    return weights
+
+
+def evaluate(board: ReversiBase, player: int) -> int: 
+    """ 
+    Heuristic value of a position for the given player: pieces, mobility
+    and corners, minus the best of the same score among the other
+    players. Finished games are worth more than any heuristic value. 
+    """
+    weights = square_weights(board.size)
+    scores = {p: board.piece_counts(p) for p in range(1, board.num_players + 1)}
+
+    if board.done:
+        diff = scores[player] - max(v for p, v in scores.items() if p != player)
+        if diff > 0:
+            return WIN_SCORE + diff
+        if diff < 0:
+            return -WIN_SCORE + diff
+        return 0
+
+    for pos, weight in weights.items():
+        piece = board.piece_at(pos)
+        if piece is not None:
+            scores[piece] += weight
+    for p in scores:
+        scores[p] += 4 * len(board.available_moves_for_player(p))
+
+    return scores[player] - max(v for p, v in scores.items() if p != player)
+
+
+class OutOfBudget(Exception):
+    """ 
+    Raised inside a search when its time or node budget is spent. 
+    """
+
+
+class SearchBot(BotBase): 
+    """ 
+    Abstract Base Class for a Bot that searches the game tree within a
+    time and/or node budget per move. 
+    """
+    player: int
+
+    def __init__(self, player: int, budget_ms: Optional[float] = 100,
+                 budget_nodes: Optional[int] = None, max_depth: int = 64):
+        """
+        Constructor
+
+        Args:
+            player: integer number of a specific player
+            budget_ms: time allowed per move in milliseconds (None for
+            no time limit)
+            budget_nodes: number of positions allowed per move (None for
+            no node limit)
+            max_depth: deepest search
+        """
+        super().__init__(player)
+        self.budget_ms = budget_ms
+        self.budget_nodes = budget_nodes
+        self.max_depth = max_depth
+        self.nodes = 0
+        self.depth = 0
+        self._deadline: Optional[float] = None
+        self._node_limit: Optional[int] = None
+
+    def _start(self) -> None:
+        """ 
+        Starts the budget of a new move. 
+        """
+        self.nodes = 0
+        self.depth = 0
+        if self.budget_ms is not None:
+            self._deadline = time.perf_counter() + self.budget_ms / 1000
+        else:
+            self._deadline = None
+        self._node_limit = self.budget_nodes
+
+    def _spend(self) -> None:
+        """ 
+        Counts a node, and stops the search if the budget is spent. 
+        """
+        self.nodes += 1
+        if self._node_limit is not None and self.nodes > self._node_limit:
+            raise OutOfBudget
+        if self._deadline is not None and time.perf_counter() >= \
+            self._deadline:
+            raise OutOfBudget
+
+
+class AlphaBetaBot(SearchBot): 
+    """ 
+    Class for a Bot that searches the game tree with alpha-beta (negamax)
+    and iterative deepening, within a time and/or node budget per move.
+    Moves are ordered by the transposition table, killer moves and the
+    history heuristic. The search is meant for two players; with more,
+    every other player is treated as the opponent of the player to move. 
+    """
+    player: int
+
+    def __init__(self, player: int, budget_ms: Optional[float] = 100,
+                 budget_nodes: Optional[int] = None, max_depth: int = 64,
+                 tt: Optional[TranspositionTable] = None):
+        """
+        Constructor
+
+        Args:
+            player: integer number of a specific player
+            budget_ms: time allowed per move in milliseconds (None for
+            no time limit)
+            budget_nodes: number of positions allowed per move (None for
+            no node limit)
+            max_depth: deepest search
+            tt: transposition table (a new one by default)
+        """
+        super().__init__(player, budget_ms, budget_nodes, max_depth)
+        self.tt = tt if tt is not None else TranspositionTable()
+        self.history: Dict[Tuple[int, Tuple[int, int]], int] = {}
+        self.killers: List[List[Optional[Tuple[int, int]]]] = []
+
+    def strategy(self, moves, board: Reversi) -> Tuple[int, int]: 
+        """ 
+        Plays the best move found by the deepest search completed within
+        the budget. 
+        """
+        best = moves[0]
+        self._start()
+        if len(moves) > 1:
+            self.tt.new_search()
+            self.killers = [[None, None] for _ in range(self.max_depth + 1)]
+            # Older history counts matter less as the game moves on
+            self.history = {k: v // 2 for k, v in self.history.items() if v > 1}
+
+            empties = board.size * board.size - sum(
+                board.piece_counts(p) for p in range(1, board.num_players + 1))
+            for depth in range(1, self.max_depth + 1):
+                try:
+                    value, best = self._root(board, moves, depth, best)
+                except OutOfBudget:
+                    break
+                self.depth = depth
+                if abs(value) >= WIN_SCORE or depth >= empties:
+                    break
+
+        board.apply_move(best)
+        return best
+
+    def _ordered(self, board: ReversiBase, moves, ply: int,
+                 first: Optional[Tuple[int, int]]) -> list:
+        """ 
+        Orders moves: the given first move, then the killer moves of the
+        ply, then by history score. 
+        """
+        player = board.turn
+        killers = self.killers[ply]
+        history = self.history
+
+        def rank(move):
+            if move == first:
+                return (0, 0)
+            if move in killers:
+                return (1, 0)
+            return (2, -history.get((player, move), 0))
+
+        return sorted(moves, key=rank)
+
+    def _child(self, board: ReversiBase, move, depth: int, alpha: float,
+               beta: float, ply: int) -> float:
+        """ 
+        Returns the value of a move for the player who makes it. 
+        """
+        player = board.turn
+        record = board.apply_move(move)
+        try:
+            if board.turn == player:
+                # Every other player had to pass
+                return self._negamax(board, depth - 1, alpha, beta, ply + 1)
+            return -self._negamax(board, depth - 1, -beta, -alpha, ply + 1)
+        finally:
+            board.undo_move(record)
+
+    def _root(self, board: ReversiBase, moves, depth: int,
+              first: Tuple[int, int]) -> Tuple[float, Tuple[int, int]]:
+        """ 
+        Searches every move at the root to the given depth. 
+        """
+        self._spend()
+        alpha, beta = -float("inf"), float("inf")
+        best = first
+        for move in self._ordered(board, moves, 0, first):
+            value = self._child(board, move, depth, alpha, beta, 0)
+            if value > alpha:
+                alpha, best = value, move
+        self.tt.store(board.zobrist, depth, alpha, EXACT, best)
+        return alpha, best
+
+    def _negamax(self, board: ReversiBase, depth: int, alpha: float,
+                 beta: float, ply: int) -> float:
+        """ 
+        Returns the value of the position for the player to move. 
+        """
+        self._spend()
+        player = board.turn
+        if depth == 0 or board.done:
+            return evaluate(board, player)
+
+        key = board.zobrist
+        first = None
+        entry = self.tt.get(key)
+        if entry is not None:
+            first = entry.move
+            if entry.depth >= depth:
+                if entry.flag == EXACT:
+                    return entry.value
+                if entry.flag == LOWER:
+                    alpha = max(alpha, entry.value)
+                else:
+                    beta = min(beta, entry.value)
+                if alpha >= beta:
+                    return entry.value
+
+        original_alpha = alpha
+        best, best_move = -float("inf"), None
+        for move in self._ordered(board, board.available_moves, ply, first):
+            value = self._child(board, move, depth, alpha, beta, ply)
+            if value > best:
+                best, best_move = value, move
+                if value > alpha:
+                    alpha = value
+                    if alpha >= beta:
+                        killers = self.killers[ply]
+                        if move != killers[0]:
+                            killers[1] = killers[0]
+                            killers[0] = move
+                        self.history[(player, move)] = \
+                            self.history.get((player, move), 0) + depth * depth
+                        break
+
+        if best <= original_alpha:
+            flag = UPPER
+        elif best >= beta:
+            flag = LOWER
+        else:
+            flag = EXACT
+        self.tt.store(key, depth, best, flag, best_move)
+        return best
+
+
+def rollouts(data: bytes, count: int, seed: int) -> List[float]:
+    """ 
+    Plays random games from a position encoded by to_bytes. Runs in the
+    worker processes of MCTSBot, so positions travel as a few bytes.
+
+    Args:
+        data: encoded position
+        count: number of games to play
+        seed: seed of the random moves
+
+    Returns: the total score of every player (1 per win, shared by the
+    winners of a tie), indexed by player number (index 0 is unused)
+    """
+    rng = random.Random(seed)
+    start = ReversiBase.from_bytes(data)
+    scores = [0.0] * (start.num_players + 1)
+    for _ in range(count):
+        game = start.simulate_moves([])
+        while not game.done:
+            game.apply_move(rng.choice(game.available_moves))
+        winners = game.outcome
+        for player in winners:
+            scores[player] += 1 / len(winners)
+    return scores
+
+
+class MCTSNode:
+    """ 
+    Node of the search tree of MCTSBot. 
+    """
+    move: Optional[Tuple[int, int]]
+    player: int
+    key: int
+    children: Dict[Tuple[int, int], "MCTSNode"]
+    untried: list
+    visits: int
+    pending: int
+    scores: List[float]
+
+    def __init__(self, board: ReversiBase, move: Optional[Tuple[int, int]],
+                 player: int):
+        """
+        Constructor
+
+        Args:
+            board: position of the node
+            move: move that led to the node
+            player: player who made the move
+        """
+        self.move = move
+        self.player = player
+        self.key = board.zobrist
+        self.children = {}
+        self.untried = [] if board.done else list(board.available_moves)
+        self.visits = 0
+        self.pending = 0
+        self.scores = [0.0] * (board.num_players + 1)
+
+
+class MCTSBot(BotBase): 
+    """ 
+    Class for a Bot that plays Monte Carlo tree search (UCT), for any
+    number of players: every node scores the random games played through
+    it for every player, and each player picks the moves best for itself.
+    The tree is kept between moves. Random games can run in a pool of
+    worker processes, in batches of leaves kept apart by virtual visits.
+    """
+    player: int
+
+    def __init__(self, player: int, playouts: int = 200, workers: int = 0,
+                 exploration: float = 1.4, batch: int = 4,
+                 seed: Optional[int] = None):
+        """
+        Constructor
 
+        Args:
+            player: integer number of a specific player
+            playouts: number of random games played per move
+            workers: number of worker processes (0 plays the games in
+            this process)
+            exploration: UCT exploration constant
+            batch: random games per leaf, sent to a worker at once
+            seed: seed of the random games (by default drawn from the
+            global random generator)
+        """
+        super().__init__(player)
+        self.playouts = playouts
+        self.workers = workers
+        self.exploration = exploration
+        self.batch = batch
+        # Without a seed, follow the global generator, so that games
+        # replay exactly after random.seed
+        self.rng = random.Random(seed if seed is not None
+                                 else random.getrandbits(64))
+        self.root: Optional[MCTSNode] = None
+        self._pool: Optional[ProcessPoolExecutor] = None
+
+    def close(self) -> None:
+        """ 
+        Shuts down the worker processes. 
+        """
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+    def _reuse(self, board: ReversiBase) -> MCTSNode:
+        """ 
+        Returns the node of the kept tree for the current position (the
+        other players have moved since it was kept), or a new root. 
+        """
+        key = board.zobrist
+        level = [self.root] if self.root is not None else []
+        for _ in range(board.num_players + 1):
+            for node in level:
+                if node.key == key:
+                    return node
+            level = [child for node in level
+                     for child in node.children.values()]
+        return MCTSNode(board, None, 0)
+
+    def _select(self, node: MCTSNode) -> MCTSNode:
+        """ 
+        Returns the child with the best UCT value for the player to move. 
+        """
+        log_n = math.log(node.visits + node.pending)
+        c = self.exploration
+
+        def uct(child):
+            n = child.visits + child.pending
+            return child.scores[child.player] / n + c * math.sqrt(log_n / n)
+
+        return max(node.children.values(), key=uct)
+
+    def _descend(self, root: MCTSNode, board: ReversiBase) \
+        -> Tuple[List[MCTSNode], list]:
+        """ 
+        Walks down from the root to a node to expand, applying the moves
+        to the board, and expands it. 
+
+        Returns: the nodes of the path, and the records of the moves
+        """
+        path, records = [root], []
+        node = root
+        while not node.untried and node.children:
+            node = self._select(node)
+            records.append(board.apply_move(node.move))
+            path.append(node)
+        if node.untried:
+            move = node.untried.pop(self.rng.randrange(len(node.untried)))
+            player = board.turn
+            records.append(board.apply_move(move))
+            child = MCTSNode(board, move, player)
+            node.children[move] = child
+            path.append(child)
+        for n in path:
+            n.pending += 1
+        return path, records
+
+    @staticmethod
+    def _backup(path: List[MCTSNode], count: int, scores: List[float]) \
+        -> None:
+        """ 
+        Adds the results of random games to every node of a path. 
+        """
+        for node in path:
+            node.pending -= 1
+            node.visits += count
+            for p, score in enumerate(scores):
+                node.scores[p] += score
+
+    def strategy(self, moves, board: Reversi) -> Tuple[int, int]: 
+        """ 
+        Plays the most visited move after the given number of random
+        games. 
+        """
+        root = self._reuse(board)
+        work = board.simulate_moves([])
+        if self.workers and self._pool is None:
+            self._pool = ProcessPoolExecutor(self.workers)
+
+        played = 0
+        while played < self.playouts and len(moves) > 1:
+            # Leaves for one round: a batch per worker, or one batch
+            leaves = []
+            for _ in range(max(self.workers, 1)):
+                path, records = self._descend(root, work)
+                leaves.append((path, work.to_bytes(),
+                               self.rng.getrandbits(64)))
+                for record in reversed(records):
+                    work.undo_move(record)
+
+            if self._pool is not None:
+                futures = [self._pool.submit(rollouts, data, self.batch, seed)
+                           for _, data, seed in leaves]
+                results = [future.result() for future in futures]
+            else:
+                results = [rollouts(data, self.batch, seed)
+                           for _, data, seed in leaves]
+            for (path, _, _), scores in zip(leaves, results):
+                self._backup(path, self.batch, scores)
+            played += self.batch * len(leaves)
+
+        if root.children:
+            best = max(root.children.values(),
+                       key=lambda child: child.visits).move
+        else:
+            best = moves[0]
+        self.root = root.children.get(best)
+        board.apply_move(best)
+        return best
+
+
+CORNER_WEIGHT = 10
+"""Extra worth of a corner piece in the scores of MultiPlayerBot"""
+
+
+class MultiPlayerBot(SearchBot): 
+    """ 
+    Class for a Bot that searches the game tree for any number of players,
+    with iterative deepening within a time and/or node budget per move.
+
+    Every position is scored for every player: one point per piece and
+    CORNER_WEIGHT more per corner. The scores are kept up to date from
+    the undo records of the moves (see MoveRecord), so they cost a few
+    additions per flipped piece instead of a scan of the board.
+
+    In "maxn" mode every player picks the move best for its own score.
+    The scores are never negative, and add up to at most the number of
+    pieces after the search depth plus the corners, so a player can stop
+    looking at its moves once it has one that leaves the previous player
+    no better off (shallow pruning). In "paranoid" mode the other players
+    play together against the bot, which allows alpha-beta pruning. 
+    """
+    player: int
+
+    def __init__(self, player: int, mode: str = "maxn", max_depth: int = 4,
+                 budget_ms: Optional[float] = 100,
+                 budget_nodes: Optional[int] = None):
+        """
+        Constructor
+
+        Args:
+            player: integer number of a specific player
+            mode: "maxn" or "paranoid"
+            max_depth: deepest search
+            budget_ms: time allowed per move in milliseconds (None for
+            no time limit)
+            budget_nodes: number of positions allowed per move (None for
+            no node limit)
+        """
+        if mode not in ("maxn", "paranoid"):
+            raise ValueError(f"unknown search mode {mode}")
+        super().__init__(player, budget_ms, budget_nodes, max_depth)
+        self.mode = mode
+        self._scores: List[int] = []
+        self._weights: Dict[Tuple[int, int], int] = {}
+        self._bound = 0
+
+    def strategy(self, moves, board: Reversi) -> Tuple[int, int]: 
+        """ 
+        Plays the best move found by the deepest search completed within
+        the budget. 
+        """
+        best = moves[0]
+        self._start()
+        if len(moves) > 1:
+            last = board.size - 1
+            self._weights = {corner: CORNER_WEIGHT for corner in
+                             [(0, 0), (0, last), (last, 0), (last, last)]}
+            self._scores = [0] + [board.piece_counts(p) for p in
+                                  range(1, board.num_players + 1)]
+            for corner, weight in self._weights.items():
+                piece = board.piece_at(corner)
+                if piece is not None:
+                    self._scores[piece] += weight
+            taken = sum(board.piece_at(corner) is not None
+                        for corner in self._weights)
+            pieces = sum(self._scores) - CORNER_WEIGHT * taken
+
+            for depth in range(1, self.max_depth + 1):
+                # Every move adds one piece and takes at most one corner
+                self._bound = min(board.size * board.size, pieces + depth) \
+                    + CORNER_WEIGHT * min(len(self._weights), taken + depth)
+                try:
+                    best = self._root(board, moves, depth, best)
+                except OutOfBudget:
+                    break
+                self.depth = depth
+                if pieces + depth >= board.size * board.size:
+                    break
+
+        board.apply_move(best)
+        return best
+
+    def _play(self, board: ReversiBase, move):
+        """ 
+        Applies a move and updates the scores. 
+
+        Returns: the undo record of the move
+        """
+        record = board.apply_move(move)
+        scores, weights = self._scores, self._weights
+        mover = record.prev_turn
+        scores[mover] += 1 + weights.get(record.pos, 0)
+        for pos, owner in zip(record.flipped, record.owners):
+            worth = 1 + weights.get(pos, 0)
+            scores[mover] += worth
+            scores[owner] -= worth
+        return record
+
+    def _unplay(self, board: ReversiBase, record) -> None:
+        """ 
+        Undoes a move applied by _play and restores the scores. 
+        """
+        scores, weights = self._scores, self._weights
+        mover = record.prev_turn
+        scores[mover] -= 1 + weights.get(record.pos, 0)
+        for pos, owner in zip(record.flipped, record.owners):
+            worth = 1 + weights.get(pos, 0)
+            scores[mover] -= worth
+            scores[owner] += worth
+        board.undo_move(record)
+
+    def _ordered(self, board: ReversiBase, first=None) -> list:
+        """ 
+        Returns the moves of the player to move: the given first move,
+        then corners, then the moves that flip the most pieces. 
+        """
+        weights = self._weights
+        moves = sorted(board.available_moves_with_flips(board.turn),
+                       key=lambda mf: -weights.get(mf[0], 0) - len(mf[1]))
+        ordered = [move for move, _ in moves]
+        if first in ordered:
+            ordered.remove(first)
+            ordered.insert(0, first)
+        return ordered
+
+    def _final(self, board: ReversiBase) -> List[float]:
+        """ 
+        Returns the scores of a finished game: the winners share the
+        largest possible total. 
+        """
+        scores = [0.0] * len(self._scores)
+        winners = board.outcome
+        for p in winners:
+            scores[p] = self._bound / len(winners)
+        return scores
+
+    def _root(self, board: ReversiBase, moves, depth: int,
+              first: Tuple[int, int]) -> Tuple[int, int]:
+        """ 
+        Searches every move at the root to the given depth. 
+
+        Returns: the best move
+        """
+        self._spend()
+        best, best_value = first, -float("inf")
+        for move in self._ordered(board, first):
+            record = self._play(board, move)
+            try:
+                if self.mode == "maxn":
+                    value = self._maxn(board, depth - 1, self.player,
+                                       best_value)[self.player]
+                else:
+                    value = self._paranoid(board, depth - 1, best_value,
+                                           float("inf"))
+            finally:
+                self._unplay(board, record)
+            if value > best_value:
+                best, best_value = move, value
+        return best
+
+    def _maxn(self, board: ReversiBase, depth: int, parent: int,
+              parent_best: float) -> List[float]:
+        """ 
+        Returns the scores of every player under max^n play. The search
+        stops early once the value cannot be better for the parent player
+        than parent_best. 
+        """
+        self._spend()
+        if board.done:
+            return self._final(board)
+        if depth == 0:
+            return list(self._scores)
+
+        player = board.turn
+        best = None
+        for move in self._ordered(board):
+            record = self._play(board, move)
+            try:
+                value = self._maxn(board, depth - 1, player,
+                                   best[player] if best else -float("inf"))
+            finally:
+                self._unplay(board, record)
+            if best is None or value[player] > best[player]:
+                best = value
+                if parent != player and \
+                    best[player] >= self._bound - parent_best:
+                    break
+        return best
+
+    def _paranoid(self, board: ReversiBase, depth: int, alpha: float,
+                  beta: float) -> float:
+        """ 
+        Returns the value of the position for the bot when all the other
+        players play against it. 
+        """
+        self._spend()
+        if board.done:
+            winners = board.outcome
+            if winners == [self.player]:
+                return WIN_SCORE
+            return 0 if self.player in winners else -WIN_SCORE
+        scores = self._scores
+        if depth == 0:
+            others = len(scores) - 2
+            return scores[self.player] - \
+                (sum(scores) - scores[self.player]) / others
+
+        maximizing = board.turn == self.player
+        best = -float("inf") if maximizing else float("inf")
+        for move in self._ordered(board):
+            record = self._play(board, move)
+            try:
+                value = self._paranoid(board, depth - 1, alpha, beta)
+            finally:
+                self._unplay(board, record)
+            if maximizing:
+                best = max(best, value)
+                alpha = max(alpha, value)
+            else:
+                best = min(best, value)
+                beta = min(beta, value)
+            if alpha >= beta:
+                break
+        return best
 
-def constructor(name: str, player: int) -> BotBase:
+
+BOT_NAMES = ['random', 'smart', 'very-smart', 'alphabeta', 'mcts', 'maxn',
+             'paranoid']
+"""Names of the bots that can be constructed"""
+
+
+def constructor(name: str, player: int, budget_ms: Optional[float] = 100,
+                budget_nodes: Optional[int] = None, playouts: int = 200,
+                workers: int = 0) -> BotBase:
     """ 
     Contructs the bots playing the game given the user inputs. 
 
     Args: 
         name: a given type of bot player 
         player: the integer assigned to the bot player 
+        budget_ms: time per move for searching bots, in milliseconds
+        budget_nodes: positions per move for searching bots
+        playouts: random games per move for Monte Carlo bots
+        workers: worker processes for Monte Carlo bots
 
     Returns: 
         BotBase: A bot player 
@@ -149,67 +966,379 @@ def constructor(name: str, player: int) -> BotBase:
         return RandomBot(player)
     elif name == "smart":
         return SmartBot(player)
+    elif name == "alphabeta":
+        return AlphaBetaBot(player, budget_ms, budget_nodes)
+    elif name == "mcts":
+        return MCTSBot(player, playouts, workers)
+    elif name in ("maxn", "paranoid"):
+        return MultiPlayerBot(player, name, budget_ms=budget_ms,
+                              budget_nodes=budget_nodes)
     else:
         #name == "very-smart":
         return SmarterBot(player)
 
 ### The Game ###
-def simulate(reversi: Reversi, number_of_games: int, bots: List[BotBase]) -> None: 
+class BotFactory(NamedTuple):
     """ 
-    Plays the input number of Reversi games on the given bot.
+    Settings of a bot, from which fresh bots are built for every game
+    (in worker processes too, so it holds names and paths only). 
+    """
+    name: str
+    budget_ms: Optional[float] = 100
+    budget_nodes: Optional[int] = None
+    playouts: int = 200
+    workers: int = 0
+    book: Optional[str] = None
+    """Path of an opening book to play from"""
+    table: Optional[str] = None
+    """Path of a perfect-play table to play from"""
+
+    def __call__(self, player: int) -> BotBase:
+        bot = constructor(self.name, player, self.budget_ms,
+                          self.budget_nodes, self.playouts, self.workers)
+        if self.book is not None:
+            bot = BookBot(player, open_book(self.book), bot)
+        if self.table is not None:
+            bot = TableBot(player, open_table(self.table), bot)
+        return bot
+
+
+@lru_cache(maxsize=None)
+def open_book(path: str) -> OpeningBook:
+    """ 
+    Returns the opening book at a path, opened once per process. 
+    """
+    return OpeningBook(path)
+
+
+@lru_cache(maxsize=None)
+def open_table(path: str) -> PerfectPlayTable:
+    """ 
+    Returns the perfect-play table at a path, opened once per process. 
+    """
+    return PerfectPlayTable(path)
+
+
+def game_seed(seed: int, game: int) -> int:
+    """ 
+    Returns the seed of the random generator for one game of a run, so
+    that every game plays the same wherever and in whatever order it is
+    played. 
+    """
+    return random.Random(f"{seed}-{game}").getrandbits(64)
+
+
+def play_game(reversi: ReversiBase, bots: List[BotBase]) \
+    -> Tuple[list, List[int]]:
+    """ 
+    Plays a game to the end.
 
     Args:
-        reversi: A Reversi game 
-        number_of_games: the number of games to be played 
-        bots: a list of bots playing the game 
+        reversi: the game, at its start position
+        bots: the bot of every player
 
+    Returns: the moves played and the winners
     """
-    for _ in range(number_of_games): 
-        reversi = initiate_game(8, 2, True)
+    played = []
+    outcome = reversi.outcome
+    while outcome == []: 
+        moves = reversi.available_moves_for_player(reversi.turn)
+        if moves != []: 
+            bot: BotBase = bots[reversi.turn - 1]
+            if bot is not None: 
+                played.append(bot.play(moves, reversi))
         outcome = reversi.outcome
-        while outcome == []: 
-            moves = reversi.available_moves_for_player(reversi.turn)
-            if moves != []: 
-                bot: BotBase = bots[reversi.turn - 1]
-                if bot is not None: 
-                    bot.strategy(moves, reversi)
-            outcome = reversi.outcome
+    return played, outcome
 
-        if len(outcome) == 1:
-            bots[outcome[0] - 1].wins += 1
 
-        else: 
-            for num in outcome: 
-                bots[num - 1].ties += 1
+class GameResult(NamedTuple):
+    """ 
+    Result of a game played by play_games. 
+    """
+    moves: list
+    winners: List[int]
+    profiles: Optional[Dict[int, BotProfile]] = None
+    """Profile of the bot of every player, if the bots were profiled"""
+
+
+def play_games(settings: Tuple[int, int, bool], factories: List[BotFactory],
+               seeds: List[int], profile: bool = False) -> List[GameResult]:
+    """ 
+    Plays one game per seed, with fresh bots for every game, after
+    seeding the global random generator with the seed of the game. Runs
+    in the worker processes of tournament.
+
+    Args:
+        settings: side, number of players and Othello flag of the games
+        factories: the factory of the bot of every player
+        seeds: seed of every game
+        profile: whether to profile the bots (see BotBase.play)
+
+    Returns: the result of every game
+    """
+    results = []
+    for seed in seeds:
+        random.seed(seed)
+        bots = [factory(player) for player, factory in
+                enumerate(factories, 1)]
+        if profile:
+            for bot in bots:
+                bot.profile = BotProfile()
+        try:
+            played, outcome = play_game(initiate_game(*settings), bots)
+        finally:
+            for bot in bots:
+                bot.close()
+        profiles = {bot.player: bot.profile for bot in bots} \
+            if profile else None
+        results.append(GameResult(played, outcome, profiles))
+    return results
+
+
+def iter_tournament(side: int, players: int, othello: bool,
+                    factories: List[BotFactory], number_of_games: int,
+                    jobs: int = 1, seed: int = 0, profile: bool = False) \
+    -> Iterator[GameResult]:
+    """ 
+    Plays a number of games, sharded across a pool of worker processes,
+    and yields the result of every game in game order as soon
+    as they are known. Game i is played with the seed game_seed(seed, i)
+    and fresh bots, so the results are the same for any number of jobs
+    (for bots with a time budget, the moves also depend on the speed of
+    the machine). Closing the iterator early cancels the games not
+    started yet.
+
+    Args:
+        side: number of squares on each side of the board
+        players: number of players
+        othello: whether the games start from the Othello configuration
+        factories: the factory of the bot of every player
+        number_of_games: the number of games to be played
+        jobs: number of worker processes (1 plays in this process)
+        seed: seed of the run
+        profile: whether to profile the bots (see BotBase.play)
+    """
+    settings = (side, players, othello)
+    seeds = [game_seed(seed, i) for i in range(number_of_games)]
+    if jobs <= 1:
+        for game in seeds:
+            yield from play_games(settings, factories, [game], profile)
+        return
+
+    # A few shards per job keeps the jobs busy when games are uneven
+    size = max(1, -(-number_of_games // (jobs * 4)))
+    pool = ProcessPoolExecutor(jobs)
+    try:
+        futures = [pool.submit(play_games, settings, factories,
+                               seeds[i:i + size], profile)
+                   for i in range(0, number_of_games, size)]
+        for future in futures:
+            yield from future.result()
+    finally:
+        pool.shutdown(cancel_futures=True)
+
+
+def tournament(side: int, players: int, othello: bool,
+               factories: List[BotFactory], number_of_games: int,
+               jobs: int = 1, seed: int = 0,
+               records: Optional[GameDatabase] = None,
+               profiles: Optional[Dict[int, BotProfile]] = None) \
+    -> List[List[int]]:
+    """ 
+    Plays a number of games (see iter_tournament).
+
+    Args:
+        side: number of squares on each side of the board
+        players: number of players
+        othello: whether the games start from the Othello configuration
+        factories: the factory of the bot of every player
+        number_of_games: the number of games to be played
+        jobs: number of worker processes (1 plays in this process)
+        seed: seed of the run
+        records: database to which every game is appended, in order
+        profiles: if given, the bots are profiled, and their profiles
+        are added to these, by player
+
+    Returns: the winners of every game
+    """
+    outcomes = []
+    for result in iter_tournament(side, players, othello, factories,
+                                  number_of_games, jobs, seed,
+                                  profiles is not None):
+        if records is not None:
+            records.append(GameRecord(side, players, othello, result.moves,
+                                      result.winners))
+        if profiles is not None:
+            merge_profiles(profiles, result.profiles)
+        outcomes.append(result.winners)
+    return outcomes
+
+
+def sequential_match(factories: List[BotFactory], test: SPRT,
+                     max_games: int, side: int = 8, othello: bool = True,
+                     jobs: int = 1, seed: int = 0,
+                     records: Optional[GameDatabase] = None,
+                     report: Optional[Callable[[SPRT], None]] = None,
+                     profiles: Optional[Dict[int, BotProfile]] = None) \
+    -> Optional[bool]:
+    """ 
+    Plays two bots against each other until a sequential test decides
+    whether the first is stronger, or max_games have been played.
+
+    Args:
+        factories: the factories of the two bots
+        test: the test, updated with the score of the first bot after
+        every game
+        max_games: the largest number of games to be played
+        side: number of squares on each side of the board
+        othello: whether the games start from the Othello configuration
+        jobs: number of worker processes (1 plays in this process)
+        seed: seed of the run
+        records: database to which every game is appended, in order
+        report: called with the test after every game
+        profiles: if given, the bots are profiled, and their profiles
+        are added to these, by player
+
+    Returns: the decision of the test (see SPRT.decision)
+    """
+    games = iter_tournament(side, 2, othello, factories, max_games, jobs,
+                            seed, profiles is not None)
+    try:
+        for result in games:
+            outcome = result.winners
+            if records is not None:
+                records.append(GameRecord(side, 2, othello, result.moves,
+                                          outcome))
+            if profiles is not None:
+                merge_profiles(profiles, result.profiles)
+            test.add(1.0 if outcome == [1] else 0.0 if outcome == [2]
+                     else 0.5)
+            if report is not None:
+                report(test)
+            if test.decision is not None:
+                break
+    finally:
+        games.close()
+    return test.decision
 
 ### Click ###
 @click.command(name="Reversi-Bot")
 @click.option('-n', '--num-games',  type=click.INT, default=100)
 @click.option('-1', '--player1',
-              type=click.Choice(['random', 'smart', 'very-smart'], case_sensitive=False),
+              type=click.Choice(BOT_NAMES, case_sensitive=False),
               default="random")
 @click.option('-2','--player2',
-              type=click.Choice(['random', 'smart', 'very-smart'], case_sensitive=False),
-              default="random")
+              type=click.Choice(BOT_NAMES, case_sensitive=False),
+              default="random",
+              help="Bot of player 2, and of any players after it")
+@click.option('-s', '--board-size', type=click.INT, default=8)
+@click.option('-p', '--players', type=click.INT, default=2)
+@click.option('--othello/--no-othello', default=None,
+              help="Start from the Othello configuration (by default, \
+                with two players only)")
+@click.option('-j', '--jobs', type=click.INT, default=1,
+              help="Worker processes playing the games")
+@click.option('--seed', type=click.INT, default=0)
+@click.option('--budget-ms', type=click.FLOAT, default=100,
+              help="Time per move for searching bots, in milliseconds")
+@click.option('--budget-nodes', type=click.INT, default=None,
+              help="Positions per move for searching bots")
+@click.option('--playouts', type=click.INT, default=200,
+              help="Random games per move for Monte Carlo bots")
+@click.option('--workers', type=click.INT, default=0,
+              help="Worker processes for the random games of Monte Carlo \
+                bots (0 plays them in this process)")
+@click.option('--sprt', is_flag=True,
+              help="Stop as soon as a sequential test decides whether \
+                player 1 is stronger (-n is then the most games)")
+@click.option('--elo0', type=click.FLOAT, default=0,
+              help="Elo difference of player 1 under the null hypothesis")
+@click.option('--elo1', type=click.FLOAT, default=50,
+              help="Elo difference of player 1 under the alternative")
+@click.option('--alpha', type=click.FLOAT, default=0.05)
+@click.option('--beta', type=click.FLOAT, default=0.05)
+@click.option('--record', type=click.Path(file_okay=False), default=None,
+              help="Directory of a game database to record the games in")
+@click.option('--book', type=click.Path(exists=True, dir_okay=False),
+              default=None, help="Opening book for both bots to play from")
+@click.option('--table', type=click.Path(exists=True, dir_okay=False),
+              default=None, help="Perfect-play table for both bots to play \
+                from (see Reversi-Tables)")
+@click.option('--profile-json', type=click.Path(dir_okay=False),
+              default=None, help="File to write the counters and move \
+                latencies of the bots to, as JSON")
 
-def cmd(num_games, player1, player2):
+def cmd(num_games, player1, player2, board_size, players, othello, jobs,
+        seed, budget_ms, budget_nodes, playouts, workers, sprt, elo0, elo1,
+        alpha, beta, record, book, table, profile_json):
     """ 
     Click command. 
     """
-    board = Reversi(side=8, players=2, othello=True)
+    factories = [BotFactory(name, budget_ms, budget_nodes, playouts, workers,
+                            book, table)
+                 for name in [player1] + [player2] * (players - 1)]
+    if othello is None:
+        othello = players == 2
+    if sprt and players != 2:
+        raise click.UsageError("--sprt compares two players")
+    try:
+        initiate_game(board_size, players, othello)
+    except ValueError as e:
+        reason = " ".join(str(e).split())
+        raise click.UsageError(f"cannot play on a {board_size}x{board_size} "
+                               f"board with {players} players: {reason}")
 
-    bot1 = constructor(player1, 1)
-    bot2 = constructor(player2, 2)
+    profiles = {} if profile_json is not None else None
+    records = GameDatabase(record) if record is not None else None
+    try:
+        if sprt:
+            test = SPRT(elo0, elo1, alpha, beta)
 
-    bots = [bot1, bot2]
-    ties = 0 
-    simulate(board, num_games, bots)
+            def report(test: SPRT) -> None:
+                elo, error = test.elo()
+                print(f"{test.games:6} games  W {test.wins} T {test.ties} "
+                      f"L {test.losses}  Elo {elo:+.1f} +/- {error:.1f}  "
+                      f"LLR {test.llr:+.2f} "
+                      f"[{test.lower:.2f}, {test.upper:.2f}]")
 
+            decision = sequential_match(factories, test, num_games,
+                                        board_size, othello, jobs, seed,
+                                        records, report, profiles)
+        else:
+            outcomes = tournament(board_size, players, othello, factories,
+                                  num_games, jobs, seed, records, profiles)
+    finally:
+        if records is not None:
+            records.close()
+
+    if profile_json is not None:
+        report_data = {str(player): {"bot": factories[player - 1].name,
+                                     **profile.to_dict()}
+                       for player, profile in sorted(profiles.items())}
+        with open(profile_json, "w") as f:
+            json.dump(report_data, f, indent=2)
+
+    if sprt:
+        if decision is None:
+            print(f"No decision after {test.games} games")
+        elif decision:
+            print(f"Player 1 is stronger by about {elo1:g} Elo (H1)")
+        else:
+            print(f"Player 1 is not stronger by {elo1:g} Elo (H0)")
+        return
+
+    wins = [0] * players
+    ties = 0
+    for outcome in outcomes:
+        if len(outcome) == 1:
+            wins[outcome[0] - 1] += 1
+        else:
+            ties += 1
 
-    for i, player in enumerate(bots): 
-        print(f"Player {i + 1} wins: {round((player.wins/num_games) * 100, 2)}%")
+    for i, won in enumerate(wins): 
+        print(f"Player {i + 1} wins: {round((won/num_games) * 100, 2)}%")
 
-    print(f"Ties: {round((bot1.ties/num_games) * 100, 2)}%")
+    print(f"Ties: {round((ties/num_games) * 100, 2)}%")
 
 
 if __name__ == "__main__":
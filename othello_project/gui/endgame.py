@@ -0,0 +1,398 @@
+"""
+Exact endgame solver for two-player Reversi.
+
+Solves positions with few empty squares by searching to the end of the
+game with alpha-beta (negamax) on a pair of bitboards: the pieces of the
+player to move and the pieces of the opponent. The value of a position
+is the final disc differential (the pieces of the player to move minus
+those of the opponent) under perfect play by both players.
+
+Moves are ordered by
+  * the best move stored in the transposition table, if any;
+  * fastest-first: moves that leave the opponent the fewest replies;
+  * parity: near the end, moves in regions of the board (quadrants) with
+    an odd number of empty squares, so that the player gets the last
+    move in the region.
+"""
+import random
+import time
+from typing import List, Tuple, Optional, NamedTuple
+import click
+from reversi import ReversiBase, new_reversi, _bit_directions, _splitmix64, \
+    _MASK64
+from transposition import TranspositionTable, EXACT, LOWER, UPPER
+
+
+class SolveResult(NamedTuple):
+    """
+    Result of solving a position
+    """
+    move: Optional[Tuple[int, int]]
+    """Best move (None if the game is over)"""
+    score: int
+    """Final disc differential for the player to move under perfect play"""
+    nodes: int
+    """Number of positions searched"""
+    seconds: float
+
+    @property
+    def nodes_per_second(self) -> float:
+        return self.nodes / self.seconds if self.seconds else 0.0
+
+
+def _popcount(bits: int) -> int:
+    return bin(bits).count("1")
+
+
+class EndgameSolver:
+    """
+    Exact solver for two-player positions with at most max_empties empty
+    squares (and the center filled, as it always is in an endgame)
+    """
+
+    nodes: int
+    _side: int
+    _full: int
+    _left: List[Tuple[int, int]]
+    _right: List[Tuple[int, int]]
+    _quadrants: List[int]
+    _tt: TranspositionTable
+    _max_empties: int
+
+    # Below this number of empty squares, moves are ordered by parity only
+    # and results are not stored in the transposition table, since there
+    # the overhead costs more than it saves
+    SHALLOW_EMPTIES = 7
+
+    def __init__(self, side: int = 8, max_empties: int = 20,
+                 tt: Optional[TranspositionTable] = None):
+        """
+        Constructor
+
+        Args:
+            side: Number of squares on each side of the board
+            max_empties: Largest number of empty squares solve accepts
+            tt: Transposition table to use (a new one by default)
+        """
+        self._side = side
+        self._full = (1 << (side * side)) - 1
+        dirs = _bit_directions(side)
+        self._left = [(shift, mask) for shift, mask in dirs if shift > 0]
+        self._right = [(-shift, mask) for shift, mask in dirs if shift < 0]
+        self._max_empties = max_empties
+        self._tt = tt if tt is not None else TranspositionTable(1 << 18)
+        self.nodes = 0
+
+        half = (side + 1) // 2
+        self._quadrants = [0, 0, 0, 0]
+        for r in range(side):
+            for c in range(side):
+                q = (r >= half) * 2 + (c >= half)
+                self._quadrants[q] |= 1 << (r * side + c)
+
+    def _moves(self, own: int, opp: int) -> int:
+        """
+        Returns the bitboard of the moves of the player with pieces own
+        """
+        empty = self._full & ~(own | opp)
+        steps = range(self._side - 3)
+        moves = 0
+        for shift, mask in self._left:
+            inner = mask & opp
+            x = (own << shift) & inner
+            for _ in steps:
+                x |= (x << shift) & inner
+            moves |= (x << shift) & mask
+        for shift, mask in self._right:
+            inner = mask & opp
+            x = (own >> shift) & inner
+            for _ in steps:
+                x |= (x >> shift) & inner
+            moves |= (x >> shift) & mask
+        return moves & empty
+
+    def _flips(self, move: int, own: int, opp: int) -> int:
+        """
+        Returns the bitboard of pieces flipped by playing on move
+        """
+        flips = 0
+        for shift, mask in self._left:
+            run = 0
+            x = (move << shift) & mask
+            while x & opp:
+                run |= x
+                x = (x << shift) & mask
+            if x & own:
+                flips |= run
+        for shift, mask in self._right:
+            run = 0
+            x = (move >> shift) & mask
+            while x & opp:
+                run |= x
+                x = (x >> shift) & mask
+            if x & own:
+                flips |= run
+        return flips
+
+    def _odd_quadrants(self, empty: int) -> int:
+        """
+        Returns the squares of the quadrants with an odd number of empty
+        squares
+        """
+        odd = 0
+        for quadrant in self._quadrants:
+            if _popcount(quadrant & empty) % 2:
+                odd |= quadrant
+        return odd
+
+    def _ordered(self, own: int, opp: int, moves: int, empty: int,
+                 first: int) -> List[Tuple[int, int]]:
+        """
+        Returns the moves as (move, flips) pairs in search order: the
+        transposition table move, then fastest-first with parity breaking
+        ties
+        """
+        odd = self._odd_quadrants(empty)
+        ordered = []
+        while moves:
+            move = moves & -moves
+            moves ^= move
+            flips = self._flips(move, own, opp)
+            if move == first:
+                rank = -1
+            else:
+                mobility = _popcount(self._moves(opp & ~flips,
+                                                 own | move | flips))
+                rank = mobility * 2 + (not move & odd)
+            ordered.append((rank, move, flips))
+        ordered.sort(key=lambda entry: entry[0])
+        return [(move, flips) for _, move, flips in ordered]
+
+    def _parity_ordered(self, own: int, opp: int, empty: int) \
+        -> List[Tuple[int, int]]:
+        """
+        Returns the moves as (move, flips) pairs, the moves in quadrants
+        with an odd number of empty squares first. With few empty squares
+        it is faster to try each of them than to generate the moves.
+        """
+        odd = self._odd_quadrants(empty)
+        ordered = []
+        for squares in (empty & odd, empty & ~odd):
+            while squares:
+                move = squares & -squares
+                squares ^= move
+                flips = self._flips(move, own, opp)
+                if flips:
+                    ordered.append((move, flips))
+        return ordered
+
+    @staticmethod
+    def _squares(bits: int) -> List[int]:
+        """
+        Returns the set bits of a bitboard as single-bit bitboards
+        """
+        squares = []
+        while bits:
+            low = bits & -bits
+            squares.append(low)
+            bits ^= low
+        return squares
+
+    def _last(self, own: int, opp: int, square: int) -> Tuple[int, int]:
+        """
+        Returns the final disc differential for the player with pieces own
+        (to move) when at most one empty square is left, and the move of
+        the player (0 if it cannot move)
+        """
+        diff = _popcount(own) - _popcount(opp)
+        if not square:
+            return diff, 0
+        flips = self._flips(square, own, opp)
+        if flips:
+            return diff + 2 * _popcount(flips) + 1, square
+        flips = self._flips(square, opp, own)
+        if flips:
+            return diff - 2 * _popcount(flips) - 1, 0
+        return diff, 0
+
+    def _key(self, own: int, opp: int) -> int:
+        """
+        Returns the transposition table key of a position: the exact
+        position above 64 bits mixed from all of it. The table picks
+        buckets with the low bits of the key, which therefore depend on
+        every square (the low squares of the boards alone are nearly
+        always occupied in an endgame), and it checks entries against the
+        whole key, so positions never share one.
+        """
+        position = (own << (self._side * self._side)) | opp
+        mixed = 0
+        rest = position
+        while rest:
+            mixed = _splitmix64(mixed ^ (rest & _MASK64))
+            rest >>= 64
+        return (position << 64) | mixed
+
+    def _search(self, own: int, opp: int, alpha: int, beta: int) \
+        -> Tuple[int, int]:
+        """
+        Returns the value of the position for the player with pieces own
+        (to move), and the best move as a bitboard (0 if there is none)
+        """
+        self.nodes += 1
+        empty = self._full & ~(own | opp)
+        if empty & (empty - 1) == 0:
+            return self._last(own, opp, empty)
+
+        empties = _popcount(empty)
+        key = None
+        if empties < self.SHALLOW_EMPTIES:
+            ordered = self._parity_ordered(own, opp, empty)
+        else:
+            first = 0
+            key = self._key(own, opp)
+            entry = self._tt.get(key)
+            if entry is not None:
+                if entry.flag == EXACT:
+                    return entry.value, entry.move
+                if entry.flag == LOWER:
+                    alpha = max(alpha, entry.value)
+                else:
+                    beta = min(beta, entry.value)
+                if alpha >= beta:
+                    return entry.value, entry.move
+                first = entry.move
+            ordered = self._ordered(own, opp, self._moves(own, opp), empty,
+                                    first)
+
+        if not ordered:
+            if empties < self.SHALLOW_EMPTIES:
+                can_reply = any(self._flips(square, opp, own)
+                                for square in self._squares(empty))
+            else:
+                can_reply = self._moves(opp, own)
+            if not can_reply:
+                return _popcount(own) - _popcount(opp), 0
+            value, _ = self._search(opp, own, -beta, -alpha)
+            return -value, 0
+
+        original_alpha = alpha
+        best = -self._side * self._side - 1
+        best_move = 0
+        for move, flips in ordered:
+            value, _ = self._search(opp & ~flips, own | move | flips,
+                                    -beta, -alpha)
+            value = -value
+            if value > best:
+                best, best_move = value, move
+                if value > alpha:
+                    alpha = value
+                    if alpha >= beta:
+                        break
+
+        if key is not None:
+            if best <= original_alpha:
+                flag = UPPER
+            elif best >= beta:
+                flag = LOWER
+            else:
+                flag = EXACT
+            self._tt.store(key, empties, best, flag, best_move)
+        return best, best_move
+
+    def solve(self, game: ReversiBase) -> SolveResult:
+        """
+        Solves a position
+
+        Raises:
+            ValueError: If the game is not a two-player game of the size of
+            the solver, if its center is not filled, or if it has more
+            than max_empties empty squares
+        """
+        if game.num_players != 2 or game.size != self._side:
+            raise ValueError("the solver only supports two-player games of \
+                its size")
+
+        cells = game.cells()
+        empties = cells.count(0)
+        if empties > self._max_empties:
+            raise ValueError(f"position has {empties} empty squares (at \
+                most {self._max_empties} allowed)")
+
+        own = opp = 0
+        for i, piece in enumerate(cells):
+            if piece == game.turn:
+                own |= 1 << i
+            elif piece:
+                opp |= 1 << i
+
+        side = self._side
+        n = side // 2
+        for r, c in [(n - 1, n - 1), (n - 1, n), (n, n - 1), (n, n)]:
+            if not cells[r * side + c]:
+                raise ValueError("the center of the board is not filled")
+
+        self.nodes = 0
+        self._tt.new_search()
+        start = time.perf_counter()
+        value, move = self._search(own, opp, -side * side, side * side)
+        seconds = time.perf_counter() - start
+
+        if move:
+            best = divmod(move.bit_length() - 1, side)
+        else:
+            best = None
+        return SolveResult(best, value, self.nodes, seconds)
+
+
+def solve(game: ReversiBase, max_empties: int = 20,
+          tt: Optional[TranspositionTable] = None) -> SolveResult:
+    """
+    Solves a two-player position exactly (see EndgameSolver.solve)
+    """
+    return EndgameSolver(game.size, max_empties, tt).solve(game)
+
+
+def random_endgame(side: int, empties: int, rng: random.Random) \
+    -> ReversiBase:
+    """
+    Returns a position with the given number of empty squares, reached by
+    random moves from the Othello start position (the game may end
+    earlier, in which case another game is played)
+    """
+    while True:
+        game = new_reversi(side, 2, True)
+        while not game.done and game.cells().count(0) > empties:
+            game.apply_move(rng.choice(game.available_moves))
+        if not game.done:
+            return game
+
+
+@click.command(name="Reversi-Endgame")
+@click.option('-e', '--empties', type=click.INT, default=14,
+              help="Number of empty squares of the positions")
+@click.option('-n', '--positions', type=click.INT, default=5,
+              help="Number of random positions to solve")
+@click.option('-s', '--side', type=click.INT, default=8)
+@click.option('--seed', type=click.INT, default=0)
+def cmd(empties, positions, side, seed):
+    """
+    Solves random endgame positions and prints the result and throughput
+    of the solver for each.
+    """
+    rng = random.Random(seed)
+    solver = EndgameSolver(side, max_empties=empties)
+    total_nodes = 0
+    total_seconds = 0.0
+    for _ in range(positions):
+        result = solver.solve(random_endgame(side, empties, rng))
+        total_nodes += result.nodes
+        total_seconds += result.seconds
+        print(f"move {result.move} score {result.score:+3}: "
+              f"{result.nodes:9} nodes in {result.seconds:7.3f}s "
+              f"({result.nodes_per_second:10,.0f} nodes/sec)")
+    print(f"total: {total_nodes} nodes in {total_seconds:.3f}s "
+          f"({total_nodes / max(total_seconds, 1e-9):,.0f} nodes/sec)")
+
+
+if __name__ == "__main__":
+    cmd()
@@ -13,7 +13,7 @@ os.environ['PYGAME_HIDE_SUPPORT_PROMPT'] = "hide"
 import pygame
 from pygame.locals import *
 import click 
-from othello_project.gui.reversi import Reversi, ReversiPiece
+from othello_project.gui.reversi import Reversi, ReversiPiece, new_reversi
 from typing import Optional
 
 
@@ -194,7 +194,7 @@ class GUI_it:
                                     rect=rect)
                     pygame.draw.rect(self.surface, color=black,
                                         rect=rect, width=1)
-                    cell: Optional[int] = self.game.grid[row][col]
+                    cell: Optional[int] = self.game.grid_view[row][col]
                     if isinstance(cell, int) and cell in range(n + 1):
                         fill = player_colors[cell - 1]
                         pygame.draw.rect(self.surface, color=fill,
@@ -265,7 +265,7 @@ class GUI_it:
 
 def cmd(board_size, num_players, othello): 
     try:
-        board = Reversi(board_size, num_players, othello)
+        board = new_reversi(board_size, num_players, othello)
         gui_it: GUI_it = GUI_it(game = board)
 
 
@@ -0,0 +1,185 @@
+"""
+Instrumentation of bots.
+
+A BotProfile counts what a bot does to the board while it picks its
+moves, and keeps a histogram of the wall time of every move. Profiling
+is off unless a profile is given to the bot (see BotBase.play): the
+board is then wrapped in a CountingBoard, which counts calls on their
+way to the board, so a bot without a profile pays nothing for it.
+
+Latencies are kept in logarithmic buckets (BUCKETS_PER_OCTAVE buckets
+for every doubling of time), so a histogram has a fixed, small size,
+merges by adding buckets (as the profiles of worker processes are), and
+gives percentiles within about 5% of the exact values.
+"""
+import math
+from collections import Counter
+from typing import Dict, Optional
+
+BUCKETS_PER_OCTAVE = 8
+
+SMALLEST = 1e-6
+"""Latencies shorter than this (in seconds) fall in the first bucket"""
+
+
+class LatencyHistogram:
+    """
+    Histogram of latencies with logarithmic buckets
+    """
+
+    buckets: Dict[int, int]
+    count: int
+    total: float
+    longest: float
+
+    def __init__(self):
+        self.buckets = {}
+        self.count = 0
+        self.total = 0.0
+        self.longest = 0.0
+
+    def record(self, seconds: float) -> None:
+        """
+        Adds a latency
+        """
+        if seconds > SMALLEST:
+            bucket = int(math.log2(seconds / SMALLEST) * BUCKETS_PER_OCTAVE)
+        else:
+            bucket = 0
+        self.buckets[bucket] = self.buckets.get(bucket, 0) + 1
+        self.count += 1
+        self.total += seconds
+        self.longest = max(self.longest, seconds)
+
+    def merge(self, other: "LatencyHistogram") -> None:
+        """
+        Adds the latencies of another histogram
+        """
+        for bucket, count in other.buckets.items():
+            self.buckets[bucket] = self.buckets.get(bucket, 0) + count
+        self.count += other.count
+        self.total += other.total
+        self.longest = max(self.longest, other.longest)
+
+    def percentile(self, q: float) -> float:
+        """
+        Returns the latency below which a fraction q of the latencies fall
+        (the middle of its bucket, in seconds), or 0 if there are none
+        """
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for bucket in sorted(self.buckets):
+            seen += self.buckets[bucket]
+            if seen >= rank:
+                middle = SMALLEST * 2 ** ((bucket + 0.5) / BUCKETS_PER_OCTAVE)
+                return min(middle, self.longest)
+        return self.longest
+
+    def to_dict(self) -> dict:
+        """
+        Returns a summary of the histogram in milliseconds, for JSON
+        """
+        return {
+            "count": self.count,
+            "mean_ms": 1000 * self.total / self.count if self.count else 0.0,
+            "p50_ms": 1000 * self.percentile(0.5),
+            "p95_ms": 1000 * self.percentile(0.95),
+            "p99_ms": 1000 * self.percentile(0.99),
+            "max_ms": 1000 * self.longest,
+        }
+
+
+class BotProfile:
+    """
+    Counters and move latencies of a bot
+    """
+
+    counters: Counter
+    """
+    Calls made by the bot: "positions" (move generations), "clones"
+    (simulate_moves), "moves_applied", "moves_undone", and "nodes" for
+    bots that count the positions they search
+    """
+    latency: LatencyHistogram
+
+    def __init__(self):
+        self.counters = Counter()
+        self.latency = LatencyHistogram()
+
+    def merge(self, other: "BotProfile") -> None:
+        """
+        Adds the counters and latencies of another profile
+        """
+        self.counters.update(other.counters)
+        self.latency.merge(other.latency)
+
+    def to_dict(self) -> dict:
+        """
+        Returns the profile as a dictionary, for JSON. Rates are per
+        second of move time.
+        """
+        seconds = self.latency.total
+        counters = dict(sorted(self.counters.items()))
+        rates = {f"{name}_per_second": count / seconds if seconds else 0.0
+                 for name, count in counters.items()}
+        return {"counters": counters, "rates": rates,
+                "latency": self.latency.to_dict()}
+
+
+class CountingBoard:
+    """
+    Wraps a game and counts the calls that a bot makes on it into a
+    profile. Every other attribute is read from the game.
+    """
+
+    def __init__(self, board, counters: Counter):
+        self._board = board
+        self._counters = counters
+
+    def __getattr__(self, name: str):
+        return getattr(self._board, name)
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, CountingBoard):
+            other = other._board
+        return self._board == other
+
+    def __hash__(self) -> int:
+        return hash(self._board)
+
+    @property
+    def available_moves(self):
+        self._counters["positions"] += 1
+        return self._board.available_moves
+
+    def available_moves_for_player(self, player: int):
+        self._counters["positions"] += 1
+        return self._board.available_moves_for_player(player)
+
+    def available_moves_with_flips(self, player: int):
+        self._counters["positions"] += 1
+        return self._board.available_moves_with_flips(player)
+
+    def apply_move(self, pos):
+        self._counters["moves_applied"] += 1
+        return self._board.apply_move(pos)
+
+    def undo_move(self, record) -> None:
+        self._counters["moves_undone"] += 1
+        self._board.undo_move(record)
+
+    def simulate_moves(self, moves) -> "CountingBoard":
+        self._counters["clones"] += 1
+        return CountingBoard(self._board.simulate_moves(moves),
+                             self._counters)
+
+
+def merge_profiles(into: Dict[int, BotProfile],
+                   profiles: Optional[Dict[int, BotProfile]]) -> None:
+    """
+    Adds profiles, by player, to those of earlier games
+    """
+    for player, profile in (profiles or {}).items():
+        into.setdefault(player, BotProfile()).merge(profile)
@@ -0,0 +1,301 @@
+"""
+Round-robin league between bots.
+
+Every pair of bots plays a number of two-player games, half with each
+bot moving first: game i of a pairing is played twice, with the seed
+game_seed(seed, i) and the colours swapped. The games of every pairing
+are sharded across a pool of worker processes, and the shards of a
+pairing are recorded in order.
+
+The results of every pairing are kept in a league file (JSON), along
+with the Bradley-Terry ratings of the bots on the Elo scale, refitted
+from the results after every shard of games (starting from the previous
+ratings, so a refit takes a few iterations). Running the league again
+only plays the games missing from the file: adding a bot plays its
+pairings with the bots already rated, and nothing else.
+"""
+import json
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from itertools import combinations
+from typing import List, Tuple, Dict, Optional, Callable
+import click
+from bot import BOT_NAMES, BotFactory, game_seed, play_games
+
+PairResult = List[int]
+"""Wins of the first bot of a pairing, ties, and wins of the second"""
+
+
+def bradley_terry(results: Dict[Tuple[str, str], PairResult],
+                  names: List[str],
+                  initial: Optional[Dict[str, float]] = None,
+                  iterations: int = 1000,
+                  tolerance: float = 1e-6) -> Dict[str, float]:
+    """
+    Fits Bradley-Terry ratings to the results of pairings, and returns
+    them on the Elo scale (a rating difference of d means an expected
+    score of 1 / (1 + 10 ** (-d / 400))), with a mean of 0. A tie counts
+    as half a win for each bot, and every pairing counts one more tie, so
+    that a bot that never won still gets a finite rating.
+
+    Args:
+        results: results of every pairing played
+        names: bots to rate
+        initial: ratings to start from
+        iterations: largest number of iterations of the fit
+        tolerance: largest change in a strength at which the fit stops
+    """
+    initial = initial or {}
+    strength = {name: 10 ** (initial.get(name, 0.0) / 400) for name in names}
+    won = {name: 0.0 for name in names}
+    played: Dict[str, List[Tuple[str, float]]] = {name: [] for name in names}
+    for (a, b), (wins_a, ties, wins_b) in results.items():
+        if a not in strength or b not in strength:
+            continue
+        games = wins_a + ties + wins_b + 1
+        won[a] += wins_a + (ties + 1) / 2
+        won[b] += wins_b + (ties + 1) / 2
+        played[a].append((b, games))
+        played[b].append((a, games))
+
+    # Minorization-maximization updates, which always converge for
+    # these (regularized) results
+    for _ in range(iterations):
+        change = 0.0
+        for name in names:
+            if not played[name]:
+                continue
+            total = sum(games / (strength[name] + strength[other])
+                        for other, games in played[name])
+            new = won[name] / total
+            change = max(change, abs(new - strength[name]) / strength[name])
+            strength[name] = new
+        if change < tolerance:
+            break
+
+    elo = {name: 400 * math.log10(strength[name]) for name in names}
+    mean = sum(elo.values()) / len(elo) if elo else 0.0
+    return {name: value - mean for name, value in elo.items()}
+
+
+class League:
+    """
+    Results and ratings of a league, stored in a league file
+    """
+
+    path: str
+    side: int
+    othello: bool
+    results: Dict[Tuple[str, str], PairResult]
+    ratings: Dict[str, float]
+
+    def __init__(self, path: str, side: int = 8, othello: bool = True):
+        """
+        Constructor. Loads the league file if it exists.
+
+        Raises:
+            ValueError: If the league in the file was played on other
+            boards
+        """
+        self.path = path
+        self.side = side
+        self.othello = othello
+        self.results = {}
+        self.ratings = {}
+        if os.path.exists(path):
+            with open(path) as f:
+                data = json.load(f)
+            if data["side"] != side or data["othello"] != othello:
+                raise ValueError(f"the league in {path} was played on other \
+                    boards")
+            for pairing, result in data["results"].items():
+                a, b = pairing.split(" vs ")
+                self.results[(a, b)] = result
+            self.ratings = data["ratings"]
+
+    def games(self, a: str, b: str) -> int:
+        """
+        Returns the number of games played between two bots
+        """
+        return sum(self.results.get(tuple(sorted((a, b))), [0, 0, 0]))
+
+    def add(self, a: str, b: str, score: float) -> None:
+        """
+        Adds the result of a game between two bots
+
+        Args:
+            a, b: the two bots
+            score: score of bot a (1, 1/2 or 0)
+        """
+        if a > b:
+            a, b, score = b, a, 1 - score
+        result = self.results.setdefault((a, b), [0, 0, 0])
+        result[0 if score > 0.5 else 2 if score < 0.5 else 1] += 1
+
+    def rate(self) -> Dict[str, float]:
+        """
+        Refits the ratings of every bot that has played
+        """
+        names = sorted({name for pairing in self.results
+                        for name in pairing})
+        self.ratings = bradley_terry(self.results, names, self.ratings)
+        return self.ratings
+
+    def save(self) -> None:
+        """
+        Writes the league file (through a temporary file, so that an
+        interrupted run leaves the previous file whole)
+        """
+        data = {
+            "side": self.side,
+            "othello": self.othello,
+            "results": {f"{a} vs {b}": result
+                        for (a, b), result in sorted(self.results.items())},
+            "ratings": dict(sorted(self.ratings.items(),
+                                   key=lambda item: -item[1])),
+        }
+        temporary = self.path + ".tmp"
+        with open(temporary, "w") as f:
+            json.dump(data, f, indent=2)
+        os.replace(temporary, self.path)
+
+    def schedule(self, names: List[str], games: int) \
+        -> List[Tuple[str, str, int, int]]:
+        """
+        Returns the games missing for every pair of the given bots to
+        have played the given number of games (rounded up to an even
+        number), as (bot, bot, first game pair, number of game pairs):
+        game pair i is game i with each bot moving first
+        """
+        pairs = -(-games // 2)
+        missing = []
+        for a, b in combinations(sorted(set(names)), 2):
+            done = self.games(a, b) // 2
+            if done < pairs:
+                missing.append((a, b, done, pairs - done))
+        return missing
+
+
+def play_pairing(settings: Tuple[int, int, bool], a: BotFactory,
+                 b: BotFactory, seeds: List[int]):
+    """
+    Plays one game per seed with each of two bots moving first. Runs in
+    the worker processes of run_league.
+
+    Returns: the results of the games where a moves first, and of those
+    where b moves first
+    """
+    return (play_games(settings, [a, b], seeds),
+            play_games(settings, [b, a], seeds))
+
+
+def run_league(league: League, factories: Dict[str, BotFactory],
+               games: int, jobs: int = 1, seed: int = 0, shard: int = 4,
+               report: Optional[Callable[[str, str, League], None]] = None) \
+    -> Dict[str, float]:
+    """
+    Plays the games missing from a league, and refits and saves the
+    ratings after every shard of games
+
+    Args:
+        league: the league
+        factories: the factory of every bot, by name
+        games: the number of games every pair of bots plays
+        jobs: number of worker processes (1 plays in this process)
+        seed: seed of the league
+        shard: game pairs per task of the worker processes
+        report: called with the bots and the league after every shard
+
+    Returns: the ratings
+    """
+    settings = (league.side, 2, league.othello)
+    tasks = []
+    following: Dict[Tuple[str, str], int] = {}
+    for a, b, start, count in league.schedule(list(factories), games):
+        following[(a, b)] = start
+        for first in range(start, start + count, shard):
+            seeds = [game_seed(seed, i)
+                     for i in range(first, min(first + shard, start + count))]
+            tasks.append((a, b, first, seeds))
+
+    def record(a: str, b: str, results) -> None:
+        a_first, b_first = results
+        for result in a_first:
+            league.add(a, b, 1.0 if result.winners == [1] else
+                       0.0 if result.winners == [2] else 0.5)
+        for result in b_first:
+            league.add(a, b, 1.0 if result.winners == [2] else
+                       0.0 if result.winners == [1] else 0.5)
+        league.rate()
+        league.save()
+        if report is not None:
+            report(a, b, league)
+
+    # Shards finishing out of order wait for the earlier shards of their
+    # pairing, so that the league file always holds the first game pairs
+    # of every pairing (which is what schedule resumes from)
+    finished = {}
+
+    def finish(a: str, b: str, first: int, results) -> None:
+        finished[(a, b, first)] = results
+        while (a, b, following[(a, b)]) in finished:
+            results = finished.pop((a, b, following[(a, b)]))
+            following[(a, b)] += len(results[0])
+            record(a, b, results)
+
+    if jobs <= 1:
+        for a, b, first, seeds in tasks:
+            finish(a, b, first, play_pairing(settings, factories[a],
+                                             factories[b], seeds))
+    else:
+        with ProcessPoolExecutor(jobs) as pool:
+            futures = {pool.submit(play_pairing, settings, factories[a],
+                                   factories[b], seeds): (a, b, first)
+                       for a, b, first, seeds in tasks}
+            for future in as_completed(futures):
+                finish(*futures[future], future.result())
+    return league.ratings
+
+
+@click.command(name="Reversi-League")
+@click.argument('path', type=click.Path(dir_okay=False))
+@click.option('-b', '--bot', 'bots', multiple=True,
+              type=click.Choice(BOT_NAMES, case_sensitive=False),
+              help="Bot of the league (every bot by default)")
+@click.option('-n', '--games', type=click.INT, default=20,
+              help="Games every pair of bots plays")
+@click.option('-s', '--board-size', type=click.INT, default=8)
+@click.option('--othello/--no-othello', default=True)
+@click.option('-j', '--jobs', type=click.INT, default=1,
+              help="Worker processes playing the games")
+@click.option('--seed', type=click.INT, default=0)
+@click.option('--budget-ms', type=click.FLOAT, default=100,
+              help="Time per move for searching bots, in milliseconds")
+@click.option('--budget-nodes', type=click.INT, default=None,
+              help="Positions per move for searching bots")
+@click.option('--playouts', type=click.INT, default=200,
+              help="Random games per move for Monte Carlo bots")
+def cmd(path, bots, games, board_size, othello, jobs, seed, budget_ms,
+        budget_nodes, playouts):
+    """
+    Plays a round-robin league between bots, keeping the results and
+    ratings in the league file PATH. Only the games missing from the file
+    are played.
+    """
+    names = list(bots) or BOT_NAMES
+    factories = {name: BotFactory(name, budget_ms, budget_nodes, playouts)
+                 for name in names}
+    league = League(path, board_size, othello)
+
+    def report(a: str, b: str, league: League) -> None:
+        print(f"{a} vs {b}: {league.games(a, b)} games")
+
+    ratings = run_league(league, factories, games, jobs, seed, report=report)
+    for name, rating in sorted(ratings.items(), key=lambda item: -item[1]):
+        marker = "" if name in names else "  (not in this run)"
+        print(f"{name:12} {rating:+8.1f}{marker}")
+
+
+if __name__ == "__main__":
+    cmd()
@@ -0,0 +1,192 @@
+"""
+Perft (performance test) for the Reversi move generators.
+
+perft(game, depth) counts the positions reached after exactly depth
+moves from a start position. Players who cannot move are skipped by
+apply_move, so a pass is not a move; a finished game has no moves, so
+it contributes nothing to deeper counts. Comparing the counts against
+stored reference values checks that every backend follows the same
+rules, and timing them measures the speed of the backend.
+"""
+import time
+from typing import List, Tuple, Optional, Dict, NamedTuple, Callable
+import click
+from reversi import Reversi, BitboardReversi, SparseReversi, ReversiBase, \
+    BoardGridType
+
+try:
+    import numpy as np
+    from batch import BatchReversi
+except ImportError:
+    np = None
+
+
+class PerftCase(NamedTuple):
+    """
+    Start position with its reference perft counts
+    """
+    name: str
+    side: int
+    players: int
+    othello: bool
+    counts: List[int]
+    """Reference counts for depths 1, 2, ..."""
+    start: Optional[Tuple[int, BoardGridType]] = None
+    """Turn and grid to load, instead of the usual start position"""
+
+
+CASES: List[PerftCase] = [
+    PerftCase("othello-8", 8, 2, True,
+              [4, 12, 56, 244, 1396, 8200]),
+    PerftCase("othello-6", 6, 2, True,
+              [4, 12, 56, 244, 1364, 7604, 47740]),
+    PerftCase("othello-4", 4, 2, True,
+              [4, 12, 44, 128, 436, 1296, 3784, 9756, 22152, 41296]),
+    PerftCase("center-6", 6, 2, False,
+              [4, 12, 24, 24, 96, 320, 1536]),
+    PerftCase("center-4", 4, 2, False,
+              [4, 12, 24, 24, 96, 288, 1152, 3232, 11168]),
+    PerftCase("center-9x3", 9, 3, False,
+              [9, 72, 504, 3024, 15120]),
+    PerftCase("center-10x4", 10, 4, False,
+              [16, 240, 3360, 43680]),
+    # Late 3-player game in which player 2 has no pieces left, so every
+    # turn skips at least one player
+    PerftCase("skips-7x3", 7, 3, False,
+              [7, 48, 259, 1209, 4744],
+              (1, [[3, 3, 3, 3, 3, 1, None],
+                   [3, None, 3, 3, 1, None, None],
+                   [3, 3, 1, 1, 3, 1, None],
+                   [3, None, 1, 1, 1, 3, None],
+                   [3, 3, 1, 1, 1, 3, 3],
+                   [3, 1, 1, 1, 3, 1, None],
+                   [None, 3, 1, 1, 1, 1, 1]])),
+]
+
+
+def perft(game: ReversiBase, depth: int) -> int:
+    """
+    Counts the positions reached after depth moves from the given
+    game, using apply_move/undo_move (the game is left unchanged)
+    """
+    if depth == 0:
+        return 1
+    moves = game.available_moves
+    if depth == 1:
+        return len(moves)
+    nodes = 0
+    for move in moves:
+        record = game.apply_move(move)
+        nodes += perft(game, depth - 1)
+        game.undo_move(record)
+    return nodes
+
+
+def batch_perft(game: ReversiBase, depth: int) -> int:
+    """
+    Counts the positions reached after depth moves from the given game
+    with the NumPy engine, expanding one whole level of the tree at a
+    time
+    """
+    if depth == 0:
+        return 1
+    batch = BatchReversi.from_games([game])
+    for level in range(depth):
+        rows, moves = np.nonzero(batch.legal_moves().reshape(len(batch), -1))
+        if level == depth - 1 or len(rows) == 0:
+            return len(rows)
+        batch.select(rows)
+        batch.apply_moves(moves)
+    return 0
+
+
+def _start(cls: Callable[..., ReversiBase], case: PerftCase) -> ReversiBase:
+    """
+    Returns the start position of a case using the given class
+    """
+    game = cls(case.side, case.players, case.othello)
+    if case.start is not None:
+        turn, grid = case.start
+        game.load_game(turn, grid)
+    return game
+
+
+def _run_batch(case: PerftCase, depth: int) -> int:
+    return batch_perft(_start(Reversi, case), depth)
+
+
+BACKENDS: Dict[str, Callable[[PerftCase, int], int]] = {
+    "reversi": lambda case, depth: perft(_start(Reversi, case), depth),
+    "bitboard": lambda case, depth: perft(_start(BitboardReversi, case),
+                                          depth),
+    "sparse": lambda case, depth: perft(_start(SparseReversi, case), depth),
+}
+"""
+Every engine backend, as a function that runs perft for a case at a
+given depth
+"""
+
+if np is not None:
+    BACKENDS["batch"] = _run_batch
+
+
+def supports(backend: str, case: PerftCase) -> bool:
+    """
+    Returns whether the backend can play the configuration of the case
+    """
+    if backend == "bitboard":
+        return case.players == 2 and case.side <= 8
+    return True
+
+
+def run(backend: str, case: PerftCase, depth: int) -> Tuple[int, float]:
+    """
+    Runs perft for a case with a backend
+
+    Returns: The node count and the time it took in seconds
+    """
+    start = time.perf_counter()
+    nodes = BACKENDS[backend](case, depth)
+    return nodes, time.perf_counter() - start
+
+
+@click.command(name="Reversi-Perft")
+@click.option('-d', '--depth', type=click.IntRange(min=1), default=None,
+              help="Depth (default: deepest reference count)")
+@click.option('-c', '--case', 'case_names', multiple=True,
+              type=click.Choice([case.name for case in CASES]),
+              help="Start position (default: all)")
+@click.option('-b', '--backend', 'backends', multiple=True,
+              type=click.Choice(list(BACKENDS)),
+              help="Engine backend (default: all)")
+def cmd(depth, case_names, backends):
+    """
+    Runs perft for every start position and backend, printing the
+    node counts and nodes/sec, and fails if a count differs from the
+    reference value.
+    """
+    failed = False
+    for case in CASES:
+        if case_names and case.name not in case_names:
+            continue
+        d = depth if depth is not None else len(case.counts)
+        expected = case.counts[d - 1] if d <= len(case.counts) else None
+        for backend in backends or list(BACKENDS):
+            if not supports(backend, case):
+                continue
+            nodes, seconds = run(backend, case, d)
+            status = ""
+            if expected is not None:
+                status = "ok" if nodes == expected else \
+                    f"FAIL (expected {expected})"
+                failed = failed or nodes != expected
+            print(f"{case.name:12} {backend:9} depth {d:2}: {nodes:10} nodes "
+                  f"in {seconds:7.3f}s ({nodes / max(seconds, 1e-9):12,.0f} "
+                  f"nodes/sec) {status}")
+
+    if failed:
+        raise click.ClickException("perft counts differ from the reference")
+
+
+if __name__ == "__main__":
+    cmd()
@@ -0,0 +1,331 @@
+"""
+Append-only database of recorded Reversi games.
+
+Games are appended to segment files in a directory. Each game is stored
+as a header (GAME_HEADER), the numbers of the winners (one byte each),
+and then one byte per move: the index r * side + c of the square (two
+bytes per move on boards with more than 256 squares). Segments are read
+through mmap, and an index by result, length and opening prefix is
+built when the database is opened and kept up to date as games are
+appended. A game cut short by an interrupted append is dropped (and cut
+from its segment) when the database is opened.
+"""
+import mmap
+import os
+import struct
+from typing import List, Tuple, Optional, Dict, Set, NamedTuple, Iterator
+from reversi import ReversiBase, ListMovesType, new_reversi
+
+GAME_HEADER = struct.Struct("<BBBBH")
+"""
+Header of a recorded game: side, number of players, flags (OTHELLO and
+WIDE_MOVES), number of winners and number of moves.
+"""
+
+OTHELLO = 1
+"""Flag set when the game started from the Othello configuration"""
+
+WIDE_MOVES = 2
+"""Flag set when moves take two bytes (boards of more than 256 squares)"""
+
+SEGMENT_NAME = "segment-{:05d}.rgr"
+
+
+class GameRecord(NamedTuple):
+    """
+    One recorded game
+    """
+    side: int
+    players: int
+    othello: bool
+    moves: ListMovesType
+    """Moves in the order they were played (passes are not moves)"""
+    winners: List[int]
+    """Outcome of the game (more than one winner means a tie)"""
+
+
+def encode_game(record: GameRecord) -> bytes:
+    """
+    Encodes a game as stored in a segment file
+    """
+    wide = record.side * record.side > 256
+    flags = (OTHELLO if record.othello else 0) | (WIDE_MOVES if wide else 0)
+    squares = [r * record.side + c for r, c in record.moves]
+    header = GAME_HEADER.pack(record.side, record.players, flags,
+                              len(record.winners), len(squares))
+    if wide:
+        body = struct.pack(f"<{len(squares)}H", *squares)
+    else:
+        body = bytes(squares)
+    return header + bytes(record.winners) + body
+
+
+def _stored_size(flags: int, n_winners: int, n_moves: int) -> int:
+    """
+    Returns the size in bytes of a stored game from its header fields
+    """
+    width = 2 if flags & WIDE_MOVES else 1
+    return GAME_HEADER.size + n_winners + width * n_moves
+
+
+class GameDatabase:
+    """
+    Append-only database of games stored in memory-mapped segment files
+    """
+
+    _path: str
+    _segment_size: int
+    _prefix_depth: int
+    _maps: List[Optional[mmap.mmap]]
+    _sizes: List[int]
+    _locations: List[Tuple[int, int]]
+    _by_result: Dict[Tuple[int, ...], List[int]]
+    _by_length: Dict[int, List[int]]
+    _by_prefix: Dict[Tuple[int, ...], List[int]]
+    """Games by board side followed by the square indices of an opening"""
+    _sides: Set[int]
+
+    def __init__(self, path: str, segment_size: int = 1 << 26,
+                 prefix_depth: int = 4):
+        """
+        Constructor. Opens (or creates) the database in the given
+        directory and indexes the games already in it.
+
+        Args:
+            path: Directory holding the segment files
+            segment_size: Size in bytes after which new games go to a new
+            segment file
+            prefix_depth: Number of opening moves covered by the index
+        """
+        self._path = path
+        self._segment_size = segment_size
+        self._prefix_depth = prefix_depth
+        self._maps = []
+        self._sizes = []
+        self._locations = []
+        self._by_result = {}
+        self._by_length = {}
+        self._by_prefix = {}
+        self._sides = set()
+        self._writer = None
+
+        os.makedirs(path, exist_ok=True)
+        segment = 0
+        while os.path.exists(self._segment_path(segment)):
+            self._maps.append(None)
+            self._sizes.append(os.path.getsize(self._segment_path(segment)))
+            self._index_segment(segment)
+            segment += 1
+
+    def __len__(self) -> int:
+        return len(self._locations)
+
+    def __enter__(self) -> "GameDatabase":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def _segment_path(self, segment: int) -> str:
+        return os.path.join(self._path, SEGMENT_NAME.format(segment))
+
+    def _view(self, segment: int) -> mmap.mmap:
+        """
+        Returns the read-only memory map of a segment, remapping it if
+        games were appended since it was mapped
+        """
+        view = self._maps[segment]
+        if view is None or len(view) < self._sizes[segment]:
+            if self._writer is not None:
+                self._writer.flush()
+            if view is not None:
+                view.close()
+            with open(self._segment_path(segment), "rb") as f:
+                view = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            self._maps[segment] = view
+        return view
+
+    def _index_segment(self, segment: int) -> None:
+        """
+        Adds every game of a segment to the index, and truncates the
+        segment after its last whole game
+        """
+        if self._sizes[segment] == 0:
+            return
+        view = self._view(segment)
+        offset = 0
+        while offset + GAME_HEADER.size <= len(view):
+            _, _, flags, n_winners, n_moves = \
+                GAME_HEADER.unpack_from(view, offset)
+            if offset + _stored_size(flags, n_winners, n_moves) > len(view):
+                break
+            offset += self._index_game(segment, offset, view, offset)
+
+        if offset < len(view):
+            # The last append was torn: drop the partial game, so that
+            # new games are appended after the last whole one
+            view.close()
+            self._maps[segment] = None
+            os.truncate(self._segment_path(segment), offset)
+            self._sizes[segment] = offset
+
+    def _index_game(self, segment: int, offset: int, data, pos: int) -> int:
+        """
+        Adds a game to the index
+
+        Args:
+            segment: Segment holding the game
+            offset: Offset of the game in the segment
+            data: Buffer holding the encoded game
+            pos: Position of the game in data
+
+        Returns: The size of the stored game in bytes
+        """
+        side, _, flags, n_winners, n_moves = \
+            GAME_HEADER.unpack_from(data, pos)
+        start = pos + GAME_HEADER.size
+        winners = tuple(data[start:start + n_winners])
+        start += n_winners
+        width = 2 if flags & WIDE_MOVES else 1
+        depth = min(n_moves, self._prefix_depth)
+        if width == 1:
+            prefix = tuple(data[start:start + depth])
+        else:
+            prefix = struct.unpack_from(f"<{depth}H", data, start)
+
+        game_id = len(self._locations)
+        self._locations.append((segment, offset))
+        self._sides.add(side)
+        self._by_result.setdefault(winners, []).append(game_id)
+        self._by_length.setdefault(n_moves, []).append(game_id)
+        for k in range(1, depth + 1):
+            self._by_prefix.setdefault((side,) + tuple(prefix[:k]),
+                                       []).append(game_id)
+        return _stored_size(flags, n_winners, n_moves)
+
+    def append(self, record: GameRecord) -> int:
+        """
+        Appends a game to the database
+
+        Returns: The id of the game (its position in the database)
+        """
+        data = encode_game(record)
+        segment = len(self._sizes) - 1
+        if segment < 0 or (self._sizes[segment] and self._sizes[segment] +
+                           len(data) > self._segment_size):
+            if self._writer is not None:
+                self._writer.close()
+                self._writer = None
+            segment += 1
+            self._maps.append(None)
+            self._sizes.append(0)
+        if self._writer is None:
+            self._writer = open(self._segment_path(segment), "ab")
+
+        offset = self._sizes[segment]
+        self._writer.write(data)
+        self._sizes[segment] += len(data)
+        self._index_game(segment, offset, data, 0)
+        return len(self._locations) - 1
+
+    def flush(self) -> None:
+        """
+        Writes any buffered games to disk
+        """
+        if self._writer is not None:
+            self._writer.flush()
+
+    def close(self) -> None:
+        """
+        Closes the segment files
+        """
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+        for view in self._maps:
+            if view is not None:
+                view.close()
+        self._maps = [None] * len(self._maps)
+
+    def __getitem__(self, game_id: int) -> GameRecord:
+        segment, offset = self._locations[game_id]
+        view = self._view(segment)
+        side, players, flags, n_winners, n_moves = \
+            GAME_HEADER.unpack_from(view, offset)
+        start = offset + GAME_HEADER.size
+        winners = list(view[start:start + n_winners])
+        start += n_winners
+        if flags & WIDE_MOVES:
+            squares = struct.unpack_from(f"<{n_moves}H", view, start)
+        else:
+            squares = view[start:start + n_moves]
+        moves = [divmod(i, side) for i in squares]
+        return GameRecord(side, players, bool(flags & OTHELLO), moves,
+                          winners)
+
+    def find(self, winners: Optional[List[int]] = None,
+             min_length: Optional[int] = None,
+             max_length: Optional[int] = None,
+             prefix: Optional[ListMovesType] = None) -> List[int]:
+        """
+        Returns the ids of the games matching every given condition, in
+        the order they were appended
+
+        Args:
+            winners: Exact outcome of the game
+            min_length: Smallest number of moves
+            max_length: Largest number of moves
+            prefix: Opening moves of the game
+        """
+        matches: Optional[set] = None
+
+        def narrow(ids) -> None:
+            nonlocal matches
+            matches = set(ids) if matches is None else matches & set(ids)
+
+        if winners is not None:
+            narrow(self._by_result.get(tuple(winners), []))
+        if min_length is not None or max_length is not None:
+            low = min_length if min_length is not None else 0
+            high = max_length if max_length is not None else float("inf")
+            narrow(game_id for length, ids in self._by_length.items()
+                   if low <= length <= high for game_id in ids)
+        if prefix:
+            prefix = list(prefix)
+            head = prefix[:self._prefix_depth]
+            narrow(game_id
+                   for key in self._prefix_keys(head)
+                   for game_id in self._by_prefix.get(key, []))
+            if len(prefix) > self._prefix_depth:
+                matches = {game_id for game_id in matches
+                           if self[game_id].moves[:len(prefix)] == prefix}
+
+        if matches is None:
+            return list(range(len(self)))
+        return sorted(matches)
+
+    def _prefix_keys(self, prefix: ListMovesType) -> List[Tuple[int, ...]]:
+        """
+        Returns the index keys for an opening prefix, for every board
+        size in the database on which the moves fit (keys are the side
+        followed by square indices, which depend on the size of the board)
+        """
+        return [(side,) + tuple(r * side + c for r, c in prefix)
+                for side in self._sides
+                if all(0 <= r < side and 0 <= c < side for r, c in prefix)]
+
+    def replay(self, game_id: int) -> Iterator[ReversiBase]:
+        """
+        Replays a game, yielding the start position and then the position
+        after every move. The same game object is yielded every time and
+        updated with apply_move between yields, so the positions are only
+        produced as they are needed; use to_bytes or simulate_moves to
+        keep a copy of one.
+        """
+        record = self[game_id]
+        game = new_reversi(record.side, record.players, record.othello)
+        yield game
+        for move in record.moves:
+            game.apply_move(move)
+            yield game
+
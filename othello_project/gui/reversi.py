@@ -5,8 +5,12 @@ Contains a base class (ReversiBase). You must implement
 a Reversi class that inherits from this base class.
 """
 from abc import ABC, abstractmethod
-from typing import List, Tuple, Optional, Dict
-from copy import deepcopy 
+from typing import List, Tuple, Optional, Dict, NamedTuple, Set
+from collections.abc import Sequence
+from functools import lru_cache
+import random
+import re
+import struct
 
 BoardGridType = List[List[Optional[int]]]
 """
@@ -22,6 +26,102 @@ ListMovesType = List[Tuple[int, int]]
 Type for representing lists of moves on the board.
 """
 
+MovesWithFlipsType = List[Tuple[Tuple[int, int], ListMovesType]]
+"""
+Type for representing lists of moves, each paired with the positions
+of the pieces the move would flip.
+"""
+
+class MoveRecord(NamedTuple):
+    """
+    Undo record returned by apply_move. Passing it to undo_move
+    restores the game to the state it was in before the move.
+    """
+    pos: Tuple[int, int]
+    """Position where the piece was placed"""
+    flipped: ListMovesType
+    """Positions of the pieces flipped by the move"""
+    owners: List[int]
+    """Player that owned each flipped piece before the move"""
+    prev_turn: int
+    """Player that made the move"""
+    deltas: Dict[int, int]
+    """Change in the number of pieces of each affected player"""
+    cache: Optional[Tuple] = None
+    """Results cached for the position before the move, if any"""
+
+POSITION_HEADER = struct.Struct("<BBBBB")
+"""
+Header of an encoded position (see ReversiBase.to_bytes): side, number
+of players, turn, Othello flag and bits per cell.
+"""
+
+
+def cell_bits(players: int) -> int:
+    """
+    Returns the number of bits used to encode one square in a game with
+    the given number of players
+    """
+    if players <= 3:
+        return 2
+    elif players <= 15:
+        return 4
+    return 8
+
+
+@lru_cache(maxsize=None)
+def _unpack_table(bits: int) -> Tuple[bytes, ...]:
+    """
+    Returns, for every byte value, the cells packed in it (lowest bits
+    first) when each cell uses the given number of bits
+    """
+    per_byte = 8 // bits
+    mask = (1 << bits) - 1
+    return tuple(bytes((b >> (k * bits)) & mask for k in range(per_byte))
+                 for b in range(256))
+
+
+@lru_cache(maxsize=None)
+def _pack_masks(bits: int, size: int) -> Tuple[int, ...]:
+    """
+    Returns the masks used by pack_cells to gather size cells of the given
+    number of bits, two cells at a time
+    """
+    if bits == 4:
+        return (int.from_bytes(b"\xff\x00" * (size // 2), "little"),)
+    return (int.from_bytes(b"\x0f\x00" * (size // 2), "little"),
+            int.from_bytes(b"\xff\x00\x00\x00" * (size // 4), "little"))
+
+
+def pack_cells(cells: bytes, bits: int) -> bytes:
+    """
+    Packs cells (one byte per square) into bits bits per square, lowest
+    bits first
+    """
+    if bits == 8:
+        return bytes(cells)
+    per_byte = 8 // bits
+    padded = bytes(cells) + bytes(-len(cells) % per_byte)
+    # Read as one integer, each cell is 8 bits above the previous one;
+    # every step moves each odd cell next to the even cell below it
+    x = int.from_bytes(padded, "little")
+    shift = 8 - bits
+    for mask in _pack_masks(bits, len(padded)):
+        x = (x | x >> shift) & mask
+        shift *= 2
+    return x.to_bytes(len(padded), "little")[::per_byte]
+
+
+def unpack_cells(data, bits: int, count: int) -> bytes:
+    """
+    Unpacks count cells packed by pack_cells back to one byte per square
+    """
+    if bits == 8:
+        return bytes(data[:count])
+    table = _unpack_table(bits)
+    return b"".join(map(table.__getitem__, data))[:count]
+
+
 class ReversiBase(ABC):
     """
     Abstract base class for the game of Reversi
@@ -67,16 +167,25 @@ class ReversiBase(ABC):
         return self._players
 
     @property
-    @abstractmethod
     def grid(self) -> BoardGridType:
         """
         Returns the state of the game board as a list of lists.
         Each entry can either be an integer (meaning there is a
         piece at that location for that player) or None,
         meaning there is no piece in that location. Players are
-        numbered from 1.
+        numbered from 1. The lists are a copy, which later moves
+        do not change.
         """
-        raise NotImplementedError
+        return [list(row) for row in self.grid_view]
+
+    @property
+    def grid_view(self) -> "GridView":
+        """
+        Returns a read-only view of the game board with the same rows
+        and entries as grid, without copying it: the view always shows
+        the current state of the board.
+        """
+        return GridView(GameCells(self), self._side)
 
     @property
     @abstractmethod
@@ -125,6 +234,17 @@ class ReversiBase(ABC):
         """
         raise NotImplementedError
 
+    @property
+    @abstractmethod
+    def zobrist(self) -> int:
+        """
+        Returns the 64-bit Zobrist hash of the position, covering
+        the board size, the number of players, the contents of
+        every square and the turn. Equal positions have equal
+        hashes on every backend.
+        """
+        raise NotImplementedError
+
     #
     # METHODS
     #
@@ -166,7 +286,7 @@ class ReversiBase(ABC):
         raise NotImplementedError
 
     @abstractmethod
-    def apply_move(self, pos: Tuple[int, int]) -> None:
+    def apply_move(self, pos: Tuple[int, int]) -> MoveRecord:
         """
         Place a piece of the current player (as returned by the turn method) 
         on the board.
@@ -195,6 +315,23 @@ class ReversiBase(ABC):
             ValueError: If the specified position is outside
             the bounds of the board.
 
+        Returns: A record of the move that can be passed to
+        undo_move to take it back.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def undo_move(self, record: MoveRecord) -> None:
+        """
+        Takes back a move, restoring the exact state of the
+        game (board and turn) from before the move.
+
+        Moves must be undone in the reverse order from the
+        order in which they were applied.
+
+        Args:
+            record: The record returned by apply_move
+
         Returns: None
         """
         raise NotImplementedError
@@ -235,6 +372,10 @@ class ReversiBase(ABC):
         returns a new object with the result of applying
         the provided moves).
 
+        Searches that only need to look at the resulting
+        position should use apply_move and undo_move instead,
+        which avoid building a new object.
+
         The provided positions are assumed to be legal
         moves. The behaviour of this method when a
         position is on the board, but is not a legal
@@ -267,6 +408,99 @@ class ReversiBase(ABC):
         """
         raise NotImplementedError
 
+    @abstractmethod
+    def cells(self) -> bytes:
+        """
+        Returns the state of the game board as one byte per
+        square, in row-major order: 0 for an empty square,
+        otherwise the number of the player whose piece is there.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def _load_cells(self, turn: int, cells) -> None:
+        """
+        Replaces the state of the game with the given turn and cells (as
+        returned by the cells method), which are assumed to be valid.
+        This is the fast path used by load_game and from_bytes.
+        """
+        raise NotImplementedError
+
+    def to_bytes(self) -> bytes:
+        """
+        Encodes the game as a short header (see POSITION_HEADER)
+        followed by the squares in row-major order, packed at 2 bits
+        per square for up to 3 players, 4 bits for up to 15 players,
+        and 8 bits otherwise.
+
+        Raises:
+            ValueError: If the side of the board is larger than 255, which
+            does not fit in the header
+        """
+        if self._side > 255:
+            raise ValueError("boards larger than 255x255 cannot be encoded")
+        bits = cell_bits(self._players)
+        header = POSITION_HEADER.pack(self._side, self._players, self.turn,
+                                      self._othello, bits)
+        return header + pack_cells(self.cells(), bits)
+
+    @classmethod
+    def from_bytes(cls, data) -> "ReversiBase":
+        """
+        Decodes a game encoded by to_bytes. Called on ReversiBase, the
+        backend is chosen by new_reversi; called on a subclass, returns
+        an instance of that subclass.
+
+        Args:
+            data: bytes, bytearray or memoryview; the cells are decoded
+            straight from it without copying the encoding first
+
+        Raises:
+            ValueError: If the encoding is inconsistent
+        """
+        data = memoryview(data)
+        if len(data) < POSITION_HEADER.size:
+            raise ValueError("encoded position is too short")
+        side, players, turn, othello, bits = \
+            POSITION_HEADER.unpack_from(data)
+        if bits != cell_bits(players):
+            raise ValueError("bits per cell is inconsistent with the number \
+                of players")
+        if not 1 <= turn <= players:
+            raise ValueError("value of turn is inconsistent with the number \
+                of players")
+
+        count = side * side
+        body = data[POSITION_HEADER.size:]
+        if len(body) != -(-count * bits // 8):
+            raise ValueError("size of the encoded board is inconsistent with \
+                the side")
+        cells = unpack_cells(body, bits, count)
+        if count and max(cells) > players:
+            raise ValueError("value in the board is inconsistent with the \
+                number of players")
+
+        if cls is ReversiBase:
+            game = new_reversi(side, players, bool(othello))
+        else:
+            game = cls(side, players, bool(othello))
+        game._load_cells(turn, cells)
+        return game
+
+    def __hash__(self) -> int:
+        # Games are mutable: the hash changes with every move, so a
+        # game must not be changed while it is in a set or dict
+        return self.zobrist
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, ReversiBase):
+            return NotImplemented
+        return self.zobrist == other.zobrist and \
+            self._side == other._side and \
+            self._players == other._players and \
+            self.turn == other.turn and \
+            self.cells() == other.cells()
+
 # class Player:
     
 #     name: str 
@@ -286,16 +520,239 @@ class ReversiPiece:
         return self._player
     
 
+DIRECTIONS = [(- 1, 0), (0, 1), (1, 0), (0, -1), 
+              (-1, -1), (-1, 1), 
+              (1, -1), (1, 1)]
+"""
+The 8 directions along which pieces can be flipped, as (row, col) steps.
+"""
+
+RayTableType = Tuple[Tuple[Tuple[int, ...], ...], ...]
+"""
+Type for the ray table of a board: for every square index (r * side + c),
+one tuple per direction (in the order of DIRECTIONS) listing the indices
+of the squares from the square to the edge of the board.
+"""
+
+
+@lru_cache(maxsize=None)
+def ray_table(side: int) -> RayTableType:
+    """
+    Returns the ray table for boards of the given side. The table is
+    built once per side and shared by every game of that size.
+    """
+    table = []
+    for r in range(side):
+        for c in range(side):
+            rays = []
+            for a, b in DIRECTIONS:
+                ray = []
+                x, y = r + a, c + b
+                while 0 <= x < side and 0 <= y < side:
+                    ray.append(x * side + y)
+                    x += a
+                    y += b
+                rays.append(tuple(ray))
+            table.append(tuple(rays))
+    return tuple(table)
+
+
+@lru_cache(maxsize=None)
+def neighbor_table(side: int) -> Tuple[Tuple[int, ...], ...]:
+    """
+    Returns, for every square index, the indices of the (up to 8)
+    squares next to it, for boards of the given side.
+    """
+    return tuple(tuple(ray[0] for ray in rays if ray)
+                 for rays in ray_table(side))
+
+
+class ZobristKeys(NamedTuple):
+    """
+    Random keys used to compute Zobrist hashes for one board size and
+    number of players
+    """
+    base: int
+    """Key for the board size and number of players"""
+    cells: Tuple[Tuple[int, ...], ...]
+    """Key for every square index and player (0 for an empty square)"""
+    turn: Tuple[int, ...]
+    """Key for the player whose turn it is"""
+
+
+_MASK64 = (1 << 64) - 1
+
+
+def _splitmix64(x: int) -> int:
+    """
+    Returns a well-mixed 64-bit value for the 64-bit input x (the output
+    function of the SplitMix64 generator)
+    """
+    x = (x + 0x9E3779B97F4A7C15) & _MASK64
+    x = ((x ^ (x >> 30)) * 0xBF58476D1CE4E5B9) & _MASK64
+    x = ((x ^ (x >> 27)) * 0x94D049BB133111EB) & _MASK64
+    return x ^ (x >> 31)
+
+
+@lru_cache(maxsize=None)
+def zobrist_seed(side: int, players: int) -> int:
+    """
+    Returns the seed from which the Zobrist keys for boards of the given
+    side and number of players are derived
+    """
+    return random.Random(f"zobrist-{side}-{players}").getrandbits(64)
+
+
+def zobrist_key(seed: int, index: int) -> int:
+    """
+    Returns Zobrist key number index for the given seed. Key i * 256 + p
+    is the key of a piece of player p on square i; the keys after the
+    squares are used for the turn and the board (see zobrist_keys).
+    Each key is computed on its own, so a backend can compute only the
+    keys of the squares it uses.
+    """
+    return _splitmix64(seed ^ index)
+
+
+@lru_cache(maxsize=None)
+def zobrist_keys(side: int, players: int) -> ZobristKeys:
+    """
+    Returns the Zobrist keys for boards of the given side and number of
+    players. The keys are derived from the side and the number of
+    players, so they are the same in every process.
+    """
+    seed = zobrist_seed(side, players)
+    cells = tuple((0,) + tuple(zobrist_key(seed, i * 256 + p)
+                               for p in range(1, players + 1))
+                  for i in range(side * side))
+    after = side * side * 256
+    turn = (0,) + tuple(zobrist_key(seed, after + p)
+                        for p in range(1, players + 1))
+    return ZobristKeys(zobrist_key(seed, after), cells, turn)
+
+
+def center_squares(side: int, players: int) -> List[Tuple[int, int]]:
+    """
+    Returns the squares of the center of the board, in row-major order:
+    the block of players x players squares in the middle of the board,
+    which the first moves of a game without the Othello configuration
+    must fill
+    """
+    start = (side - players) // 2
+    block = range(max(start, 0), min(start + players, side))
+    return [(r, c) for r in block for c in block]
+
+
+class GridRow(Sequence):
+    """
+    Read-only view of one row of a Board, with None for empty squares
+    """
+    __slots__ = ("_cells", "_start", "_side")
+
+    def __init__(self, cells: bytearray, start: int, side: int) -> None:
+        self._cells = cells
+        self._start = start
+        self._side = side
+
+    def __len__(self) -> int:
+        return self._side
+
+    def __getitem__(self, c):
+        if isinstance(c, slice):
+            return [self[i] for i in range(self._side)[c]]
+        if c < 0:
+            c += self._side
+        if not 0 <= c < self._side:
+            raise IndexError("column index out of range")
+        return self._cells[self._start + c] or None
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, Sequence):
+            return NotImplemented
+        return list(self) == list(other)
+
+    def __repr__(self) -> str:
+        return repr(list(self))
+
+
+class GridView(Sequence):
+    """
+    Read-only view of the cells of a Board as a list of rows. The view
+    does not copy the cells, so it always reflects the current state
+    of the board.
+    """
+    __slots__ = ("_cells", "_side")
+
+    def __init__(self, cells: bytearray, side: int) -> None:
+        self._cells = cells
+        self._side = side
+
+    def __len__(self) -> int:
+        return self._side
+
+    def __getitem__(self, r):
+        if isinstance(r, slice):
+            return [self[i] for i in range(self._side)[r]]
+        if r < 0:
+            r += self._side
+        if not 0 <= r < self._side:
+            raise IndexError("row index out of range")
+        return GridRow(self._cells, r * self._side, self._side)
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, Sequence):
+            return NotImplemented
+        return len(self) == len(other) and \
+            all(row == other_row for row, other_row in zip(self, other))
+
+    def __repr__(self) -> str:
+        return repr([list(row) for row in self])
+
+
+class GameCells:
+    """
+    Read-only view of the pieces of any game as a sequence of cells,
+    with 0 for an empty square (as used by GridView)
+    """
+    __slots__ = ("_game", "_side")
+
+    def __init__(self, game: "ReversiBase") -> None:
+        self._game = game
+        self._side = game.size
+
+    def __getitem__(self, i: int) -> int:
+        return self._game.piece_at(divmod(i, self._side)) or 0
+
+
 class Board: 
-    
-    side: int
-    _grid: List[List[Optional[ReversiPiece]]]
+    """
+    Board stored as one byte per square in row-major order: 0 for an
+    empty square, otherwise the number of the player (from 1) whose
+    piece is there.
+    """
+    __slots__ = ("_side", "_cells", "count_pieces", "_occupied", "_keys",
+                 "_base", "hash")
+
+    _side: int
+    _cells: bytearray
     count_pieces: Dict[int, int]
+    _occupied: Dict[int, Set[int]]
+    _keys: Tuple[Tuple[int, ...], ...]
+    _base: int
+    hash: int
 
-    def __init__(self, side: int) -> None: 
+    def __init__(self, side: int, players: int) -> None: 
         self._side = side
-        self._grid = [[None]*side for _ in range(side)]
+        self._cells = bytearray(side * side)
+        # Number of pieces and set of square indices of every player,
+        # updated with every change
         self.count_pieces = {}
+        self._occupied = {}
+        keys = zobrist_keys(side, players)
+        self._keys = keys.cells
+        self._base = keys.base
+        # Zobrist hash of the board contents, updated with every change
+        self.hash = keys.base
     
     @property
     def size(self) -> int:
@@ -306,50 +763,109 @@ class Board:
     
     @property
     def grid(self) -> BoardGridType:
-        printed_board = []
-        for row in self._grid:
-            print_row: List[Optional[int]] = []
-            for cell in row:
-                if cell is not None:
-                    print_row.append(cell.player)
-                else: 
-                    print_row.append(None)
-            printed_board.append(print_row)
-        
-        return printed_board
+        """
+        Returns a copy of the board as a list of lists
+        """
+        cells, side = self._cells, self._side
+        return [[cell or None for cell in cells[start:start + side]]
+                for start in range(0, side * side, side)]
+
+    @property
+    def grid_view(self) -> GridView:
+        """
+        Returns a read-only view of the board as a list of lists
+        """
+        return GridView(self._cells, self._side)
     
-    def piece_at(self, pos: Tuple[int, int]) -> Optional[ReversiPiece]:
+    def piece_at(self, pos: Tuple[int, int]) -> Optional[int]:
         r, c = pos
         if not (0 <= r < self.size and 0 <= c < self.size):
             raise ValueError("Position is out of bounds.")
         
-        return self._grid[r][c]
+        return self._cells[r * self._side + c] or None
     
-    def slot_piece(self, location, piece: ReversiPiece) -> None: 
+    def slot_piece(self, location, player: int) -> None: 
         """
-        Places a player at given location on the board (assumes valid location)
+        Places a piece of the given player at given location on the board 
+        (assumes valid location)
         """
         r, c = location 
-        existing_piece = self._grid[r][c]
-        if existing_piece is not None:
-            losing_player: int = existing_piece.player
-            self.count_pieces[losing_player] -= 1
-        self.count_pieces[piece.player] = (self.count_pieces.get(piece.player, 0) 
-                                            + 1)
-        self._grid[r][c] = piece
+        self._slot(r * self._side + c, player)
+
+    def _slot(self, i: int, player: int) -> None:
+        """
+        Places a piece of the given player on the square with index i
+        """
+        existing_player = self._cells[i]
+        if existing_player:
+            self.count_pieces[existing_player] -= 1
+            self._occupied[existing_player].discard(i)
+        self.count_pieces[player] = self.count_pieces.get(player, 0) + 1
+        self._occupied.setdefault(player, set()).add(i)
+        self._cells[i] = player
+        keys = self._keys[i]
+        self.hash ^= keys[existing_player] ^ keys[player]
+
+    def remove_piece(self, location) -> None:
+        """
+        Removes the piece at the given location, if any
+        """
+        r, c = location
+        self._remove(r * self._side + c)
+
+    def _remove(self, i: int) -> None:
+        """
+        Removes the piece on the square with index i, if any
+        """
+        existing_player = self._cells[i]
+        if existing_player:
+            self.count_pieces[existing_player] -= 1
+            self._occupied[existing_player].discard(i)
+            self._cells[i] = 0
+            self.hash ^= self._keys[i][existing_player]
         
     
+    def load(self, cells) -> None:
+        """
+        Replaces the contents of the board with the given cells (one byte
+        per square in row-major order, as stored in _cells) and rebuilds
+        the piece counts, occupancy sets and hash from them
+        """
+        self._cells[:] = cells
+        self.count_pieces = {}
+        self._occupied = {}
+        h = self._base
+        keys = self._keys
+        for i, player in enumerate(self._cells):
+            if player:
+                self._occupied.setdefault(player, set()).add(i)
+                h ^= keys[i][player]
+        for player, squares in self._occupied.items():
+            self.count_pieces[player] = len(squares)
+        self.hash = h
+
+    def copy(self) -> "Board":
+        """
+        Returns a copy of the board that shares no mutable state with it
+        """
+        board = Board.__new__(Board)
+        board._side = self._side
+        board._cells = bytearray(self._cells)
+        board.count_pieces = dict(self.count_pieces)
+        board._occupied = {p: set(squares)
+                           for p, squares in self._occupied.items()}
+        board._keys = self._keys
+        board._base = self._base
+        board.hash = self.hash
+        return board
+    
     def locations(self, p: int) -> List[Tuple[int, int]]: 
         """
-        Finds all the locations of a given integer player on the board. 
+        Finds all the locations of a given integer player on the board,
+        in no particular order. 
         """
-        locations: List[Tuple[int, int]] = []
-        for i, row in enumerate(self._grid): 
-            for j, piece in enumerate(row): 
-                if piece is not None and piece.player == p: 
-                    locations.append((i, j))
-
-        return locations
+        side = self._side
+        return [divmod(i, side) for i in self._occupied.get(p, ())]
     
     
 class Reversi(ReversiBase):
@@ -357,6 +873,15 @@ class Reversi(ReversiBase):
     board: Board
     pieces: List[ReversiPiece]
     center: List[Tuple[int, int]]
+    _center_set: Set[Tuple[int, int]]
+    _center_empty: int
+    _frontier: Set[int]
+    _rays: RayTableType
+    _adjacent: Tuple[Tuple[int, ...], ...]
+    _turn_keys: Tuple[int, ...]
+    _moves_cache: Dict[int, ListMovesType]
+    _done: Optional[bool]
+    _winners: Optional[List[int]]
     
     def __init__(self, side: int, players: int, othello: bool):
         """
@@ -385,7 +910,10 @@ class Reversi(ReversiBase):
             raise ValueError("Othello configuration is only valid for 2 \
                 players")
         
-        self.board = Board(side)
+        self.board = Board(side, players)
+        self._turn_keys = zobrist_keys(side, players).turn
+        self._rays = ray_table(side)
+        self._adjacent = neighbor_table(side)
         
         self.pieces = []
         for i in range(1, players + 1):
@@ -393,37 +921,105 @@ class Reversi(ReversiBase):
 
         if othello: 
             n = side//2
-            piece1: ReversiPiece = self.pieces[0]
-            piece2: ReversiPiece = self.pieces[1]
-
-            self.board.slot_piece((n - 1, n), piece1) #northeast
-            self.board.slot_piece((n, n - 1), piece1) #southwest
-            self.board.slot_piece((n - 1, n - 1), piece2) #northwest
-            self.board.slot_piece((n, n), piece2) #southeast
+            self.board.slot_piece((n - 1, n), 1) #northeast
+            self.board.slot_piece((n, n - 1), 1) #southwest
+            self.board.slot_piece((n - 1, n - 1), 2) #northwest
+            self.board.slot_piece((n, n), 2) #southeast
             
-        m: float = (self._side - 1)/2
-        half_p: float = self.num_players/2
-        self.center = []
-        for i in range(self.size):
-            for j in range(self.size):
-                if abs(i - m) < half_p and abs(j - m) < half_p:
-                    self.center.append((i, j))
+        self.center = center_squares(side, players)
+        self._center_set = set(self.center)
+        self._rebuild_frontier()
+        self._clear_cache()
         
         self._turn = self.pieces[0]
 
     @property
     def grid(self) -> BoardGridType:
-        printed_board = []
-        for row in self.board._grid:
-            print_row: List[Optional[int]] = []
-            for cell in row:
-                if cell is not None:
-                    print_row.append(cell.player)
-                else: 
-                    print_row.append(None)
-            printed_board.append(print_row)
-        
-        return printed_board
+        return self.board.grid
+
+    @property
+    def grid_view(self) -> GridView:
+        return self.board.grid_view
+
+    @property
+    def zobrist(self) -> int:
+        return self.board.hash ^ self._turn_keys[self._turn.player]
+
+    def cells(self) -> bytes:
+        return bytes(self.board._cells)
+
+    @property
+    def center_filled(self) -> bool:
+        """
+        Returns True once every square in the center has a piece, after
+        which moves must flip pieces
+        """
+        return self._center_empty == 0
+
+    def _clear_cache(self) -> None:
+        """
+        Forgets the move lists, done flag and winners computed for the
+        current position. Must be called whenever the board changes.
+        """
+        self._moves_cache = {}
+        self._done = None
+        self._winners = None
+
+    def _moves_for(self, player: int) -> ListMovesType:
+        """
+        Returns the (cached) list of moves of the given player. The list
+        is shared with the cache and must not be modified.
+        """
+        moves = self._moves_cache.get(player)
+        if moves is None:
+            moves = self._generate_moves(player)
+            self._moves_cache[player] = moves
+        return moves
+
+    def _rebuild_frontier(self) -> None:
+        """
+        Recomputes the frontier (the indices of the empty squares next to
+        at least one piece) and the number of empty center squares from
+        the board
+        """
+        cells = self.board._cells
+        self._frontier = set()
+        for i, player in enumerate(cells):
+            if player:
+                for j in self._adjacent[i]:
+                    if not cells[j]:
+                        self._frontier.add(j)
+        self._center_empty = sum(1 for r, c in self.center
+                                 if not cells[r * self._side + c])
+
+    def _fill_square(self, i: int) -> None:
+        """
+        Updates the frontier and center after a piece is placed on the
+        square with index i
+        """
+        cells = self.board._cells
+        frontier = self._frontier
+        frontier.discard(i)
+        for j in self._adjacent[i]:
+            if not cells[j]:
+                frontier.add(j)
+        if divmod(i, self._side) in self._center_set:
+            self._center_empty -= 1
+
+    def _empty_square(self, i: int) -> None:
+        """
+        Updates the frontier and center after the piece on the square
+        with index i is removed
+        """
+        cells = self.board._cells
+        adjacent = self._adjacent
+        for j in adjacent[i]:
+            if cells[j]:
+                self._frontier.add(i)
+            elif not any(cells[k] for k in adjacent[j]):
+                self._frontier.discard(j)
+        if divmod(i, self._side) in self._center_set:
+            self._center_empty += 1
 
     @property
     def all_pieces(self) -> List[ReversiPiece]: 
@@ -460,50 +1056,90 @@ class Reversi(ReversiBase):
         If there is no available moves, this function
         will return empty list.
         """
+        return list(self._moves_for(player))
+
+    def _generate_moves(self, player: int) -> ListMovesType:
+        """
+        Computes the list of moves of the given player in row-major
+        order, looking only at the center or the frontier.
+        """
+        cells = self.board._cells
+        if not self.center_filled:
+            return [(r, c) for r, c in self.center
+                    if not cells[r * self._side + c]]
+
         moves = []
-        for r in range(self._side):
-            for c in range(self._side):
-                if self.legal_move_player_specific((r, c), player):
-                    moves.append((r, c))
+        side = self._side
+        for i in sorted(self._frontier):
+            if self._flanks(i, player):
+                moves.append(divmod(i, side))
 
         return moves
 
+    def available_moves_with_flips(self, player: int) -> MovesWithFlipsType:
+        """
+        Returns the list of positions where a given player could place a
+        piece, each paired with the positions of the pieces that move
+        would flip, in a single pass over the board.
+
+        If there is no available moves, this function
+        will return empty list.
+        """
+        if not self.center_filled:
+            return [(pos, []) for pos in self._moves_for(player)]
+
+        side = self._side
+        moves: MovesWithFlipsType = []
+        for i in sorted(self._frontier):
+            flips = self._flip_indices(i, player)
+            if flips:
+                moves.append((divmod(i, side),
+                              [divmod(f, side) for f in flips]))
+
+        if player not in self._moves_cache:
+            self._moves_cache[player] = [pos for pos, _ in moves]
+        return moves
+
     @property
     def available_moves(self) -> ListMovesType:
         return self.available_moves_for_player(self.turn)
 
     @property
     def done(self) -> bool:
-        for i in range(1, self._players + 1):
-            if self.available_moves_for_player(i) != []:
-                return False
+        if self._done is None:
+            self._done = True
+            for i in range(1, self._players + 1):
+                if self._moves_for(i) != []:
+                    self._done = False
+                    break
         
-        return True
+        return self._done
 
     @property
     def outcome(self) -> List[int]:
-        if self.done: 
-            max_pieces = 0
+        if self._winners is None:
             winners = []
-            for i in range(1, self._players + 1):
-                if self.piece_counts(i) > max_pieces:
-                    max_pieces = self.piece_counts(i)
-                    winners = [i]
-                elif self.piece_counts(i) == max_pieces:
-                    winners.append(i)
-            return winners
-        else:
-            return []
+            if self.done: 
+                max_pieces = 0
+                for i in range(1, self._players + 1):
+                    count = self.piece_counts(i)
+                    if count > max_pieces:
+                        max_pieces = count
+                        winners = [i]
+                    elif count == max_pieces:
+                        winners.append(i)
+            self._winners = winners
+        return list(self._winners)
     
     def piece_at(self, pos: Tuple[int, int]) -> Optional[int]:
-        cell = self.board.piece_at(pos)
-        if cell is not None:
-            return cell.player
-        else:
-            return None
+        return self.board.piece_at(pos)
 
     def legal_move(self, pos: Tuple[int, int]) -> bool:
-        return self.legal_move_player_specific(pos, self.turn)
+        x, y = pos
+        if not (0 <= x < self.size and 0 <= y < self.size):
+            raise ValueError("Position is out of bounds.")
+
+        return (x, y) in self._moves_for(self.turn)
     
     def legal_move_player_specific(self, pos: Tuple[int, int], player: int) \
         -> bool:
@@ -526,20 +1162,14 @@ class Reversi(ReversiBase):
         if not (0 <= x < self.size and 0 <= y < self.size):
             raise ValueError("Position is out of bounds.")
         
-        center_filled = True
-        
-        for x, y in self.center:
-                if self.board.piece_at((y,x)) is None:
-                    center_filled = False
-
-        if center_filled:
+        if self.center_filled:
             return self.legal_move_center_filled(pos, player)
         else:
-            return self.legal_move_center_not_filled(pos, self.center)
+            return self.legal_move_center_not_filled(pos, self._center_set)
 
 
     def legal_move_center_not_filled(self, pos: Tuple[int, int], 
-                                     center: List[Tuple[int, int]]) -> bool:
+                                     center: Set[Tuple[int, int]]) -> bool:
         """
         Check if a move is legal when the center is not filled.
 
@@ -559,7 +1189,7 @@ class Reversi(ReversiBase):
 
         x, y = pos
         
-        if self.board._grid[x][y] is not None:
+        if self.board._cells[x * self._side + y]:
             return False
         
         if (x,y) in center:
@@ -584,103 +1214,100 @@ class Reversi(ReversiBase):
         Otherwise, return False.
         """
         y,x = pos
-        legal_dir: List[Optional[Tuple[int, int]]] = []
-        exist_dir: bool = False
+        i = y * self._side + x
 
-        if self.board._grid[y][x] is not None:
-            return False
-            
-        directions = [(- 1, 0), (0, 1), (1, 0), (0, -1), 
-                        (-1, -1), (-1, 1), 
-                        (1, -1), (1, 1)]
-
-        for d1, d2 in directions:
-            if 0 <= (y + d1) < self.board.size and 0 <= (x + d2) < \
-                self.board.size:
-                value = self.board._grid[y + d1][x + d2]
-                if value is not None and value.player is not player:
-                    legal_dir.append((d1, d2))
-    
-        if legal_dir != []:
-            for coor in legal_dir:
-                if coor is not None:
-                    d1, d2 = coor
-                    r, c = (y + d1, x + d2)
-                    if self.valid_dir(d1, d2, r, c, player):
-                        exist_dir = True 
-            return exist_dir
-        else:
+        if self.board._cells[i]:
             return False
-        
-    
-    def valid_dir(self, d1: int, d2: int, r: int, c: int, player: int) -> bool:
-        """
-        Helper function for legal_move_center_filled; checks whether move is 
-        valid in a particular direction 
-        Args:
-            d1: row value of direction to check 
-            d2: col value of direction to check 
-            r: row value of starting pos 
-            c: col value of starting pos 
 
-        Returns:
-            bool: whether the move is valid in that direction 
+        return self._flanks(i, player)
+
+    def _flanks(self, i: int, player: int) -> bool:
         """
-        nr, nc = d1 + r, d2 + c
-        if not (0 <= (nr) < self.board.size and 0 <= (nc) < self.board.size):
-            return False 
-        else:
-            p = self.board._grid[nr][nc]
-            if p is None:
-                return False
-            elif p.player == player:
-                return True
-            else: 
-                return self.valid_dir(d1, d2, d1 + r, d2 + c, player)
-
-    def apply_move(self, pos: Tuple[int, int]) -> None:
+        Checks whether a piece of the given player on the (empty) square
+        with index i would flank at least one line of opposing pieces
+        """
+        cells = self.board._cells
+        for ray in self._rays[i]:
+            if len(ray) < 2:
+                continue
+            p = cells[ray[0]]
+            if not p or p == player:
+                continue
+            for j in ray[1:]:
+                p = cells[j]
+                if not p:
+                    break
+                if p == player:
+                    return True
+        return False
+
+    def _flip_indices(self, i: int, player: int) -> List[int]:
+        """
+        Returns the indices of the pieces that a piece of the given player
+        on the (empty) square with index i would flip
+        """
+        cells = self.board._cells
+        flips: List[int] = []
+        for ray in self._rays[i]:
+            for k, j in enumerate(ray):
+                p = cells[j]
+                if not p:
+                    break
+                if p == player:
+                    flips.extend(ray[:k])
+                    break
+        return flips
+
+    def apply_move(self, pos: Tuple[int, int]) -> MoveRecord:
         if not self.legal_move(pos):
             raise ValueError("not a legal move")
         
+        player = self._turn.player
+        cache = (self._moves_cache, self._done, self._winners)
+        board = self.board
+        cells = board._cells
+        side = self._side
         r, c = pos
-        self.board.slot_piece((r, c), self._turn) 
+        i = r * side + c
+        flipped: ListMovesType = []
+        owners: List[int] = []
+        deltas: Dict[int, int] = {player: 1}
         
-        if not (r, c) in self.center:
-            directions = [(- 1, 0), (0, 1), (1, 0), (0, -1), 
-                            (-1, -1), (-1, 1), 
-                            (1, -1), (1, 1)]
-            for a, b in directions:
-                start_a, start_b = pos
-                while (0 <= (start_a + a) < self.board.size 
-                    and 0 <= (start_b + b) < self.board.size):
-                    if self.board.piece_at((start_a + a, start_b + b)) == \
-                        self._turn:
-                        self.flip((r, c), (a, b))
-                        break
-                    start_a += a
-                    start_b += b
+        if not (r, c) in self._center_set:
+            for f in self._flip_indices(i, player):
+                owner = cells[f]
+                owners.append(owner)
+                deltas[owner] = deltas.get(owner, 0) - 1
+                board._slot(f, player)
+                flipped.append(divmod(f, side))
+        board._slot(i, player)
+        self._fill_square(i)
+        deltas[player] += len(flipped)
+        self._clear_cache()
         
-        if not self.done: 
+        # The next player with a move gets the turn; if nobody (not even
+        # the player who just moved) has one, the game is over
+        self._done = True
+        for _ in range(self._players):
             self.change_turn
-            while self.available_moves_for_player(self.turn) == []:
-                self.change_turn
-    
-    def flip(self, loc: Tuple[int, int], dir: Tuple[int, int]) -> None:
-        """
-        Takes a location and a direction.
-        It changes all the pieces starting from the location 
-        in the given direction until there is a piece of the same player 
-        as the starting location.
-        """
-        x, y = loc
-        a, b = dir
-        wanted_piece: Optional[ReversiPiece] = self.board.piece_at((x, y))
-
-        while self.board.piece_at((x + a, y + b)) != wanted_piece:
-            if wanted_piece is not None:
-                self.board.slot_piece((x + a, y + b), wanted_piece)
-                x += a
-                y += b
+            if self._moves_for(self._turn.player) != []:
+                self._done = False
+                break
+
+        return MoveRecord(pos, flipped, owners, player, deltas, cache)
+
+    def undo_move(self, record: MoveRecord) -> None:
+        for loc, owner in zip(record.flipped, record.owners):
+            self.board.slot_piece(loc, owner)
+        r, c = record.pos
+        i = r * self._side + c
+        self.board._remove(i)
+        self._empty_square(i)
+        self._turn = self.pieces[record.prev_turn - 1]
+        if record.cache is not None:
+            self._moves_cache, self._done, self._winners = record.cache
+        else:
+            self._clear_cache()
 
     def load_game(self, turn: int, grid: BoardGridType) -> None:
         if not 1 <= turn <= self._players:
@@ -696,6 +1323,9 @@ class Reversi(ReversiBase):
                 attribute.")
         
         for row in grid:
+            if len(row) != self._side:
+                raise ValueError("size of the grid is inconsistent with the _size \
+                    attribute.")
             for piece in row:
                 if piece is not None:
                     if not isinstance(piece, int):
@@ -705,38 +1335,55 @@ class Reversi(ReversiBase):
                         raise ValueError("value in the grid is inconsistent \
                             with the _players attribute.")
         
-        converted_board: List[List[Optional[ReversiPiece]]] = []
+        converted_board = bytearray()
 
         for row in grid:
-            converted_row: List[Optional[ReversiPiece]] = []
             for cell in row:
-                if cell is not None:
-                    self.board.count_pieces[cell] = self.board.count_pieces.get(cell, 0) + 1
-                    converted_row.append(self.pieces[cell - 1])
-                else: 
-                    converted_row.append(None)
-            converted_board.append(converted_row)
-
-        self.board._grid = converted_board
+                converted_board.append(cell or 0)
+
+        self._load_cells(turn, converted_board)
+
+    def _load_cells(self, turn: int, cells) -> None:
+        self.board.load(cells)
+        self._rebuild_frontier()
+        self._clear_cache()
         self._turn = self.pieces[turn - 1]
 
     def simulate_moves(self,
                        moves: ListMovesType
                        ) -> "Reversi":
+        records: List[MoveRecord] = []
+        try:
+            for pos in moves:
+                records.append(self.apply_move(pos))
+            new_game = self._copy()
+        finally:
+            for record in reversed(records):
+                self.undo_move(record)
 
-        new_game = Reversi(side=self._side, players=self._players, \
-            othello=self._othello)
-
-        new_game.board = deepcopy(self.board)
-        new_game.board._grid = deepcopy(self.board._grid)
-        new_game.pieces = deepcopy(self.pieces)
-        new_game._turn = deepcopy(self._turn)
-
-        
-        for pos in moves:       
-            new_game.apply_move(pos)
-
+        return new_game
 
+    def _copy(self) -> "Reversi":
+        """
+        Returns a copy of the game that shares no mutable state with it
+        """
+        new_game = Reversi.__new__(Reversi)
+        new_game._side = self._side
+        new_game._players = self._players
+        new_game._othello = self._othello
+        new_game.board = self.board.copy()
+        new_game._turn_keys = self._turn_keys
+        new_game.pieces = self.pieces
+        new_game.center = self.center
+        new_game._rays = self._rays
+        new_game._adjacent = self._adjacent
+        new_game._center_set = self._center_set
+        new_game._center_empty = self._center_empty
+        new_game._frontier = set(self._frontier)
+        new_game._moves_cache = dict(self._moves_cache)
+        new_game._done = self._done
+        new_game._winners = self._winners
+        new_game._turn = self._turn
         return new_game
 
     def piece_counts(self, player: int) -> int:
@@ -750,4 +1397,890 @@ class Reversi(ReversiBase):
         Returns:
             int: the number of pieces the given player has on the board.
         """
-        return self.board.count_pieces[player]
\ No newline at end of file
+        return self.board.count_pieces.get(player, 0)
+
+@lru_cache(maxsize=None)
+def _bit_directions(side: int) -> Tuple[Tuple[int, int], ...]:
+    """
+    Returns the (shift, mask) pairs used to move a bitboard of the given
+    side one step in each of the 8 directions. A positive shift moves
+    towards higher square indices; the mask clears the squares that
+    would otherwise wrap around to the other edge of the board.
+    """
+    full = (1 << (side * side)) - 1
+    not_first_col = 0
+    not_last_col = 0
+    for r in range(side):
+        for c in range(side):
+            if c != 0:
+                not_first_col |= 1 << (r * side + c)
+            if c != side - 1:
+                not_last_col |= 1 << (r * side + c)
+
+    dirs = []
+    for dr, dc in DIRECTIONS:
+        if dc == 1:
+            mask = not_first_col
+        elif dc == -1:
+            mask = not_last_col
+        else:
+            mask = full
+        dirs.append((dr * side + dc, mask))
+    return tuple(dirs)
+
+
+class BitboardReversi(ReversiBase):
+    """
+    Reversi for two players on boards of at most 8x8, with the position
+    stored as one integer bitboard per player (bit r * side + c is set
+    when the player has a piece at (r, c)).
+    """
+
+    _bits: List[int]
+    _turn: int
+    _full: int
+    _center: int
+    _dirs: Tuple[Tuple[int, int], ...]
+    _moves_cache: List[Optional[int]]
+    _keys: ZobristKeys
+    _hash: int
+
+    def __init__(self, side: int, players: int, othello: bool):
+        """
+        Constructor
+        Args:
+            side: Number of squares on each side of the board
+            players: Number of players (must be 2)
+            othello: Whether to initialize the board with an Othello
+            configuration.
+
+        Raises:
+            ValueError: If the parity of side and players is incorrect, or
+            if the board does not fit in a bitboard
+        """
+        super().__init__(side, players, othello)
+
+        if players != 2:
+            raise ValueError("Bitboards only support 2 players")
+
+        if side % 2 != 0:
+            raise ValueError("Parity is incorrect (even)")
+
+        if not 2 <= side <= 8:
+            raise ValueError("Bitboards only support boards up to 8x8")
+
+        self._full = (1 << (side * side)) - 1
+        self._dirs = _bit_directions(side)
+
+        # With two players the center is the 2x2 block in the middle
+        n = side // 2
+        self._center = 0
+        for r, c in [(n - 1, n - 1), (n - 1, n), (n, n - 1), (n, n)]:
+            self._center |= self._bit((r, c))
+
+        # Index 0 is unused so that players can index the list directly
+        self._bits = [0, 0, 0]
+        if othello:
+            self._bits[1] = self._bit((n - 1, n)) | self._bit((n, n - 1))
+            self._bits[2] = self._bit((n - 1, n - 1)) | self._bit((n, n))
+
+        self._turn = 1
+        self._moves_cache = [None, None, None]
+        self._keys = zobrist_keys(side, players)
+        self._rehash()
+
+    def _rehash(self) -> None:
+        """
+        Recomputes the Zobrist hash of the board contents from scratch
+        """
+        h = self._keys.base
+        for player in (1, 2):
+            bits = self._bits[player]
+            while bits:
+                low = bits & -bits
+                h ^= self._keys.cells[low.bit_length() - 1][player]
+                bits ^= low
+        self._hash = h
+
+    def _bit(self, pos: Tuple[int, int]) -> int:
+        """
+        Returns the bitboard with only the given position set
+        """
+        r, c = pos
+        return 1 << (r * self._side + c)
+
+    def _check_bounds(self, pos: Tuple[int, int]) -> None:
+        """
+        Raises ValueError if the position is outside the board
+        """
+        r, c = pos
+        if not (0 <= r < self._side and 0 <= c < self._side):
+            raise ValueError("Position is out of bounds.")
+
+    def _shift(self, bits: int, shift: int, mask: int) -> int:
+        """
+        Moves every set bit one step in the direction given by shift
+        """
+        if shift > 0:
+            return (bits << shift) & mask & self._full
+        return (bits >> -shift) & mask
+
+    def _move_bits(self, player: int) -> int:
+        """
+        Returns the bitboard of legal moves for the given player, cached
+        until the position changes
+        """
+        moves = self._moves_cache[player]
+        if moves is None:
+            moves = self._generate_move_bits(player)
+            self._moves_cache[player] = moves
+        return moves
+
+    def _generate_move_bits(self, player: int) -> int:
+        """
+        Computes the bitboard of legal moves for the given player
+        """
+        empty = self._full & ~(self._bits[1] | self._bits[2])
+        if self._center & empty:
+            return self._center & empty
+
+        own = self._bits[player]
+        opp = self._bits[3 - player]
+        moves = 0
+        for shift, mask in self._dirs:
+            x = self._shift(own, shift, mask) & opp
+            for _ in range(self._side - 3):
+                x |= self._shift(x, shift, mask) & opp
+            moves |= self._shift(x, shift, mask) & empty
+        return moves
+
+    def _flip_bits(self, move: int, player: int) -> int:
+        """
+        Returns the bitboard of opposing pieces flipped when the given
+        player places a piece on the (single bit) move
+        """
+        if move & self._center:
+            return 0
+
+        own = self._bits[player]
+        opp = self._bits[3 - player]
+        flips = 0
+        for shift, mask in self._dirs:
+            run = 0
+            x = self._shift(move, shift, mask)
+            while x & opp:
+                run |= x
+                x = self._shift(x, shift, mask)
+            if x & own:
+                flips |= run
+        return flips
+
+    def _positions(self, bits: int) -> ListMovesType:
+        """
+        Converts a bitboard into a list of positions in row-major order
+        """
+        positions = []
+        while bits:
+            low = bits & -bits
+            positions.append(divmod(low.bit_length() - 1, self._side))
+            bits ^= low
+        return positions
+
+    @property
+    def grid(self) -> BoardGridType:
+        grid: BoardGridType = []
+        for r in range(self._side):
+            row: List[Optional[int]] = []
+            for c in range(self._side):
+                row.append(self.piece_at((r, c)))
+            grid.append(row)
+        return grid
+
+    @property
+    def turn(self) -> int:
+        return self._turn
+
+    @property
+    def zobrist(self) -> int:
+        return self._hash ^ self._keys.turn[self._turn]
+
+    def cells(self) -> bytes:
+        cells = bytearray(self._side * self._side)
+        for player in (1, 2):
+            bits = self._bits[player]
+            while bits:
+                low = bits & -bits
+                cells[low.bit_length() - 1] = player
+                bits ^= low
+        return bytes(cells)
+
+    def available_moves_for_player(self, player: int) -> ListMovesType:
+        """
+        Returns the list of positions where a given player
+        could place a piece.
+
+        If there is no available moves, this function
+        will return empty list.
+        """
+        return self._positions(self._move_bits(player))
+
+    def available_moves_with_flips(self, player: int) -> MovesWithFlipsType:
+        """
+        Returns the list of positions where a given player could place a
+        piece, each paired with the positions of the pieces that move
+        would flip.
+
+        If there is no available moves, this function
+        will return empty list.
+        """
+        moves: MovesWithFlipsType = []
+        bits = self._move_bits(player)
+        while bits:
+            move = bits & -bits
+            pos = divmod(move.bit_length() - 1, self._side)
+            moves.append((pos, self._positions(self._flip_bits(move, player))))
+            bits ^= move
+        return moves
+
+    @property
+    def available_moves(self) -> ListMovesType:
+        return self.available_moves_for_player(self._turn)
+
+    @property
+    def done(self) -> bool:
+        return self._move_bits(1) == 0 and self._move_bits(2) == 0
+
+    @property
+    def outcome(self) -> List[int]:
+        if not self.done:
+            return []
+        c1 = self.piece_counts(1)
+        c2 = self.piece_counts(2)
+        if c1 > c2:
+            return [1]
+        elif c2 > c1:
+            return [2]
+        return [1, 2]
+
+    def piece_at(self, pos: Tuple[int, int]) -> Optional[int]:
+        self._check_bounds(pos)
+        bit = self._bit(pos)
+        if self._bits[1] & bit:
+            return 1
+        elif self._bits[2] & bit:
+            return 2
+        return None
+
+    def legal_move(self, pos: Tuple[int, int]) -> bool:
+        self._check_bounds(pos)
+        return bool(self._move_bits(self._turn) & self._bit(pos))
+
+    def apply_move(self, pos: Tuple[int, int]) -> MoveRecord:
+        if not self.legal_move(pos):
+            raise ValueError("not a legal move")
+
+        player = self._turn
+        cache = self._moves_cache
+        move = self._bit(pos)
+        flips = self._flip_bits(move, player)
+        self._bits[player] |= move | flips
+        self._bits[3 - player] &= ~flips
+        self._moves_cache = [None, None, None]
+
+        if self._move_bits(3 - player):
+            self._turn = 3 - player
+
+        flipped = self._positions(flips)
+        self._hash ^= self._square_keys(pos, flipped, player)
+        n = len(flipped)
+        deltas = {player: n + 1, 3 - player: -n} if n else {player: 1}
+        return MoveRecord(pos, flipped, [3 - player] * n, player, deltas,
+                          cache)
+
+    def _square_keys(self, pos: Tuple[int, int], flipped: ListMovesType,
+                     player: int) -> int:
+        """
+        Returns the change in the Zobrist hash when the given player
+        places a piece on pos and flips the pieces on flipped
+        """
+        keys = self._keys.cells
+        side = self._side
+        r, c = pos
+        h = keys[r * side + c][player]
+        for r, c in flipped:
+            key = keys[r * side + c]
+            h ^= key[1] ^ key[2]
+        return h
+
+    def undo_move(self, record: MoveRecord) -> None:
+        player = record.prev_turn
+        self._hash ^= self._square_keys(record.pos, record.flipped, player)
+        flips = 0
+        for loc in record.flipped:
+            flips |= self._bit(loc)
+        self._bits[player] &= ~(flips | self._bit(record.pos))
+        self._bits[3 - player] |= flips
+        self._turn = player
+        if record.cache is not None:
+            self._moves_cache = record.cache
+        else:
+            self._moves_cache = [None, None, None]
+
+    def load_game(self, turn: int, grid: BoardGridType) -> None:
+        if not 1 <= turn <= self._players:
+            raise ValueError("value of turn is inconsistent with the _players \
+                attribute.")
+
+        if len(grid) != self._side:
+            raise ValueError("size of the grid is inconsistent with the _size \
+                attribute.")
+
+        cells = bytearray()
+        for row in grid:
+            if len(row) != self._side:
+                raise ValueError("size of the grid is inconsistent with the \
+                    _size attribute.")
+            for piece in row:
+                if piece is None:
+                    cells.append(0)
+                    continue
+                if not isinstance(piece, int) or not 1 <= piece <= \
+                    self._players:
+                    raise ValueError("value in the grid is inconsistent \
+                        with the _players attribute.")
+                cells.append(piece)
+
+        self._load_cells(turn, cells)
+
+    def _load_cells(self, turn: int, cells) -> None:
+        bits = [0, 0, 0]
+        for i, piece in enumerate(cells):
+            if piece:
+                bits[piece] |= 1 << i
+
+        self._bits = bits
+        self._turn = turn
+        self._moves_cache = [None, None, None]
+        self._rehash()
+
+    def simulate_moves(self,
+                       moves: ListMovesType
+                       ) -> "BitboardReversi":
+        new_game = BitboardReversi(side=self._side, players=self._players,
+                                   othello=self._othello)
+        new_game._bits = list(self._bits)
+        new_game._turn = self._turn
+        new_game._moves_cache = list(self._moves_cache)
+        new_game._hash = self._hash
+
+        for pos in moves:
+            new_game.apply_move(pos)
+
+        return new_game
+
+    def piece_counts(self, player: int) -> int:
+        """
+        Takes a player and returns how many pieces this player has
+        on the board
+
+        Args:
+            player: the specific player we are studying
+
+        Returns:
+            int: the number of pieces the given player has on the board.
+        """
+        return bin(self._bits[player]).count("1")
+
+
+_OCCUPIED = re.compile(b"[^\\x00]")
+"""Matches the occupied squares of cells (see ReversiBase.cells)"""
+
+
+@lru_cache(maxsize=1 << 16)
+def sparse_rays(side: int, i: int) -> Tuple[Tuple[int, int], ...]:
+    """
+    Returns, for each direction (in the order of DIRECTIONS), the step
+    between square indices and the number of squares from the square
+    with index i to the edge of the board. Unlike ray_table, this is
+    computed for one square at a time, for the squares in use.
+    """
+    r, c = divmod(i, side)
+    last = side - 1
+    rays = []
+    for dr, dc in DIRECTIONS:
+        rows = last - r if dr > 0 else r if dr < 0 else side
+        cols = last - c if dc > 0 else c if dc < 0 else side
+        rays.append((dr * side + dc, min(rows, cols)))
+    return tuple(rays)
+
+
+class SparseCells:
+    """
+    Read-only view of the pieces of a SparseReversi game as a sequence
+    of cells, with 0 for an empty square (as used by GridView)
+    """
+    __slots__ = ("_pieces",)
+
+    def __init__(self, pieces: Dict[int, int]) -> None:
+        self._pieces = pieces
+
+    def __getitem__(self, i: int) -> int:
+        return self._pieces.get(i, 0)
+
+
+class SparseReversi(ReversiBase):
+    """
+    Reversi for very large boards, storing only the occupied squares (a
+    dict from square index r * side + c to player) and the frontier (the
+    empty squares next to a piece). Every move only looks at the
+    frontier and at the pieces along the lines from the square played, so
+    its cost depends on the number of pieces rather than on the size of
+    the board. cells, to_bytes and load_game still read or write every
+    square of the board.
+    """
+
+    _turn: int
+    _pieces: Dict[int, int]
+    _counts: Dict[int, int]
+    _frontier: Set[int]
+    center: List[Tuple[int, int]]
+    _center_set: Set[int]
+    _center_empty: int
+    _steps: List[Tuple[int, int, int]]
+    _seed: int
+    _hash: int
+    _turn_keys: Tuple[int, ...]
+    _moves_cache: Dict[int, ListMovesType]
+    _done: Optional[bool]
+    _winners: Optional[List[int]]
+
+    def __init__(self, side: int, players: int, othello: bool):
+        """
+        Constructor
+        Args:
+            side: Number of squares on each side of the board
+            players: Number of players
+            othello: Whether to initialize the board with an Othello
+            configuration.
+
+        Raises:
+            ValueError: If the parity of side and players is incorrect or if
+            the othello configuration is true for >2 players
+        """
+        super().__init__(side, players, othello)
+
+        if players % 2 == 0 and side % 2 != 0:
+            raise ValueError("Parity is incorrect (even)")
+
+        if players % 2 != 0 and side % 2 == 0:
+            raise ValueError("Parity is incorrect (odd)")
+
+        if othello and players != 2:
+            raise ValueError("Othello configuration is only valid for 2 \
+                players")
+
+        self._steps = [(dr, dc, dr * side + dc) for dr, dc in DIRECTIONS]
+        self._seed = zobrist_seed(side, players)
+        after = side * side * 256
+        self._turn_keys = (0,) + tuple(zobrist_key(self._seed, after + p)
+                                       for p in range(1, players + 1))
+
+        self.center = center_squares(side, players)
+        self._center_set = {r * side + c for r, c in self.center}
+
+        self._pieces = {}
+        self._counts = {}
+        self._hash = zobrist_key(self._seed, after)
+        if othello:
+            n = side // 2
+            self._place((n - 1) * side + n, 1)
+            self._place(n * side + n - 1, 1)
+            self._place((n - 1) * side + n - 1, 2)
+            self._place(n * side + n, 2)
+        self._rebuild_frontier()
+        self._clear_cache()
+        self._turn = 1
+
+    @property
+    def grid_view(self) -> GridView:
+        return GridView(SparseCells(self._pieces), self._side)
+
+    @property
+    def turn(self) -> int:
+        return self._turn
+
+    @property
+    def zobrist(self) -> int:
+        return self._hash ^ self._turn_keys[self._turn]
+
+    @property
+    def center_filled(self) -> bool:
+        """
+        Returns True once every square in the center has a piece, after
+        which moves must flip pieces
+        """
+        return self._center_empty == 0
+
+    def cells(self) -> bytes:
+        cells = bytearray(self._side * self._side)
+        for i, player in self._pieces.items():
+            cells[i] = player
+        return bytes(cells)
+
+    def _place(self, i: int, player: int) -> None:
+        """
+        Puts a piece of the given player on the square with index i,
+        replacing the piece there if any, and updates the counts and hash
+        """
+        pieces = self._pieces
+        existing = pieces.get(i)
+        if existing:
+            self._counts[existing] -= 1
+            self._hash ^= zobrist_key(self._seed, i * 256 + existing)
+        pieces[i] = player
+        self._counts[player] = self._counts.get(player, 0) + 1
+        self._hash ^= zobrist_key(self._seed, i * 256 + player)
+
+    def _neighbors(self, i: int) -> List[int]:
+        """
+        Returns the indices of the squares next to the square with index i
+        """
+        side = self._side
+        r, c = divmod(i, side)
+        return [i + step for dr, dc, step in self._steps
+                if 0 <= r + dr < side and 0 <= c + dc < side]
+
+    def _clear_cache(self) -> None:
+        """
+        Forgets the move lists, done flag and winners computed for the
+        current position. Must be called whenever the board changes.
+        """
+        self._moves_cache = {}
+        self._done = None
+        self._winners = None
+
+    def _moves_for(self, player: int) -> ListMovesType:
+        """
+        Returns the (cached) list of moves of the given player. The list
+        is shared with the cache and must not be modified.
+        """
+        moves = self._moves_cache.get(player)
+        if moves is None:
+            moves = self._generate_moves(player)
+            self._moves_cache[player] = moves
+        return moves
+
+    def _rebuild_frontier(self) -> None:
+        """
+        Recomputes the frontier and the number of empty center squares
+        from the pieces
+        """
+        pieces = self._pieces
+        self._frontier = {j for i in pieces for j in self._neighbors(i)
+                          if j not in pieces}
+        self._center_empty = sum(1 for i in self._center_set
+                                 if i not in pieces)
+
+    def _fill_square(self, i: int) -> None:
+        """
+        Updates the frontier and center after a piece is placed on the
+        square with index i
+        """
+        pieces = self._pieces
+        frontier = self._frontier
+        frontier.discard(i)
+        for j in self._neighbors(i):
+            if j not in pieces:
+                frontier.add(j)
+        if i in self._center_set:
+            self._center_empty -= 1
+
+    def _empty_square(self, i: int) -> None:
+        """
+        Updates the frontier and center after the piece on the square
+        with index i is removed
+        """
+        pieces = self._pieces
+        for j in self._neighbors(i):
+            if j in pieces:
+                self._frontier.add(i)
+            elif not any(k in pieces for k in self._neighbors(j)):
+                self._frontier.discard(j)
+        if i in self._center_set:
+            self._center_empty += 1
+
+    def _flanks(self, i: int, player: int) -> bool:
+        """
+        Checks whether a piece of the given player on the (empty) square
+        with index i would flank at least one line of opposing pieces
+        """
+        get = self._pieces.get
+        for step, length in sparse_rays(self._side, i):
+            if length < 2:
+                continue
+            j = i + step
+            p = get(j)
+            if not p or p == player:
+                continue
+            for _ in range(length - 1):
+                j += step
+                p = get(j)
+                if not p:
+                    break
+                if p == player:
+                    return True
+        return False
+
+    def _flip_indices(self, i: int, player: int) -> List[int]:
+        """
+        Returns the indices of the pieces that a piece of the given player
+        on the (empty) square with index i would flip
+        """
+        get = self._pieces.get
+        flips: List[int] = []
+        for step, length in sparse_rays(self._side, i):
+            j = i
+            for k in range(length):
+                j += step
+                p = get(j)
+                if not p:
+                    break
+                if p == player:
+                    flips.extend(range(i + step, j, step))
+                    break
+        return flips
+
+    def available_moves_for_player(self, player: int) -> ListMovesType:
+        """
+        Returns the list of positions where a given player
+        could place a piece.
+
+        If there is no available moves, this function
+        will return empty list.
+        """
+        return list(self._moves_for(player))
+
+    def _generate_moves(self, player: int) -> ListMovesType:
+        """
+        Computes the list of moves of the given player in row-major
+        order, looking only at the center or the frontier.
+        """
+        if not self.center_filled:
+            return [pos for pos in self.center
+                    if pos[0] * self._side + pos[1] not in self._pieces]
+        side = self._side
+        return [divmod(i, side) for i in sorted(self._frontier)
+                if self._flanks(i, player)]
+
+    def available_moves_with_flips(self, player: int) -> MovesWithFlipsType:
+        """
+        Returns the list of positions where a given player could place a
+        piece, each paired with the positions of the pieces that move
+        would flip.
+
+        If there is no available moves, this function
+        will return empty list.
+        """
+        if not self.center_filled:
+            return [(pos, []) for pos in self._moves_for(player)]
+
+        side = self._side
+        moves: MovesWithFlipsType = []
+        for i in sorted(self._frontier):
+            flips = self._flip_indices(i, player)
+            if flips:
+                moves.append((divmod(i, side),
+                              [divmod(f, side) for f in flips]))
+
+        if player not in self._moves_cache:
+            self._moves_cache[player] = [pos for pos, _ in moves]
+        return moves
+
+    @property
+    def available_moves(self) -> ListMovesType:
+        return self.available_moves_for_player(self._turn)
+
+    @property
+    def done(self) -> bool:
+        if self._done is None:
+            self._done = all(self._moves_for(p) == []
+                             for p in range(1, self._players + 1))
+        return self._done
+
+    @property
+    def outcome(self) -> List[int]:
+        if self._winners is None:
+            winners = []
+            if self.done:
+                most = max(self._counts.values(), default=0)
+                winners = [p for p in range(1, self._players + 1)
+                           if self._counts.get(p, 0) == most]
+            self._winners = winners
+        return list(self._winners)
+
+    def piece_at(self, pos: Tuple[int, int]) -> Optional[int]:
+        r, c = pos
+        if not (0 <= r < self._side and 0 <= c < self._side):
+            raise ValueError("Position is out of bounds.")
+        return self._pieces.get(r * self._side + c)
+
+    def legal_move(self, pos: Tuple[int, int]) -> bool:
+        r, c = pos
+        if not (0 <= r < self._side and 0 <= c < self._side):
+            raise ValueError("Position is out of bounds.")
+        return (r, c) in self._moves_for(self._turn)
+
+    def apply_move(self, pos: Tuple[int, int]) -> MoveRecord:
+        if not self.legal_move(pos):
+            raise ValueError("not a legal move")
+
+        player = self._turn
+        cache = (self._moves_cache, self._done, self._winners)
+        side = self._side
+        i = pos[0] * side + pos[1]
+        flipped: ListMovesType = []
+        owners: List[int] = []
+        deltas: Dict[int, int] = {player: 1}
+
+        if i not in self._center_set:
+            pieces = self._pieces
+            for f in self._flip_indices(i, player):
+                owner = pieces[f]
+                owners.append(owner)
+                deltas[owner] = deltas.get(owner, 0) - 1
+                self._place(f, player)
+                flipped.append(divmod(f, side))
+        self._place(i, player)
+        self._fill_square(i)
+        deltas[player] += len(flipped)
+        self._clear_cache()
+
+        # The next player with a move gets the turn; if nobody (not even
+        # the player who just moved) has one, the game is over
+        self._done = True
+        for _ in range(self._players):
+            self._turn = self._turn % self._players + 1
+            if self._moves_for(self._turn) != []:
+                self._done = False
+                break
+
+        return MoveRecord(pos, flipped, owners, player, deltas, cache)
+
+    def undo_move(self, record: MoveRecord) -> None:
+        side = self._side
+        for (r, c), owner in zip(record.flipped, record.owners):
+            self._place(r * side + c, owner)
+        r, c = record.pos
+        i = r * side + c
+        player = self._pieces.pop(i)
+        self._counts[player] -= 1
+        self._hash ^= zobrist_key(self._seed, i * 256 + player)
+        self._empty_square(i)
+        self._turn = record.prev_turn
+        if record.cache is not None:
+            self._moves_cache, self._done, self._winners = record.cache
+        else:
+            self._clear_cache()
+
+    def load_game(self, turn: int, grid: BoardGridType) -> None:
+        if not 1 <= turn <= self._players:
+            raise ValueError("value of turn is inconsistent with the _players \
+                attribute.")
+
+        if len(grid) != self._side:
+            raise ValueError("size of the grid is inconsistent with the _size \
+                attribute.")
+
+        cells = bytearray()
+        for row in grid:
+            if len(row) != self._side:
+                raise ValueError("size of the grid is inconsistent with the \
+                    _size attribute.")
+            for piece in row:
+                if piece is None:
+                    cells.append(0)
+                    continue
+                if not isinstance(piece, int) or not 1 <= piece <= \
+                    self._players:
+                    raise ValueError("value in the grid is inconsistent \
+                        with the _players attribute.")
+                cells.append(piece)
+
+        self._load_cells(turn, cells)
+
+    def _load_cells(self, turn: int, cells) -> None:
+        self._pieces = {}
+        self._counts = {}
+        self._hash = zobrist_key(self._seed, self._side * self._side * 256)
+        # Only the occupied squares are visited, found by the regular
+        # expression engine rather than a loop over every square
+        for match in _OCCUPIED.finditer(cells):
+            i = match.start()
+            self._place(i, cells[i])
+        self._rebuild_frontier()
+        self._clear_cache()
+        self._turn = turn
+
+    def simulate_moves(self,
+                       moves: ListMovesType
+                       ) -> "SparseReversi":
+        records: List[MoveRecord] = []
+        try:
+            for pos in moves:
+                records.append(self.apply_move(pos))
+            new_game = self._copy()
+        finally:
+            for record in reversed(records):
+                self.undo_move(record)
+
+        return new_game
+
+    def _copy(self) -> "SparseReversi":
+        """
+        Returns a copy of the game that shares no mutable state with it
+        """
+        new_game = SparseReversi.__new__(SparseReversi)
+        new_game.__dict__.update(self.__dict__)
+        new_game._pieces = dict(self._pieces)
+        new_game._counts = dict(self._counts)
+        new_game._frontier = set(self._frontier)
+        new_game._moves_cache = dict(self._moves_cache)
+        return new_game
+
+    def piece_counts(self, player: int) -> int:
+        """
+        Takes a player and returns how many pieces this player has
+        on the board
+
+        Args:
+            player: the specific player we are studying
+
+        Returns:
+            int: the number of pieces the given player has on the board.
+        """
+        return self._counts.get(player, 0)
+
+
+SPARSE_SIDE = 64
+"""
+Side from which new_reversi uses SparseReversi. From there on the ray
+table of Reversi (which grows with the cube of the side) takes longer to
+build than the games played with it, and its memory use keeps growing.
+"""
+
+
+def new_reversi(side: int, players: int, othello: bool) -> ReversiBase:
+    """
+    Returns a new game using the fastest backend that supports the
+    given configuration: bitboards for two players on boards of up to
+    8x8, the sparse board from SPARSE_SIDE squares per side, and the
+    general Reversi class otherwise.
+
+    Raises:
+        ValueError: If the configuration is invalid (see Reversi)
+    """
+    if players == 2 and side <= 8:
+        return BitboardReversi(side, players, othello)
+    if side >= SPARSE_SIDE:
+        return SparseReversi(side, players, othello)
+    return Reversi(side, players, othello)
@@ -0,0 +1,160 @@
+"""
+Statistics for comparing two bots.
+
+Results are scores of the first bot: 1 for a win, 1/2 for a tie and 0
+for a loss. The Elo difference of a mean score s is -400 log10(1/s - 1),
+and its error bars come from the normal approximation of the mean score.
+
+The sequential probability ratio test (SPRT) decides between H0: the
+first bot is elo0 points stronger, and H1: it is elo1 points stronger,
+after every game. It uses the normal approximation of the log-likelihood
+ratio of the two hypotheses (as for chess engine testing), which takes
+ties into account through the variance of the score. The test stops as
+soon as the ratio leaves the bounds set by the error rates alpha (of
+accepting H1 when H0 holds) and beta (of accepting H0 when H1 holds), so
+lopsided matches stop after a few games. The ratio counts one more win
+and one more loss than were played, so that it has a variance to work
+with when every game so far ended alike.
+"""
+import math
+from typing import Optional, Tuple
+
+
+def elo_difference(score: float) -> float:
+    """
+    Returns the Elo difference for a mean score (infinite for a score of
+    0 or 1)
+    """
+    if score <= 0:
+        return -math.inf
+    if score >= 1:
+        return math.inf
+    return -400 * math.log10(1 / score - 1)
+
+
+def score_variance(wins: int, ties: int, losses: int) -> Tuple[float, float]:
+    """
+    Returns the mean score of a match and the variance of the score of
+    one game
+    """
+    games = wins + ties + losses
+    if not games:
+        return 0.5, 0.0
+    s = (wins + ties / 2) / games
+    return s, (wins * (1 - s) ** 2 + ties * (0.5 - s) ** 2 +
+               losses * s ** 2) / games
+
+
+def expected_score(elo: float) -> float:
+    """
+    Returns the mean score of a player elo points stronger than its
+    opponent
+    """
+    return 1 / (1 + 10 ** (-elo / 400))
+
+
+class MatchStats:
+    """
+    Win, tie and loss counts of a match, updated after every game
+    """
+
+    wins: int
+    ties: int
+    losses: int
+
+    def __init__(self):
+        self.wins = 0
+        self.ties = 0
+        self.losses = 0
+
+    def add(self, score: float) -> None:
+        """
+        Adds the score of a game (1, 1/2 or 0)
+        """
+        if score > 0.5:
+            self.wins += 1
+        elif score < 0.5:
+            self.losses += 1
+        else:
+            self.ties += 1
+
+    @property
+    def games(self) -> int:
+        return self.wins + self.ties + self.losses
+
+    @property
+    def score(self) -> float:
+        """Mean score (1/2 before any game)"""
+        return score_variance(self.wins, self.ties, self.losses)[0]
+
+    @property
+    def variance(self) -> float:
+        """Variance of the score of one game"""
+        return score_variance(self.wins, self.ties, self.losses)[1]
+
+    def elo(self, z: float = 1.96) -> Tuple[float, float]:
+        """
+        Returns the Elo difference and the half-width of its confidence
+        interval (95% for the default z)
+        """
+        elo = elo_difference(self.score)
+        if self.games < 2 or not math.isfinite(elo):
+            return elo, math.inf
+        margin = z * math.sqrt(self.variance / self.games)
+        low = elo_difference(self.score - margin)
+        high = elo_difference(self.score + margin)
+        return elo, (high - low) / 2
+
+
+class SPRT(MatchStats):
+    """
+    Sequential probability ratio test between H0: the first bot is elo0
+    points stronger and H1: it is elo1 points stronger
+    """
+
+    elo0: float
+    elo1: float
+    lower: float
+    upper: float
+
+    def __init__(self, elo0: float = 0.0, elo1: float = 50.0,
+                 alpha: float = 0.05, beta: float = 0.05):
+        """
+        Constructor
+
+        Args:
+            elo0: Elo difference under H0
+            elo1: Elo difference under H1 (greater than elo0)
+            alpha: probability of accepting H1 when H0 holds
+            beta: probability of accepting H0 when H1 holds
+        """
+        if elo1 <= elo0:
+            raise ValueError("elo1 must be greater than elo0")
+        super().__init__()
+        self.elo0 = elo0
+        self.elo1 = elo1
+        self.lower = math.log(beta / (1 - alpha))
+        self.upper = math.log((1 - beta) / alpha)
+
+    @property
+    def llr(self) -> float:
+        """Log-likelihood ratio of H1 against H0"""
+        score, variance = score_variance(self.wins + 1, self.ties,
+                                         self.losses + 1)
+        s0 = expected_score(self.elo0)
+        s1 = expected_score(self.elo1)
+        return self.games * (s1 - s0) * (2 * score - s0 - s1) / \
+            (2 * variance)
+
+    @property
+    def decision(self) -> Optional[bool]:
+        """
+        True once H1 is accepted, False once H0 is accepted, None while
+        the test goes on
+        """
+        llr = self.llr
+        if llr >= self.upper:
+            return True
+        if llr <= self.lower:
+            return False
+        return None
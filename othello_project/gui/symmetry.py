@@ -0,0 +1,210 @@
+"""
+Symmetries of the Reversi board.
+
+The rules of Reversi do not change when the board is rotated or
+reflected, for any size and number of players, so the 8 symmetries of
+the square map every position to equivalent positions. The canonical
+form of a position is the transformed position whose cells (in
+row-major order, see ReversiBase.cells) are smallest; caches and books
+keyed on it store every orientation of a position once. The canonical
+form leaves out how the game started (the Othello flag of the header is
+always 0): the start only decides the first position, so a position
+reached from either start is the same position.
+
+Transform t reflects the board left to right if t >= 4, and then turns
+it clockwise by t % 4 quarter turns.
+"""
+from functools import lru_cache
+from hashlib import blake2b
+from operator import itemgetter
+from typing import Tuple, Callable
+from reversi import ReversiBase, BitboardReversi, POSITION_HEADER, \
+    cell_bits, pack_cells
+
+TRANSFORMS = 8
+"""Number of symmetries of the board"""
+
+INVERSE = (0, 3, 2, 1, 4, 5, 6, 7)
+"""INVERSE[t] is the transform that undoes transform t"""
+
+
+def transform_square(r: int, c: int, t: int, side: int) -> Tuple[int, int]:
+    """
+    Returns the square to which transform t moves square (r, c)
+    """
+    if t >= 4:
+        c = side - 1 - c
+    for _ in range(t % 4):
+        r, c = c, side - 1 - r
+    return r, c
+
+
+@lru_cache(maxsize=None)
+def _getters(side: int) -> Tuple[Callable[[bytes], Tuple[int, ...]], ...]:
+    """
+    Returns, for every transform, a function that takes the cells of a
+    position and returns the cells of the transformed position
+    """
+    getters = []
+    for t in range(TRANSFORMS):
+        source = [0] * (side * side)
+        for r in range(side):
+            for c in range(side):
+                tr, tc = transform_square(r, c, t, side)
+                source[tr * side + tc] = r * side + c
+        getters.append(itemgetter(*source))
+    return tuple(getters)
+
+
+def transform_cells(cells: bytes, t: int, side: int) -> bytes:
+    """
+    Returns the cells of a position transformed by transform t
+    """
+    return bytes(_getters(side)[t](cells))
+
+
+def stabilizer(cells: bytes, side: int) -> Tuple[int, ...]:
+    """
+    Returns the transforms that leave the given cells unchanged (always
+    including transform 0)
+    """
+    getters = _getters(side)
+    original = tuple(cells)
+    return tuple(t for t in range(TRANSFORMS) if getters[t](cells) == original)
+
+
+def to_canonical(move: Tuple[int, int], t: int, side: int) -> Tuple[int, int]:
+    """
+    Maps a move on a position to the same move on its canonical form,
+    where t is the transform returned by canonical
+    """
+    return transform_square(move[0], move[1], t, side)
+
+
+def from_canonical(move: Tuple[int, int], t: int, side: int) \
+    -> Tuple[int, int]:
+    """
+    Maps a move on the canonical form of a position back to the same move
+    on the position, where t is the transform returned by canonical
+    """
+    return transform_square(move[0], move[1], INVERSE[t], side)
+
+
+def canonical(game: ReversiBase) -> Tuple[bytes, int]:
+    """
+    Returns the canonical form of a game, encoded as by to_bytes (with
+    the Othello flag cleared), and the transform that maps the game to it
+    (the smallest such transform if the position is symmetric)
+    """
+    side = game.size
+    if isinstance(game, BitboardReversi) and side == 8:
+        packed, t = _canonical_bits(game._bits[1], game._bits[2])
+    else:
+        cells = game.cells()
+        # Tuples compare like the bytes they hold, so only the smallest
+        # one is turned back into bytes
+        getters = _getters(side)
+        best, t = getters[0](cells), 0
+        for i in range(1, TRANSFORMS):
+            candidate = getters[i](cells)
+            if candidate < best:
+                best, t = candidate, i
+        packed = pack_cells(bytes(best), cell_bits(game.num_players))
+    header = POSITION_HEADER.pack(side, game.num_players, game.turn, 0,
+                                  cell_bits(game.num_players))
+    return header + packed, t
+
+
+def canonical_key(game: ReversiBase) -> int:
+    """
+    Returns a 64-bit hash of the canonical form of a game, equal for
+    every orientation of the position
+    """
+    return encoding_key(canonical(game)[0])
+
+
+def encoding_key(data: bytes) -> int:
+    """
+    Returns the 64-bit hash of an encoded position (see canonical_key)
+    """
+    return int.from_bytes(blake2b(data, digest_size=8).digest(), "little")
+
+
+# 8x8 bitboards (square r * 8 + c is bit r * 8 + c) are transformed with
+# delta swaps instead of going through the cells. Both players' boards
+# are transformed at once, as the low and high 64 bits of one integer.
+
+_LOW = (1 << 64) - 1
+
+
+def _lanes(mask: int) -> int:
+    return mask | mask << 64
+
+
+def _flip_vertical(x: int) -> int:
+    b = x.to_bytes(16, "little")
+    return int.from_bytes(b[7::-1] + b[15:7:-1], "little")
+
+
+def _mirror(x: int, k1: int = _lanes(0x5555555555555555),
+            k2: int = _lanes(0x3333333333333333),
+            k4: int = _lanes(0x0F0F0F0F0F0F0F0F)) -> int:
+    x = ((x >> 1) & k1) | ((x & k1) << 1)
+    x = ((x >> 2) & k2) | ((x & k2) << 2)
+    return ((x >> 4) & k4) | ((x & k4) << 4)
+
+
+def _transpose(x: int, k4: int = _lanes(0x0F0F0F0F00000000),
+               k2: int = _lanes(0x3333000033330000),
+               k1: int = _lanes(0x5500550055005500)) -> int:
+    t = k4 & (x ^ (x << 28))
+    x ^= t ^ (t >> 28)
+    t = k2 & (x ^ (x << 14))
+    x ^= t ^ (t >> 14)
+    t = k1 & (x ^ (x << 7))
+    return x ^ t ^ (t >> 7)
+
+
+def _bit_transforms(x: int) -> Tuple[int, ...]:
+    """
+    Returns a pair of 8x8 bitboards under every transform, in order
+    """
+    m = _mirror(x)
+    v = _flip_vertical(x)
+    d = _transpose(x)
+    return (x, _mirror(d), _mirror(v), _flip_vertical(d),
+            m, _mirror(_transpose(m)), v, d)
+
+
+def _spread(x: int) -> int:
+    """
+    Moves bit i of a 64-bit integer to bit 2 * i
+    """
+    x = (x | x << 32) & 0x00000000FFFFFFFF00000000FFFFFFFF
+    x = (x | x << 16) & 0x0000FFFF0000FFFF0000FFFF0000FFFF
+    x = (x | x << 8) & 0x00FF00FF00FF00FF00FF00FF00FF00FF
+    x = (x | x << 4) & 0x0F0F0F0F0F0F0F0F0F0F0F0F0F0F0F0F
+    x = (x | x << 2) & 0x33333333333333333333333333333333
+    return (x | x << 1) & 0x55555555555555555555555555555555
+
+
+def _canonical_bits(one: int, two: int) -> Tuple[bytes, int]:
+    """
+    Returns the packed cells of the canonical form of an 8x8 position
+    with the given bitboards, and its transform
+    """
+    best, t = one | two << 64, 0
+    for i, candidate in enumerate(_bit_transforms(best)[1:], 1):
+        diff = candidate ^ best
+        if not diff:
+            continue
+        # The cells first differ at the lowest differing square; the
+        # candidate is smaller if its cell there is (empty < 1 < 2)
+        squares = (diff | diff >> 64) & _LOW
+        low = squares & -squares
+        cell = 1 if candidate & low else 2 if candidate >> 64 & low else 0
+        old = 1 if best & low else 2 if best >> 64 & low else 0
+        if cell < old:
+            best, t = candidate, i
+    packed = _spread(best & _LOW) | _spread(best >> 64) << 1
+    return packed.to_bytes(16, "little"), t
@@ -0,0 +1,219 @@
+"""
+Perfect-play tables for small boards.
+
+The generator solves every position reachable from the start position
+with a full minimax search (no pruning, so every value is exact), and
+writes the value and best move of each one to a table file. Positions
+are stored once per symmetry class, under the key of their canonical
+form (see symmetry.canonical), with the move in the canonical
+orientation.
+
+The table file is a header (TABLE_HEADER) followed by an open-addressing
+hash table of TABLE_SLOT slots (linear probing, a key of 0 marks an
+empty slot). PerfectPlayTable reads it through mmap, so looking up a
+position reads a few slots of the file and nothing else.
+
+The full game tree is only small enough for 4x4 boards: the 6x6 tree has
+too many positions to solve this way in Python.
+"""
+import mmap
+import struct
+import time
+from typing import Dict, Tuple, Optional
+import click
+from reversi import ReversiBase, new_reversi
+from symmetry import canonical, encoding_key, to_canonical, from_canonical
+
+TABLE_HEADER = struct.Struct("<4sBBBxII")
+"""
+Header of a table file: TABLE_MAGIC, side, number of players, Othello
+flag, number of slots (a power of two) and number of positions
+"""
+
+TABLE_MAGIC = b"RPT2"
+
+TABLE_SLOT = struct.Struct("<QbB")
+"""
+Slot of a table file: key of the canonical position (0 if the slot is
+empty), final disc differential for the player to move under perfect
+play, and square index of the best move (NO_MOVE if the game is over)
+"""
+
+NO_MOVE = 255
+
+
+def _slot_key(data: bytes) -> int:
+    """
+    Returns the key of an encoded canonical position, which is never 0
+    """
+    return encoding_key(data) or 1
+
+
+def solve_all(side: int, othello: bool = True) \
+    -> Dict[bytes, Tuple[int, int]]:
+    """
+    Solves every position reachable from the start position of a
+    two-player game
+
+    Returns: The value and best move (a square index in the canonical
+    orientation, or NO_MOVE) of every position, by canonical encoding
+    """
+    solved: Dict[bytes, Tuple[int, int]] = {}
+
+    def search(game: ReversiBase) -> int:
+        data, t = canonical(game)
+        entry = solved.get(data)
+        if entry is not None:
+            return entry[0]
+
+        player = game.turn
+        if game.done:
+            value = game.piece_counts(player) - game.piece_counts(3 - player)
+            solved[data] = (value, NO_MOVE)
+            return value
+
+        best, best_move = None, None
+        for move in game.available_moves:
+            record = game.apply_move(move)
+            value = search(game)
+            if game.turn != player:
+                value = -value
+            game.undo_move(record)
+            if best is None or value > best:
+                best, best_move = value, move
+
+        r, c = to_canonical(best_move, t, side)
+        solved[data] = (best, r * side + c)
+        return best
+
+    search(new_reversi(side, 2, othello))
+    return solved
+
+
+def write_table(path: str, side: int, othello: bool,
+                solved: Dict[bytes, Tuple[int, int]]) -> int:
+    """
+    Writes solved positions (as returned by solve_all) to a table file
+
+    Returns: The number of slots of the table
+    """
+    slots = 1 << (2 * len(solved) - 1).bit_length()
+    mask = slots - 1
+    table = bytearray(slots * TABLE_SLOT.size)
+    used = [False] * slots
+    for data, (value, square) in solved.items():
+        key = _slot_key(data)
+        i = key & mask
+        while used[i]:
+            i = (i + 1) & mask
+        used[i] = True
+        TABLE_SLOT.pack_into(table, i * TABLE_SLOT.size, key, value, square)
+
+    with open(path, "wb") as f:
+        f.write(TABLE_HEADER.pack(TABLE_MAGIC, side, 2, othello, slots,
+                                  len(solved)))
+        f.write(table)
+    return slots
+
+
+class PerfectPlayTable:
+    """
+    Read-only perfect-play table backed by a memory-mapped table file
+    """
+
+    side: int
+    othello: bool
+    _map: Optional[mmap.mmap]
+    _mask: int
+    _count: int
+
+    def __init__(self, path: str):
+        """
+        Constructor
+
+        Raises:
+            ValueError: If the file is not a table, or is truncated
+        """
+        with open(path, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self._map) < TABLE_HEADER.size:
+            raise ValueError("table file is too short")
+        magic, self.side, players, othello, slots, self._count = \
+            TABLE_HEADER.unpack_from(self._map)
+        if magic != TABLE_MAGIC or players != 2:
+            raise ValueError("not a table file")
+        if slots & (slots - 1) or len(self._map) != \
+            TABLE_HEADER.size + slots * TABLE_SLOT.size:
+            raise ValueError("size of the table file is inconsistent with \
+                its number of slots")
+        self.othello = bool(othello)
+        self._mask = slots - 1
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __enter__(self) -> "PerfectPlayTable":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def close(self) -> None:
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+
+    def lookup(self, game: ReversiBase) \
+        -> Optional[Tuple[int, Optional[Tuple[int, int]]]]:
+        """
+        Returns the final disc differential for the player to move under
+        perfect play and the best move (None if the game is over), or None
+        if the position is not in the table
+        """
+        if game.size != self.side or game.num_players != 2:
+            return None
+        data, t = canonical(game)
+        key = _slot_key(data)
+        i = key & self._mask
+        while True:
+            slot_key, value, square = TABLE_SLOT.unpack_from(
+                self._map, TABLE_HEADER.size + i * TABLE_SLOT.size)
+            if slot_key == key:
+                break
+            if slot_key == 0:
+                return None
+            i = (i + 1) & self._mask
+
+        if square == NO_MOVE:
+            return value, None
+        return value, from_canonical(divmod(square, self.side), t, self.side)
+
+    def best_move(self, game: ReversiBase) -> Optional[Tuple[int, int]]:
+        """
+        Returns the perfect-play move for a position, or None if the
+        position is not in the table (or the game is over)
+        """
+        entry = self.lookup(game)
+        return entry[1] if entry is not None else None
+
+
+@click.command(name="Reversi-Tables")
+@click.argument('output', type=click.Path(dir_okay=False))
+@click.option('-s', '--side', type=click.INT, default=4)
+@click.option('--othello/--no-othello', default=True)
+def cmd(output, side, othello):
+    """
+    Solves every reachable position of a two-player game and writes the
+    perfect-play table to OUTPUT.
+    """
+    start = time.perf_counter()
+    solved = solve_all(side, othello)
+    slots = write_table(output, side, othello, solved)
+    value = solved[canonical(new_reversi(side, 2, othello))[0]][0]
+    print(f"{len(solved)} positions ({slots} slots) in "
+          f"{time.perf_counter() - start:.1f}s; the first player's final "
+          f"disc differential under perfect play is {value:+}")
+
+
+if __name__ == "__main__":
+    cmd()
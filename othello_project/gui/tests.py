@@ -0,0 +1,1052 @@
+import json
+import random
+import time
+import pytest
+from reversi import Reversi, ReversiBase, BitboardReversi, SparseReversi, \
+    new_reversi
+from transposition import TranspositionTable, EXACT, LOWER
+import perft
+from records import GameDatabase, GameRecord
+import symmetry
+from book import BookBuilder, OpeningBook
+import endgame
+import tables
+from click.testing import CliRunner
+import bot
+from bot import BookBot, TableBot, SmartBot, RandomBot
+from bot import AlphaBetaBot, MCTSBot, MultiPlayerBot, BotFactory, \
+    rollouts, tournament, sequential_match
+import stats
+import league
+from instrument import BotProfile, LatencyHistogram, CountingBoard
+
+BACKENDS = [Reversi, BitboardReversi, SparseReversi]
+
+
+@pytest.mark.parametrize("cls", BACKENDS)
+def test_othello_start(cls):
+    """ Tests the initial Othello configuration and opening moves """
+    game = cls(8, 2, True)
+
+    assert game.size == 8
+    assert game.num_players == 2
+    assert game.turn == 1
+    assert game.piece_at((3, 3)) == 2
+    assert game.piece_at((3, 4)) == 1
+    assert game.piece_at((4, 3)) == 1
+    assert game.piece_at((4, 4)) == 2
+    assert game.available_moves == [(2, 3), (3, 2), (4, 5), (5, 4)]
+    assert not game.done
+    assert game.outcome == []
+
+
+@pytest.mark.parametrize("cls", BACKENDS)
+def test_apply_move_flips(cls):
+    """ Tests that apply_move flips pieces and changes the turn """
+    game = cls(8, 2, True)
+    game.apply_move((2, 3))
+
+    assert game.piece_at((2, 3)) == 1
+    assert game.piece_at((3, 3)) == 1
+    assert game.piece_at((4, 4)) == 2
+    assert game.turn == 2
+    assert game.piece_counts(1) == 4
+    assert game.piece_counts(2) == 1
+
+
+@pytest.mark.parametrize("cls", BACKENDS)
+def test_invalid_moves(cls):
+    """ Tests that illegal and out of bounds moves raise ValueError """
+    game = cls(8, 2, True)
+
+    assert not game.legal_move((0, 0))
+    with pytest.raises(ValueError):
+        game.apply_move((0, 0))
+    with pytest.raises(ValueError):
+        game.legal_move((8, 0))
+    with pytest.raises(ValueError):
+        game.piece_at((0, -1))
+
+
+@pytest.mark.parametrize("cls", BACKENDS)
+def test_no_flip_across_gap(cls):
+    """ Tests that a line with an empty square in it is not flipped """
+    game = cls(4, 2, True)
+    game.load_game(1, [[None, None, None, None],
+                       [None, 2, 1, None],
+                       [None, 1, 2, 2],
+                       [None, 2, None, 1]])
+    game.apply_move((1, 0))
+
+    assert game.grid == [[None, None, None, None],
+                         [1, 1, 1, None],
+                         [None, 1, 2, 2],
+                         [None, 2, None, 1]]
+
+
+@pytest.mark.parametrize("cls", BACKENDS)
+def test_pass_and_game_over(cls):
+    """ Tests turn skipping and the outcome of a finished game """
+    game = cls(4, 2, True)
+    game.load_game(1, [[1, 1, 1, 1],
+                       [1, 1, 1, 1],
+                       [1, 2, 1, 1],
+                       [2, None, 2, 1]])
+
+    assert game.available_moves == [(3, 1)]
+    game.apply_move((3, 1))
+    assert game.done
+    assert game.outcome == [1]
+
+
+@pytest.mark.parametrize("cls", BACKENDS)
+def test_non_othello_opening(cls):
+    """ Tests that pieces go in the center until it is filled """
+    game = cls(6, 2, False)
+
+    assert game.available_moves == [(2, 2), (2, 3), (3, 2), (3, 3)]
+    game.apply_move((2, 2))
+    game.apply_move((3, 3))
+    assert game.turn == 1
+    assert game.available_moves == [(2, 3), (3, 2)]
+
+
+@pytest.mark.parametrize("cls", BACKENDS)
+def test_load_game_validation(cls):
+    """ Tests that load_game rejects inconsistent states """
+    game = cls(4, 2, True)
+
+    with pytest.raises(ValueError):
+        game.load_game(3, game.grid)
+    with pytest.raises(ValueError):
+        game.load_game(1, [[None] * 4] * 3)
+    with pytest.raises(ValueError):
+        game.load_game(1, [[None, None, None, 3]] * 4)
+
+
+@pytest.mark.parametrize("cls", BACKENDS)
+def test_simulate_moves(cls):
+    """ Tests that simulate_moves leaves the original game untouched """
+    game = cls(8, 2, True)
+    grid = [list(row) for row in game.grid]
+    new_game = game.simulate_moves([(2, 3), (2, 2)])
+
+    assert game.grid == grid
+    assert game.turn == 1
+    assert new_game.piece_at((2, 2)) == 2
+    assert new_game.turn == 1
+
+
+@pytest.mark.parametrize("cls, side, players, othello",
+                         [(Reversi, 8, 2, True), (Reversi, 9, 3, False),
+                          (BitboardReversi, 6, 2, False)])
+def test_undo_move(cls, side, players, othello):
+    """ Tests that undo_move restores every position of a random game """
+    rng = random.Random(0)
+    game = cls(side, players, othello)
+    history = []
+    while not game.done:
+        state = ([list(row) for row in game.grid], game.turn)
+        record = game.apply_move(rng.choice(game.available_moves))
+        assert record.deltas[record.prev_turn] == len(record.flipped) + 1
+        history.append((state, record))
+
+    for (grid, turn), record in reversed(history):
+        game.undo_move(record)
+        assert game.grid == grid
+        assert game.turn == turn
+        for player in range(1, players + 1):
+            assert game.piece_counts(player) == \
+                sum(row.count(player) for row in grid)
+
+
+def test_frontier_tracking():
+    """ Tests the incremental frontier against a full recomputation """
+    rng = random.Random(1)
+    game = Reversi(9, 3, False)
+    records = []
+    while not game.done:
+        records.append(game.apply_move(rng.choice(game.available_moves)))
+        frontier = set(game._frontier)
+        game._rebuild_frontier()
+        assert game._frontier == frontier
+    while records:
+        game.undo_move(records.pop())
+        frontier = set(game._frontier)
+        center_empty = game._center_empty
+        game._rebuild_frontier()
+        assert game._frontier == frontier
+        assert game._center_empty == center_empty
+
+
+@pytest.mark.parametrize("cls", BACKENDS)
+def test_load_game_clears_cache(cls):
+    """ Tests that cached moves and results are dropped by load_game """
+    game = cls(4, 2, True)
+    assert game.available_moves != []
+    assert not game.done
+    assert game.outcome == []
+
+    game.load_game(2, [[1, 1, 1, 1]] * 3 + [[2, 2, 2, 2]])
+    assert game.available_moves == []
+    assert game.done
+    assert game.outcome == [1]
+
+
+@pytest.mark.parametrize("cls, side, players, othello",
+                         [(Reversi, 9, 3, False), (BitboardReversi, 8, 2, True)])
+def test_moves_with_flips(cls, side, players, othello):
+    """ Tests available_moves_with_flips against apply_move """
+    rng = random.Random(2)
+    game = cls(side, players, othello)
+    while not game.done:
+        moves = game.available_moves_with_flips(game.turn)
+        assert [pos for pos, _ in moves] == game.available_moves
+        for pos, flips in moves:
+            record = game.apply_move(pos)
+            assert sorted(record.flipped) == sorted(flips)
+            game.undo_move(record)
+        game.apply_move(rng.choice(moves)[0])
+
+
+def test_zobrist_hash():
+    """ Tests that both backends hash and compare positions alike """
+    rng = random.Random(3)
+    ref = Reversi(8, 2, True)
+    bit = BitboardReversi(8, 2, True)
+    start = ref.zobrist
+    records = []
+    while not ref.done:
+        assert ref.zobrist == bit.zobrist
+        assert ref == bit
+        move = rng.choice(ref.available_moves)
+        records.append(ref.apply_move(move))
+        bit.apply_move(move)
+        loaded = Reversi(8, 2, True)
+        loaded.load_game(ref.turn, ref.grid)
+        assert loaded.zobrist == ref.zobrist
+        assert hash(loaded) == hash(ref)
+
+    for record in reversed(records):
+        ref.undo_move(record)
+    assert ref.zobrist == start
+    assert ref == Reversi(8, 2, True)
+    assert ref != ref.simulate_moves([(2, 3)])
+    assert ref.zobrist != Reversi(8, 2, False).zobrist
+    assert Reversi(9, 3, False).zobrist != Reversi(9, 1, False).zobrist
+
+
+def test_transposition_table():
+    """ Tests lookups and the replacement policy of the table """
+    table = TranspositionTable(4)
+    table.store(1, 5, 1.0, EXACT, (0, 0))
+    table.store(5, 2, 2.0, LOWER)
+
+    assert table.get(1).value == 1.0
+    assert table.get(5).depth == 2
+    assert table.get(9) is None
+
+    # A shallower result from the same search goes in the second slot
+    table.store(9, 1, 3.0, EXACT)
+    assert table.get(1) is not None
+    assert table.get(5) is None
+    assert table.get(9).value == 3.0
+
+    # After a new search, old entries are replaced regardless of depth
+    table.new_search()
+    table.store(13, 0, 4.0, EXACT)
+    assert table.get(1) is None
+    assert table.get(13).value == 4.0
+    assert len(table) == 2
+
+
+@pytest.mark.parametrize("side, players, othello",
+                         [(8, 2, True), (6, 2, False), (9, 3, False)])
+def test_batch_matches_reversi(side, players, othello):
+    """ Plays a batch of random games alongside Reversi games """
+    np = pytest.importorskip("numpy")
+    from batch import BatchReversi, random_policy
+
+    batch = BatchReversi(8, side, players, othello)
+    games = [Reversi(side, players, othello) for _ in range(len(batch))]
+    policy = random_policy(np.random.default_rng(side))
+    while not batch.done.all():
+        legal = batch.legal_moves()
+        for k, game in enumerate(games):
+            moves = [] if game.done else game.available_moves
+            assert [divmod(int(i), side)
+                    for i in np.flatnonzero(legal[k])] == moves
+        moves = batch.step(policy)
+        for k, game in enumerate(games):
+            if not game.done:
+                game.apply_move(divmod(int(moves[k]), side))
+            assert batch.boards[k].tobytes() == game.cells()
+            assert bool(batch.done[k]) == game.done
+            if not game.done:
+                assert batch.turn[k] == game.turn
+
+    outcome = batch.outcome()
+    for k, game in enumerate(games):
+        assert list(np.flatnonzero(outcome[k]) + 1) == game.outcome
+
+
+def test_batch_greedy_policy():
+    """ Tests that the greedy policy plays the moves SmartBot would """
+    np = pytest.importorskip("numpy")
+    from batch import BatchReversi, greedy_policy
+
+    batch = BatchReversi(1, 8, 2, True)
+    game = Reversi(8, 2, True)
+    while not game.done:
+        best, best_n = None, 0
+        for move, flips in game.available_moves_with_flips(game.turn):
+            if 1 + len(flips) > best_n:
+                best, best_n = move, 1 + len(flips)
+        assert divmod(int(batch.step(greedy_policy)[0]), 8) == best
+        game.apply_move(best)
+    assert batch.done[0]
+
+
+@pytest.mark.parametrize("backend", list(perft.BACKENDS))
+@pytest.mark.parametrize("case", perft.CASES,
+                         ids=[case.name for case in perft.CASES])
+def test_perft(case, backend):
+    """ Tests every backend's perft counts against the reference values """
+    if not perft.supports(backend, case):
+        pytest.skip(f"{backend} does not support {case.name}")
+    for depth, expected in enumerate(case.counts, 1):
+        if expected > 20000:
+            break
+        assert perft.run(backend, case, depth)[0] == expected
+
+
+
+def test_perft_command():
+    """ Tests that the perft command checks the count of the depth it ran,
+    and rejects depths below 1 """
+    runner = CliRunner()
+    result = runner.invoke(perft.cmd, ["-d", "1", "-b", "reversi"])
+    assert result.exit_code == 0 and " ok" in result.output
+    result = runner.invoke(perft.cmd, ["-d", "0"])
+    assert result.exit_code == 2 and "depth" in result.output
+
+def test_board_occupancy():
+    """ Tests piece counts and locations across moves and load_game """
+    rng = random.Random(4)
+    game = Reversi(9, 3, False)
+    for _ in range(30):
+        game.apply_move(rng.choice(game.available_moves))
+    grid = [list(row) for row in game.grid]
+
+    for _ in range(2):
+        game.load_game(game.turn, grid)
+        for player in range(1, 4):
+            expected = {(r, c) for r in range(9) for c in range(9)
+                        if grid[r][c] == player}
+            assert set(game.board.locations(player)) == expected
+            assert game.piece_counts(player) == len(expected)
+
+
+@pytest.mark.parametrize("side, players, othello, size",
+                         [(8, 2, True, 21), (9, 3, False, 26),
+                          (10, 4, False, 55), (18, 16, False, 329)])
+def test_position_encoding(side, players, othello, size):
+    """ Tests that to_bytes/from_bytes round-trip grid and turn """
+    rng = random.Random(5)
+    game = new_reversi(side, players, othello)
+    for _ in range(20):
+        data = game.to_bytes()
+        assert len(data) == size
+        for decoded in (ReversiBase.from_bytes(data),
+                        Reversi.from_bytes(memoryview(data))):
+            assert decoded.grid == game.grid
+            assert decoded.turn == game.turn
+            assert decoded.available_moves == game.available_moves
+            assert decoded.zobrist == game.zobrist
+        assert type(ReversiBase.from_bytes(data)) is type(game)
+        game.apply_move(rng.choice(game.available_moves))
+
+
+def test_position_encoding_errors():
+    """ Tests that inconsistent encodings are rejected """
+    data = Reversi(9, 3, False).to_bytes()
+
+    with pytest.raises(ValueError):
+        Reversi.from_bytes(data[:-1])
+    with pytest.raises(ValueError):
+        Reversi.from_bytes(data[:2] + bytes([4]) + data[3:])
+    with pytest.raises(ValueError):
+        data4 = Reversi(10, 4, False).to_bytes()
+        Reversi.from_bytes(data4[:-1] + bytes([0x5f]))
+    with pytest.raises(ValueError):
+        Reversi.from_bytes(bytes([8, 3]) + data[2:])
+
+
+def test_invalid_parity():
+    """ Tests the parity and Othello checks in the constructor """
+    with pytest.raises(ValueError):
+        Reversi(7, 2, True)
+    with pytest.raises(ValueError):
+        Reversi(8, 3, False)
+    with pytest.raises(ValueError):
+        Reversi(9, 3, True)
+    with pytest.raises(ValueError):
+        BitboardReversi(10, 2, True)
+
+
+def test_grid_view():
+    """ Tests that Reversi.grid_view is a live, read-only view of the
+    board """
+    game = Reversi(4, 2, True)
+    grid = game.grid_view
+
+    assert grid == [[None, None, None, None],
+                    [None, 2, 1, None],
+                    [None, 1, 2, None],
+                    [None, None, None, None]]
+    assert grid[1][-1] is None
+    game.apply_move((0, 1))
+    assert grid[0][1] == 1
+    assert grid[1][1] == 1
+    with pytest.raises(TypeError):
+        grid[0][0] = 1
+
+
+@pytest.mark.parametrize("cls", BACKENDS)
+def test_grid_snapshot(cls):
+    """ Tests that grid is a plain copy of the board on every backend,
+    while grid_view follows the moves """
+    game = cls(6, 2, True)
+    grid, view = game.grid, game.grid_view
+    assert type(grid) is list and all(type(row) is list for row in grid)
+    assert json.loads(json.dumps(grid)) == grid == view
+    game.apply_move(game.available_moves[0])
+    assert grid == cls(6, 2, True).grid
+    assert view == game.grid != grid
+    grid[0][0] = 1
+    assert game.grid[0][0] is None
+
+
+def test_factory():
+    """ Tests that the factory picks bitboards only when they apply """
+    assert isinstance(new_reversi(8, 2, True), BitboardReversi)
+    assert isinstance(new_reversi(6, 2, False), BitboardReversi)
+    assert type(new_reversi(10, 2, True)) is Reversi
+    assert type(new_reversi(9, 3, False)) is Reversi
+    assert type(new_reversi(64, 4, False)) is SparseReversi
+
+
+@pytest.mark.parametrize("side, othello", [(4, True), (6, False), (8, True)])
+def test_backends_agree(side, othello):
+    """ Plays random games on both backends and compares every position """
+    rng = random.Random(side)
+    for _ in range(5):
+        ref = Reversi(side, 2, othello)
+        bit = BitboardReversi(side, 2, othello)
+        while not ref.done:
+            assert bit.grid == ref.grid
+            assert bit.turn == ref.turn
+            assert bit.available_moves == ref.available_moves
+            move = rng.choice(ref.available_moves)
+            ref.apply_move(move)
+            bit.apply_move(move)
+        assert bit.done
+        assert bit.outcome == ref.outcome
+
+
+def test_game_records(tmp_path):
+    """ Tests appending, indexing and replaying recorded games """
+    rng = random.Random(6)
+    games = []
+    db = GameDatabase(str(tmp_path), segment_size=200, prefix_depth=2)
+    for side, players, othello in [(8, 2, True)] * 6 + [(21, 3, False)]:
+        game = new_reversi(side, players, othello)
+        moves = []
+        while not game.done and len(moves) < 40:
+            moves.append(rng.choice(game.available_moves))
+            game.apply_move(moves[-1])
+        games.append((GameRecord(side, players, othello, moves,
+                                 game.outcome), game.to_bytes()))
+        assert db.append(games[-1][0]) == len(games) - 1
+    assert db[6] == games[6][0]
+    db.close()
+
+    with GameDatabase(str(tmp_path), prefix_depth=2) as db:
+        assert len(db) == len(games)
+        assert len(list(tmp_path.iterdir())) > 1
+        for i, (record, final) in enumerate(games):
+            assert db[i] == record
+            positions = db.replay(i)
+            assert next(positions).to_bytes() == \
+                new_reversi(record.side, record.players,
+                            record.othello).to_bytes()
+            *_, last = positions
+            assert last.to_bytes() == final
+
+        assert db.find() == list(range(len(games)))
+        assert db.find(winners=[1]) == \
+            [i for i, (r, _) in enumerate(games) if r.winners == [1]]
+        assert db.find(max_length=40, min_length=40) == \
+            [i for i, (r, _) in enumerate(games) if len(r.moves) == 40]
+        for prefix in (games[0][0].moves[:1], games[0][0].moves[:3],
+                       games[6][0].moves[:2]):
+            assert db.find(prefix=prefix) == \
+                [i for i, (r, _) in enumerate(games)
+                 if r.moves[:len(prefix)] == prefix]
+
+
+def test_game_records_mixed_sizes(tmp_path):
+    """ Tests that opening lookups tell boards of different sizes apart,
+    though their moves can have the same square index """
+    with GameDatabase(str(tmp_path)) as db:
+        db.append(GameRecord(4, 2, True, [(2, 0)], [1]))
+        db.append(GameRecord(8, 2, True, [(1, 0)], [2]))
+        db.append(GameRecord(4, 2, True, [(1, 0)], [2]))
+        assert db.find(prefix=[(1, 0)]) == [1, 2]
+        assert db.find(prefix=[(2, 0)]) == [0]
+        assert db.find(prefix=[(0, 5)]) == []
+
+
+
+@pytest.mark.parametrize("cut", [1, 5, 35])
+def test_game_records_torn_append(tmp_path, cut):
+    """ Tests that a game cut short by an interrupted append is dropped
+    when the database is reopened, and that appends go on after it """
+    records = [GameRecord(8, 2, True, [(2, 3), (2, 2), (2, 1)] * 10, [1])
+               for _ in range(3)]
+    with GameDatabase(str(tmp_path)) as db:
+        for record in records:
+            db.append(record)
+    segment = next(tmp_path.iterdir())
+    size = segment.stat().st_size
+    with open(segment, "r+b") as f:
+        f.truncate(size - cut)
+
+    with GameDatabase(str(tmp_path)) as db:
+        assert len(db) == 2 and [db[0], db[1]] == records[:2]
+        assert segment.stat().st_size == size * 2 // 3
+        assert db.append(records[2]) == 2
+    with GameDatabase(str(tmp_path)) as db:
+        assert [db[i] for i in range(len(db))] == records
+
+@pytest.mark.parametrize("cls, side, players, othello",
+                         [(BitboardReversi, 8, 2, True), (Reversi, 8, 2, True),
+                          (BitboardReversi, 6, 2, False),
+                          (Reversi, 9, 3, False)])
+def test_symmetry(cls, side, players, othello):
+    """ Tests that every orientation of a position has the same canonical
+    form, and that moves map to and from it """
+    rng = random.Random(side + players)
+    game = cls(side, players, othello)
+    for _ in range(25):
+        data, t = symmetry.canonical(game)
+        canon = ReversiBase.from_bytes(data)
+        assert canon.cells() == \
+            symmetry.transform_cells(game.cells(), t, side)
+        assert canon.turn == game.turn
+        assert sorted(symmetry.to_canonical(m, t, side)
+                      for m in game.available_moves) == canon.available_moves
+        for m in canon.available_moves:
+            assert symmetry.to_canonical(
+                symmetry.from_canonical(m, t, side), t, side) == m
+
+        for u in range(symmetry.TRANSFORMS):
+            other = cls(side, players, othello)
+            other._load_cells(game.turn, symmetry.transform_cells(
+                game.cells(), u, side))
+            assert symmetry.canonical(other)[0] == data
+            assert symmetry.canonical_key(other) == \
+                symmetry.canonical_key(game)
+        ref = Reversi(side, players, othello)
+        ref._load_cells(game.turn, game.cells())
+        assert symmetry.canonical(ref) == (data, t)
+        game.apply_move(rng.choice(game.available_moves))
+
+
+
+def test_canonical_ignores_start():
+    """ Tests that a position has the same canonical form whichever start
+    it was reached from """
+    free = new_reversi(8, 2, False)
+    for move in [(3, 4), (3, 3), (4, 3), (4, 4)]:
+        free.apply_move(move)
+    start = new_reversi(8, 2, True)
+    assert free.cells() == start.cells() and free.turn == start.turn
+    assert symmetry.canonical(free) == symmetry.canonical(start)
+    data, t = symmetry.canonical(free)
+    assert ReversiBase.from_bytes(data).available_moves == sorted(
+        symmetry.to_canonical(m, t, 8) for m in start.available_moves)
+
+def test_opening_book(tmp_path):
+    """ Tests building a book and looking positions up in any orientation """
+    rng = random.Random(7)
+    builder = BookBuilder()
+    with GameDatabase(str(tmp_path / "games")) as db:
+        for _ in range(30):
+            game = new_reversi(8, 2, True)
+            moves = []
+            while not game.done:
+                moves.append(rng.choice(game.available_moves))
+                game.apply_move(moves[-1])
+            db.append(GameRecord(8, 2, True, moves, game.outcome))
+        builder.add_records(db, plies=4)
+    start = new_reversi(8, 2, True)
+    builder.add_result(start, (3, 2), 5.0, games=5)
+    path = str(tmp_path / "book.bin")
+    count = builder.write(path)
+    assert count == len(builder)
+
+    with OpeningBook(path) as book:
+        assert len(book) == count
+        # The four first moves of Othello are one canonical position
+        first = book.lookup(start)
+        assert len(first) == 1
+        assert first[0].games == 35
+        assert book.best_move(start) in start.available_moves
+        assert book.best_move(start, min_games=36) is None
+
+        game = new_reversi(8, 2, True)
+        game.apply_move((2, 3))
+        mirrored = new_reversi(8, 2, True)
+        mirrored.apply_move((3, 2))
+        assert book.lookup(mirrored) == [
+            m._replace(move=(m.move[1], m.move[0]))
+            for m in book.lookup(game)]
+        assert all(m.move in game.available_moves
+                   for m in book.lookup(game))
+        assert book.lookup(new_reversi(6, 2, True)) == []
+
+    (tmp_path / "bad.bin").write_bytes(b"RBK2" + bytes(5))
+    with pytest.raises(ValueError):
+        OpeningBook(str(tmp_path / "bad.bin"))
+
+
+def _minimax(game) -> int:
+    """ Final disc differential for the player to move, by full search """
+    player = game.turn
+    if game.done:
+        return game.piece_counts(player) - game.piece_counts(3 - player)
+    best = None
+    for move in game.available_moves:
+        record = game.apply_move(move)
+        value = _minimax(game)
+        if game.turn != player:
+            value = -value
+        game.undo_move(record)
+        best = value if best is None else max(best, value)
+    return best
+
+
+def test_endgame_solver():
+    """ Tests the endgame solver against a plain minimax search """
+    rng = random.Random(8)
+    for i in range(30):
+        side = 6 if i % 2 else 8
+        game = endgame.random_endgame(side, rng.randint(1, 6), rng)
+        result = endgame.solve(game)
+        assert result.score == _minimax(game)
+        assert result.nodes > 0
+
+        record = game.apply_move(result.move)
+        value = _minimax(game)
+        assert (value if game.turn == record.prev_turn else -value) == \
+            result.score
+
+    with pytest.raises(ValueError):
+        endgame.solve(new_reversi(8, 2, True), max_empties=20)
+    with pytest.raises(ValueError):
+        endgame.solve(Reversi(9, 3, False))
+
+
+
+def test_endgame_solver_large_board():
+    """ Tests the endgame solver with its transposition table against the
+    solver without one on a board with more than 64 squares """
+    rng = random.Random(10)
+    exact = endgame.EndgameSolver(10)
+    exact.SHALLOW_EMPTIES = 99
+    for _ in range(12):
+        game = endgame.random_endgame(10, 10, rng)
+        result = endgame.EndgameSolver(10).solve(game)
+        assert result.score == exact.solve(game).score
+
+        record = game.apply_move(result.move)
+        value = exact.solve(game).score if not game.done else \
+            game.cells().count(game.turn) - game.cells().count(
+                3 - game.turn)
+        assert (value if game.turn == record.prev_turn else -value) == \
+            result.score
+
+def test_perfect_play_table(tmp_path):
+    """ Tests a 4x4 perfect-play table against the endgame solver """
+    path = str(tmp_path / "table.bin")
+    solved = tables.solve_all(4)
+    tables.write_table(path, 4, True, solved)
+
+    rng = random.Random(9)
+    with tables.PerfectPlayTable(path) as table:
+        assert len(table) == len(solved)
+        start = new_reversi(4, 2, True)
+        # The second player wins 4x4 Othello 11-3
+        assert table.lookup(start)[0] == -8
+        assert table.lookup(new_reversi(6, 2, True)) is None
+        for _ in range(20):
+            game = new_reversi(4, 2, True)
+            for _ in range(rng.randint(0, 8)):
+                if game.done:
+                    break
+                game.apply_move(rng.choice(game.available_moves))
+            value, move = table.lookup(game)
+            assert value == endgame.solve(game).score
+            if move is None:
+                assert game.done
+                continue
+            player = game.turn
+            game.apply_move(move)
+            after = table.lookup(game)[0]
+            assert (after if game.turn == player else -after) == value
+
+
+@pytest.mark.parametrize("side, players", [(10, 2), (20, 4), (15, 5)])
+def test_sparse_matches_reversi(side, players):
+    """ Plays random games on the sparse and dense boards and compares
+    every position, then undoes the moves """
+    rng = random.Random(side)
+    dense = Reversi(side, players, False)
+    sparse = SparseReversi(side, players, False)
+    records = []
+    for _ in range(150):
+        if dense.done:
+            break
+        assert sparse.available_moves_with_flips(sparse.turn) == \
+            dense.available_moves_with_flips(dense.turn)
+        move = rng.choice(dense.available_moves)
+        dense.apply_move(move)
+        records.append((sparse.cells(), sparse.turn, sparse.apply_move(move)))
+        assert sparse == dense
+        assert sparse.grid == dense.grid
+        assert sparse.outcome == dense.outcome
+    for cells, turn, record in reversed(records):
+        sparse.undo_move(record)
+        assert sparse.cells() == cells and sparse.turn == turn
+    assert sparse == SparseReversi(side, players, False)
+
+
+def test_sparse_large_board():
+    """ Tests that a huge board only pays for the squares in use """
+    game = SparseReversi(1000, 8, False)
+    assert len(game.available_moves) == 64
+    for _ in range(80):
+        game.apply_move(game.available_moves[-1])
+    assert sum(game.piece_counts(p) for p in range(1, 9)) == 80
+    assert game.grid[500][500] is not None and game.grid[0][0] is None
+    with pytest.raises(ValueError):
+        game.to_bytes()
+
+    game = SparseReversi(250, 2, True)
+    game.apply_move(game.available_moves[0])
+    assert SparseReversi.from_bytes(game.to_bytes()) == game
+
+
+def test_alphabeta_bot():
+    """ Tests that the alpha-beta bot keeps to its budget, leaves the
+    board as it found it, and plays perfectly when it can see the end """
+    rng = random.Random(19)
+    game = endgame.random_endgame(8, 30, rng)
+    cells, turn = game.cells(), game.turn
+    bot = AlphaBetaBot(game.turn, budget_ms=None, budget_nodes=500)
+    move = bot.strategy(game.available_moves, game.simulate_moves([]))
+    assert move in game.available_moves
+    assert 0 < bot.nodes <= 501 and bot.depth >= 1
+    assert game.cells() == cells and game.turn == turn
+
+    bot = AlphaBetaBot(game.turn, budget_ms=30)
+    start = time.perf_counter()
+    bot.strategy(game.available_moves, game.simulate_moves([]))
+    assert time.perf_counter() - start < 0.2
+
+    for _ in range(3):
+        game = endgame.random_endgame(8, 7, rng)
+        best = endgame.solve(game).score
+        bot = AlphaBetaBot(game.turn, budget_ms=None)
+        after = game.simulate_moves([])
+        bot.strategy(game.available_moves, after)
+        value = endgame.solve(after).score if not after.done else \
+            after.piece_counts(after.turn) - after.piece_counts(3 - after.turn)
+        assert (value if after.turn == game.turn else -value) == best
+
+
+@pytest.mark.parametrize("side, players, workers", [(6, 2, 0), (9, 3, 0),
+                                                    (6, 2, 2)])
+def test_mcts_bot(side, players, workers):
+    """ Tests that the Monte Carlo bot plays legal moves for any number of
+    players, with or without worker processes, and keeps its tree """
+    game = new_reversi(side, players, False)
+    data = game.to_bytes()
+    scores = rollouts(data, 10, 1)
+    assert scores == rollouts(data, 10, 1) and sum(scores) == pytest.approx(10)
+
+    bots = [MCTSBot(p, playouts=24, workers=workers, seed=p)
+            for p in range(1, players + 1)]
+    try:
+        for _ in range(2 * players):
+            bot = bots[game.turn - 1]
+            moves = game.available_moves
+            before = game.cells()
+            move = bot.strategy(moves, game)
+            assert move in moves and game.cells() != before
+            assert bot.root is None or bot.root.move == move
+        assert bots[0].root is not None and bots[0].root.visits > 0
+    finally:
+        for bot in bots:
+            bot.close()
+
+
+@pytest.mark.parametrize("mode", ["maxn", "paranoid"])
+def test_multi_player_bot(mode):
+    """ Tests that the multi-player bot keeps to its budget, leaves the
+    board and its scores as it found them, and that shallow pruning does
+    not change the move it plays """
+
+    class Unpruned(MultiPlayerBot):
+        def _maxn(self, board, depth, parent, parent_best):
+            return super()._maxn(board, depth, board.turn, parent_best)
+
+    rng = random.Random(21)
+    for _ in range(4):
+        game = new_reversi(11, 3, False)
+        for _ in range(rng.randrange(20, 80)):
+            game.apply_move(rng.choice(game.available_moves))
+        cells, turn = game.cells(), game.turn
+
+        bot = MultiPlayerBot(turn, mode, max_depth=3, budget_ms=None)
+        move = bot.strategy(game.available_moves, game.simulate_moves([]))
+        assert move in game.available_moves and bot.depth == 3
+        assert game.cells() == cells and game.turn == turn
+        assert bot._scores[1:] == [game.piece_counts(p) + sum(
+            10 for corner in bot._weights if game.piece_at(corner) == p)
+            for p in range(1, 4)]
+        if mode == "maxn":
+            unpruned = Unpruned(turn, mode, max_depth=3, budget_ms=None)
+            assert unpruned.strategy(game.available_moves,
+                                     game.simulate_moves([])) == move
+            assert unpruned.nodes >= bot.nodes
+
+        bot = MultiPlayerBot(turn, mode, budget_ms=None, budget_nodes=200)
+        bot.strategy(game.available_moves, game.simulate_moves([]))
+        assert bot.nodes <= 201
+
+
+def test_tournament(tmp_path):
+    """ Tests that games sharded across processes give the same results,
+    in the same order, as games played serially """
+    factories = [BotFactory("random"), BotFactory("mcts", playouts=8),
+                 BotFactory("random")]
+    with GameDatabase(str(tmp_path / "serial")) as serial, \
+        GameDatabase(str(tmp_path / "parallel")) as parallel:
+        outcomes = tournament(7, 3, False, factories, 6, 1, 5, serial)
+        assert tournament(7, 3, False, factories, 6, 3, 5, parallel) == \
+            outcomes
+        assert [serial[i] for i in range(6)] == \
+            [parallel[i] for i in range(6)]
+    assert len(set(tuple(o) for o in outcomes)) > 1
+    assert tournament(7, 3, False, factories, 6, 1, 6) != outcomes
+
+
+def test_sprt():
+    """ Tests the Elo estimates and that the sequential test stops early
+    on lopsided matches, but not on even ones """
+    assert stats.elo_difference(stats.expected_score(120)) == \
+        pytest.approx(120)
+    match = stats.MatchStats()
+    for score in [1, 1, 0.5, 0, 1, 0]:
+        match.add(score)
+    assert (match.wins, match.ties, match.losses) == (3, 1, 2)
+    elo, error = match.elo()
+    assert elo == pytest.approx(stats.elo_difference(7 / 12)) and error > 0
+
+    test = stats.SPRT(0, 50)
+    while test.decision is None:
+        test.add(1)
+    assert test.decision and test.games < 20
+
+    rng = random.Random(23)
+    test = stats.SPRT(0, 50)
+    for _ in range(50):
+        test.add(rng.choice([0, 1]))
+    assert test.decision is not True
+
+    test = stats.SPRT(0, 50)
+    decision = sequential_match([BotFactory("very-smart"),
+                                 BotFactory("random")], test, 500, side=6)
+    assert decision and test.games < 500
+
+
+def test_league(tmp_path):
+    """ Tests the ratings of a league, that serial and parallel leagues
+    agree, and that adding a bot only plays its pairings """
+    ratings = league.bradley_terry({("a", "b"): [3, 0, 1]}, ["a", "b"])
+    assert ratings["a"] - ratings["b"] == \
+        pytest.approx(stats.elo_difference(3.5 / 5), abs=0.01)
+
+    factories = {name: BotFactory(name) for name in
+                 ["random", "smart", "very-smart"]}
+    serial = league.League(str(tmp_path / "serial.json"), 6)
+    parallel = league.League(str(tmp_path / "parallel.json"), 6)
+    league.run_league(serial, factories, 4, seed=3)
+    league.run_league(parallel, factories, 4, jobs=2, seed=3)
+    assert serial.results == parallel.results
+    assert all(sum(result) == 4 for result in serial.results.values())
+
+    reloaded = league.League(str(tmp_path / "serial.json"), 6)
+    assert reloaded.results == serial.results
+    assert reloaded.ratings == pytest.approx(serial.ratings)
+    factories["alphabeta"] = BotFactory("alphabeta", budget_nodes=50)
+    assert [(a, b) for a, b, _, _ in reloaded.schedule(list(factories), 4)] \
+        == [("alphabeta", "random"), ("alphabeta", "smart"),
+            ("alphabeta", "very-smart")]
+    ratings = league.run_league(reloaded, factories, 4, seed=3)
+    assert set(ratings) == set(factories)
+    assert sum(ratings.values()) == pytest.approx(0)
+    with pytest.raises(ValueError):
+        league.League(str(tmp_path / "serial.json"), 8)
+
+
+
+def test_league_resume(tmp_path, monkeypatch):
+    """ Tests that a parallel league interrupted after shards finished out
+    of order resumes to the results of an uninterrupted league """
+    factories = {name: BotFactory(name) for name in ["random", "smart"]}
+    full = league.League(str(tmp_path / "full.json"), 6)
+    league.run_league(full, factories, 8, seed=5, shard=2)
+
+    class Interrupted(Exception):
+        pass
+
+    def interrupt(a, b, played):
+        raise Interrupted()
+
+    monkeypatch.setattr(league, "as_completed", lambda fs: reversed(list(fs)))
+    path = str(tmp_path / "resumed.json")
+    with pytest.raises(Interrupted):
+        league.run_league(league.League(path, 6), factories, 8, jobs=2,
+                          seed=5, shard=2, report=interrupt)
+    resumed = league.League(path, 6)
+    assert resumed.games("random", "smart") == 4
+    league.run_league(resumed, factories, 8, seed=5, shard=2)
+    assert resumed.results == full.results
+
+def test_bot_profiles():
+    """ Tests the latency histograms, and the profiles of bots playing
+    serially and in worker processes """
+    histogram = LatencyHistogram()
+    for ms in range(1, 101):
+        histogram.record(ms / 1000)
+    for q in [0.5, 0.95, 0.99]:
+        assert histogram.percentile(q) == pytest.approx(q / 10, rel=0.05)
+    other = LatencyHistogram()
+    other.record(0.5)
+    histogram.merge(other)
+    assert histogram.count == 101 and histogram.to_dict()["max_ms"] == 500
+
+    factories = [BotFactory("very-smart"), BotFactory("alphabeta",
+                                                      budget_ms=None,
+                                                      budget_nodes=100)]
+    serial, parallel = {}, {}
+    outcomes = tournament(6, 2, True, factories, 4, 1, 0, profiles=serial)
+    assert tournament(6, 2, True, factories, 4, 2, 0, profiles=parallel) \
+        == outcomes
+    for player in [1, 2]:
+        assert serial[player].counters == parallel[player].counters
+        assert serial[player].latency.count == \
+            serial[player].counters["moves_applied"] - \
+            serial[player].counters["moves_undone"]
+    assert serial[1].counters["positions"] > 0
+    assert 0 < serial[2].counters["nodes"] <= 101 * serial[2].latency.count
+    report = serial[2].to_dict()
+    assert report["latency"]["p50_ms"] <= report["latency"]["max_ms"]
+    assert report["rates"]["nodes_per_second"] > 0
+    assert BotProfile().to_dict()["latency"]["count"] == 0
+
+
+def test_wrapped_bot_profiles(tmp_path):
+    """ Tests that the profile of a bot wrapped in a book or a table
+    counts the positions its inner bot searched, and that a counting
+    board hashes like its game """
+    game = new_reversi(8, 2, True)
+    counting = CountingBoard(game, BotProfile().counters)
+    assert counting == game and hash(counting) == hash(game)
+    assert {counting: 1}[game] == 1
+
+    builder = BookBuilder()
+    builder.add_result(game, (3, 2), 1.0)
+    path = str(tmp_path / "book.bin")
+    builder.write(path)
+    with OpeningBook(path) as book:
+        inner = AlphaBetaBot(1, budget_ms=None, budget_nodes=100)
+        book_bot = BookBot(1, book, inner)
+        book_bot.profile = BotProfile()
+        book_bot.play(game.available_moves, game)
+        assert book_bot.profile.counters["nodes"] == 0
+        game.apply_move(game.available_moves[0])
+        book_bot.play(game.available_moves, game)
+        assert book_bot.profile.counters["nodes"] == inner.nodes > 0
+
+
+def test_bot_command_settings():
+    """ Tests that Reversi-Bot only uses the Othello start with two
+    players by default, and rejects impossible games before playing """
+    runner = CliRunner()
+    result = runner.invoke(bot.cmd, ["-n", "2", "-p", "3", "-s", "9"])
+    assert result.exit_code == 0 and "Player 3 wins" in result.output
+    for args in (["-p", "3", "-s", "9", "--othello"], ["-s", "7"]):
+        result = runner.invoke(bot.cmd, ["-n", "2"] + args)
+        assert result.exit_code == 2 and "cannot play" in result.output
+
+
+def test_table_and_book_bots(tmp_path):
+    """ Tests that TableBot and BookBot play the moves of their table or
+    book, and the moves of their inner bot elsewhere """
+    path = str(tmp_path / "table.bin")
+    tables.write_table(path, 4, True, tables.solve_all(4))
+    rng = random.Random(17)
+    with tables.PerfectPlayTable(path) as table:
+        game = new_reversi(4, 2, True)
+        while not game.done:
+            expected = table.best_move(game)
+            move = TableBot(game.turn, table, RandomBot(game.turn)).strategy(
+                game.available_moves, game)
+            assert move == expected
+        # A 6x6 game is not in the 4x4 table
+        game = new_reversi(6, 2, True)
+        for _ in range(3):
+            game.apply_move(rng.choice(game.available_moves))
+        expected = SmartBot(game.turn).strategy(game.available_moves,
+                                                game.simulate_moves([]))
+        assert TableBot(game.turn, table, SmartBot(game.turn)).strategy(
+            game.available_moves, game) == expected
+
+    builder = BookBuilder()
+    start = new_reversi(8, 2, True)
+    builder.add_result(start, (3, 2), 1.0)
+    book_path = str(tmp_path / "book.bin")
+    builder.write(book_path)
+    with OpeningBook(book_path) as book:
+        game = new_reversi(8, 2, True)
+        book_bot = BookBot(1, book, SmartBot(1))
+        assert book_bot.strategy(game.available_moves, game) == \
+            book.best_move(start)
+        expected = SmartBot(2).strategy(game.available_moves,
+                                        game.simulate_moves([]))
+        assert book.best_move(game) is None
+        assert BookBot(2, book, SmartBot(2)).strategy(
+            game.available_moves, game) == expected
+
+    factory = BotFactory("random", book=book_path, table=path)
+    assert isinstance(factory(1), TableBot)
+    assert isinstance(factory(1).bot, BookBot)
+    result = CliRunner().invoke(bot.cmd, ["-n", "2", "-s", "4", "-1", "smart",
+                                          "--table", path])
+    assert result.exit_code == 0
+    # Both players play perfectly: the second player wins 4x4 Othello
+    assert "Player 2 wins: 100.0%" in result.output
@@ -0,0 +1,132 @@
+"""
+Transposition table for game-tree searches.
+
+Positions are identified by their Zobrist hash (see ReversiBase.zobrist).
+The table has a fixed number of slots, so bots can share one table for
+a whole game without its memory growing.
+"""
+from typing import List, Tuple, Optional, NamedTuple
+
+EXACT = 0
+"""The stored value is the exact value of the position"""
+
+LOWER = 1
+"""The stored value is a lower bound (the search failed high)"""
+
+UPPER = 2
+"""The stored value is an upper bound (the search failed low)"""
+
+
+class TTEntry(NamedTuple):
+    """
+    Result of searching one position
+    """
+    key: int
+    """Zobrist hash of the position"""
+    depth: int
+    """Depth of the search that produced the entry"""
+    value: float
+    """Value of the position (or bound on it, see flag)"""
+    flag: int
+    """EXACT, LOWER or UPPER"""
+    move: Optional[Tuple[int, int]]
+    """Best move found, if any"""
+    generation: int
+    """Search generation in which the entry was stored"""
+
+
+class TranspositionTable:
+    """
+    Bounded transposition table with two slots per bucket.
+
+    The first slot of a bucket keeps the deepest result (depth-preferred);
+    it is only replaced by a search at least as deep, or once its entry
+    is left over from an earlier search generation. Results that do not
+    go in the first slot always replace the second one, so recent
+    shallow results are kept as well.
+    """
+
+    _deep: List[Optional[TTEntry]]
+    _recent: List[Optional[TTEntry]]
+    _mask: int
+    generation: int
+    hits: int
+    misses: int
+
+    def __init__(self, size: int = 1 << 16):
+        """
+        Constructor
+
+        Args:
+            size: Number of buckets (rounded up to a power of two)
+
+        Raises:
+            ValueError: If size is not positive
+        """
+        if size < 1:
+            raise ValueError("Transposition table size must be positive")
+
+        buckets = 1 << (size - 1).bit_length()
+        self._mask = buckets - 1
+        self._deep = [None] * buckets
+        self._recent = [None] * buckets
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return sum(1 for e in self._deep if e is not None) + \
+            sum(1 for e in self._recent if e is not None)
+
+    def new_search(self) -> None:
+        """
+        Starts a new search generation, so that entries from earlier
+        searches can be replaced by shallower results
+        """
+        self.generation += 1
+
+    def clear(self) -> None:
+        """
+        Removes every entry from the table
+        """
+        self._deep = [None] * len(self._deep)
+        self._recent = [None] * len(self._recent)
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: int) -> Optional[TTEntry]:
+        """
+        Returns the entry stored for the given Zobrist hash, or None
+        """
+        i = key & self._mask
+        entry = self._deep[i]
+        if entry is not None and entry.key == key:
+            self.hits += 1
+            return entry
+        entry = self._recent[i]
+        if entry is not None and entry.key == key:
+            self.hits += 1
+            return entry
+        self.misses += 1
+        return None
+
+    def store(self, key: int, depth: int, value: float, flag: int,
+              move: Optional[Tuple[int, int]] = None) -> None:
+        """
+        Stores the result of searching a position
+
+        Args:
+            key: Zobrist hash of the position
+            depth: Depth of the search
+            value: Value found by the search
+            flag: EXACT, LOWER or UPPER
+            move: Best move found, if any
+        """
+        i = key & self._mask
+        entry = TTEntry(key, depth, value, flag, move, self.generation)
+        deep = self._deep[i]
+        if deep is None or deep.key == key or depth >= deep.depth or \
+            deep.generation != self.generation:
+            self._deep[i] = entry
+        else:
+            self._recent[i] = entry